@@ -1,29 +1,56 @@
 # app/chat_controller.py
+import json
+import os
+import time
+import uuid
 from PySide6.QtCore import QObject, Signal, Slot
 from .socket_manager import SocketManager
+from .download_manager import DownloadManager
 from .http_client import HttpClient
-from .models import Message, User
+from .image_loader import ImageLoader
+from .image_prep import ImagePreparer, needs_preparing
+from .message_cache import MessageCache
+from .message_search import MessageSearch
+from .message_store import MessageStore
+from .metrics import metrics, timed_slot, MetricsDumper
+from .outbox import Outbox
+from .presence import PresenceService
+from .session import clear_session, load_session, save_session
+from .user_search import UserSearchCache
+from .models import User, Conversation, Message, decode_messages, next_local_message_id
+
+message_send_rtt = metrics.histogram(
+    'deplao_message_send_rtt_ms', 'Time from sending a message to the server confirming it, ms.')
 
 class ChatController(QObject):
     # Signals for the UI
     login_success = Signal(dict)
     login_error = Signal(str)
+    # The server rejected the token of the current session: log in again to reconnect
+    session_expired = Signal()
     
     register_success = Signal(dict)
     register_error = Signal(str)
 
-    history_loaded = Signal(int, list) # conversation_id, messages
+    history_loaded = Signal(int, list, bool) # conversation_id, newest messages, has_more
+    older_history_loaded = Signal(int, list, bool) # conversation_id, older messages, has_more
+    history_delta_loaded = Signal(int, list) # conversation_id, messages newer than the cached ones
     history_load_error = Signal(str)
 
-    upload_complete = Signal(dict)
-    upload_failed = Signal(str)
+    upload_progress = Signal(str, 'qint64', 'qint64') # upload_key, bytes sent, total bytes
+    upload_complete = Signal(str, dict) # upload_key, upload result
+    upload_failed = Signal(str, str) # upload_key, error message
+    upload_cancelled = Signal(str) # upload_key
 
-    new_message_received = Signal(Message)
-    user_status_changed = Signal(int, bool) # user_id, is_online
-    typing_indicator_received = Signal(int, int) # conversation_id, user_id
+    new_messages_received = Signal(list) # Messages not seen before, one batch per socket flush
+    message_confirmed = Signal(Message, Message) # our pending copy, the message the server stored
+    message_send_failed = Signal(Message, str) # our pending copy (already removed), error message
 
-    user_search_success = Signal(list)
+    user_search_success = Signal(str, list) # query, users
     user_search_error = Signal(str)
+
+    message_search_finished = Signal(str, list) # text, [(Message, snippet)] best match first
+    message_search_error = Signal(str)
     new_conversation_started = Signal(Conversation)
 
     def __init__(self, parent=None):
@@ -31,6 +58,27 @@ class ChatController(QObject):
         self.http_client = HttpClient()
         self.socket_manager = SocketManager()
         self.current_user = None
+        self.message_cache = None
+        # Every view reads messages from here instead of keeping its own copy
+        self.message_store = MessageStore(self)
+        self.image_loader = ImageLoader(HttpClient.BASE_URL, self)
+        self.download_manager = DownloadManager(HttpClient.BASE_URL, self)
+        # Images are downscaled and stripped of metadata in a worker process before upload
+        self.image_preparer = ImagePreparer(self)
+        self._preparing = {} # upload_key -> original path, while the image is being prepared
+        self._prepared = {} # upload_key -> prepare_image() result, until its upload ends
+        # Typing indicators and online state; views read and listen to it directly
+        self.presence = PresenceService(self.socket_manager, self)
+        self.user_search_cache = UserSearchCache()
+        self.message_search = MessageSearch(self)
+        self._search_request_id = 0 # Only the response to the latest search is shown
+        # Sent messages not confirmed yet: they wait in the outbox while the store
+        # shows their pending copies, kept here by client id
+        self.outbox = Outbox(self.socket_manager, self)
+        self._pending = {}
+        self._sent_at = {} # client_id -> perf_counter() at send, for sends of this session
+        # Periodic metrics file for field diagnostics, if DEPLAO_METRICS_FILE is set
+        self.metrics_dumper = MetricsDumper.from_environment(self)
 
         # Connect network client signals to controller slots
         self.http_client.login_success.connect(self.on_login_success)
@@ -39,16 +87,23 @@ class ChatController(QObject):
         self.http_client.register_error.connect(self.register_error)
         self.http_client.history_success.connect(self.on_history_loaded)
         self.http_client.history_error.connect(self.history_load_error)
-        self.http_client.upload_success.connect(self.upload_complete)
+        self.http_client.upload_progress.connect(self.upload_progress)
+        self.http_client.upload_success.connect(self.on_upload_complete)
         self.http_client.upload_error.connect(self.upload_failed)
+        self.http_client.upload_cancelled.connect(self.on_upload_cancelled)
+        self.image_preparer.prepared.connect(self.on_image_prepared)
+        self.image_preparer.failed.connect(self.on_image_prepare_failed)
         self.http_client.user_search_success.connect(self.on_user_search_success)
-        self.http_client.user_search_error.connect(self.user_search_error)
+        self.http_client.user_search_error.connect(self.on_user_search_error)
+        self.message_search.results_ready.connect(self.message_search_finished)
+        self.message_search.search_failed.connect(self.message_search_error)
 
         # Connect socket manager signals
-        self.socket_manager.message_received.connect(self.on_message_received)
-        self.socket_manager.user_online.connect(lambda data: self.user_status_changed.emit(data.get('userId'), True))
-        self.socket_manager.user_offline.connect(lambda data: self.user_status_changed.emit(data.get('userId'), False))
-        self.socket_manager.typing_received.connect(lambda data: self.typing_indicator_received.emit(data.get('conversationId', 0), data.get('senderId')))
+        self.socket_manager.messages_received.connect(self.on_messages_received)
+        self.socket_manager.reconnected.connect(self.fill_message_gaps)
+        self.socket_manager.auth_rejected.connect(self.on_auth_rejected)
+        self.outbox.entry_acked.connect(self.on_message_acked)
+        self.outbox.entry_rejected.connect(self.on_message_rejected)
 
 
     def login(self, username, password):
@@ -62,20 +117,83 @@ class ChatController(QObject):
         token = user_data.get('token')
         user_info = user_data.get('user')
         
-        self.current_user = User(id=user_info['id'], username=user_info['username'])
+        user = User(id=user_info['id'], username=user_info['username'])
+        try:
+            save_session(user, token)
+        except OSError:
+            pass # Only costs the offline start next time
+        self._start_session(user, token)
+        self.login_success.emit(user_info)
+
+    def restore_session(self):
+        """
+        Starts the session saved by the last login without asking the server:
+        the cached conversations and history are readable at once, online or
+        not, and the socket connects in the background. Returns False if there
+        is no saved session.
+        """
+        saved = load_session()
+        if saved is None:
+            return False
+        user, token = saved
+        self._start_session(user, token)
+        self.login_success.emit({'id': user.id, 'username': user.username})
+        return True
+
+    def _start_session(self, user, token):
         self.http_client.set_token(token)
+        if self.message_cache is None:
+            self.current_user = user
+            self.message_cache = MessageCache.for_user(user.id)
+            # Messages left unsent by the last session go out once the socket is up
+            pending = self.outbox.load(self.message_cache, user)
+            for message in pending:
+                self._pending[message.client_id] = message
+            self.message_store.add_messages([m for m in pending if m.conversation_id is not None])
+        # Otherwise a log-in again after session_expired: only the token changes
         self.socket_manager.connect(token)
-        
-        self.login_success.emit(user_info)
+
+    @Slot()
+    def on_auth_rejected(self):
+        clear_session()
+        self.session_expired.emit()
 
     def search_users(self, query):
-        if query:
-            self.http_client.search_users(query)
+        query = query.strip()
+        if not query:
+            return
+        self._search_request_id += 1
+        cached = self.user_search_cache.lookup(query)
+        if cached is not None:
+            users, complete = cached
+            # Answer from the cache right away; only ask the server if it may know more
+            self.user_search_success.emit(query, users)
+            if complete:
+                return
+        self.http_client.search_users(query, self._search_request_id)
 
-    @Slot(list)
-    def on_user_search_success(self, users_data):
+    @Slot(int, str, list)
+    def on_user_search_success(self, request_id, query, users_data):
         users = [User(**data) for data in users_data]
-        self.user_search_success.emit(users)
+        self.user_search_cache.store(query, users)
+        if self.message_cache:
+            self.message_cache.save_users(users)
+        if request_id == self._search_request_id:
+            self.user_search_success.emit(query, users)
+
+    @Slot(int, str)
+    def on_user_search_error(self, request_id, error_msg):
+        if request_id == self._search_request_id:
+            self.user_search_error.emit(error_msg)
+
+    def search_messages(self, text):
+        """
+        Searches every cached message; results arrive in message_search_finished.
+        Every message that passes through the controller is saved to the cache,
+        so the index covers all history and live messages seen on this device.
+        """
+        if self.message_cache and text.strip():
+            self.message_search.search(self.message_cache.path, text)
 
     def start_new_conversation_with_user(self, user: User):
         # This is a client-side action to create a new conversation view.
@@ -88,56 +206,271 @@ class ChatController(QObject):
         new_convo = Conversation(id=f"temp_{user.id}", participants=[self.current_user, user])
         self.new_conversation_started.emit(new_convo)
 
+    def cached_conversations(self):
+        """Conversations known from the local cache, most recent first."""
+        if not self.message_cache:
+            return []
+        return self.message_cache.load_conversations(self.current_user)
+
+    def cached_conversation(self, conversation_id):
+        """A conversation from the local cache (e.g. for a search hit), or None."""
+        if not self.message_cache:
+            return None
+        return self.message_cache.load_conversation(conversation_id, self.current_user)
+
+    def set_active_conversation(self, conversation_id):
+        """
+        Called when the chat view switches to conversation_id: its history
+        requests go ahead of queued ones for other conversations, and image
+        fetches still queued for the previous view are dropped.
+        """
+        self.http_client.set_focus(conversation_id)
+        self.image_loader.cancel_queued()
+
     def load_conversation_history(self, conversation_id):
         # Don't try to load history for temporary client-side conversations
         if isinstance(conversation_id, str) and conversation_id.startswith('temp_'):
             return
+        if self.message_cache:
+            cached, has_more = self.message_cache.load_latest(conversation_id, HttpClient.HISTORY_PAGE_SIZE)
+            if cached:
+                # Render from disk right away, then only ask for what is newer
+                self.message_store.add_messages(cached)
+                self.history_loaded.emit(conversation_id, cached, has_more)
+                self.http_client.get_message_history(
+                    conversation_id, after_id=self.message_cache.synced_message_id(conversation_id))
+                return
         self.http_client.get_message_history(conversation_id)
 
-    @Slot(list)
-    def on_history_loaded(self, messages_data):
-        # Assuming the API returns messages for one conversation at a time
-        if not messages_data:
+    def load_older_history(self, conversation_id, before_id):
+        """Requests the page of messages preceding before_id."""
+        if isinstance(conversation_id, str) and conversation_id.startswith('temp_'):
             return
+        if self.message_cache:
+            cached_page = self.message_cache.load_before(conversation_id, before_id, HttpClient.HISTORY_PAGE_SIZE)
+            if cached_page is not None:
+                self.message_store.add_messages(cached_page[0])
+                self.older_history_loaded.emit(conversation_id, *cached_page)
+                return
+        self.http_client.get_message_history(conversation_id, before_id=before_id)
+
+    @Slot(object, dict, list)
+    @timed_slot('ChatController.on_history_loaded')
+    def on_history_loaded(self, conversation_id, cursor, messages):
+        # Already decoded into Messages by the HTTP worker
+        # A full page means the server may have more beyond it
+        has_more = len(messages) >= HttpClient.HISTORY_PAGE_SIZE
+        if self._pending:
+            # A page can hold one of our sends whose ack was lost, e.g. in an earlier session
+            for message in messages:
+                self._confirm(message)
+        if self.message_cache:
+            self.message_cache.save_messages(messages)
+            self._record_synced_page(conversation_id, cursor, messages, has_more)
+        added = self.message_store.add_messages(messages)
+
+        if 'after' in cursor:
+            if added:
+                self.history_delta_loaded.emit(conversation_id, added)
+            if has_more:
+                self.http_client.get_message_history(conversation_id, after_id=messages[-1].id)
+        elif 'before' in cursor:
+            self.older_history_loaded.emit(conversation_id, messages, has_more)
+        else:
+            self.history_loaded.emit(conversation_id, messages, has_more)
+
+    @Slot()
+    def fill_message_gaps(self):
+        """
+        Catches up after the socket was down: for every conversation loaded this
+        session, asks for the messages after the newest one we have. The pages
+        merge through on_history_loaded like any other delta, so nothing is
+        shown twice. Conversations not loaded yet catch up when they are opened.
+        """
+        for conversation_id in self.message_store.conversation_ids():
+            last_id = self.message_store.latest_server_message_id(conversation_id)
+            if last_id is not None:
+                self.http_client.get_message_history(conversation_id, after_id=last_id)
 
-        conversation_id = messages_data[0]['conversation_id']
-        messages = [Message(**msg) for msg in messages_data]
-        self.history_loaded.emit(conversation_id, messages)
+    def _record_synced_page(self, conversation_id, cursor, messages, has_more):
+        """Widens the cache's gap-free range by the span this page is known to cover."""
+        if 'after' in cursor:
+            low = cursor['after']
+            high = messages[-1].id if messages else low
+        else:
+            if not messages and 'before' not in cursor:
+                return
+            # A short page backwards means we reached the first message
+            low = messages[0].id if has_more else 0
+            high = cursor.get('before', messages[-1].id if messages else 0)
+        self.message_cache.extend_synced_range(conversation_id, low, high)
 
-    def send_message(self, recipient_id, message_text):
+    def send_message(self, recipient_id, message_text, conversation_id=None):
+        """
+        Queues a text message in the outbox. If conversation_id is given, a
+        pending copy shows in it at once; message_confirmed replaces it with
+        the server's message, message_send_failed reports a rejection.
+        """
         if not message_text.strip():
-            return
-        self.socket_manager.send_message(recipient_id, message_text)
+            return None
+        self.presence.reset_typing(recipient_id)
+        return self._send('message:send', {'recipientId': recipient_id, 'content': message_text},
+                          'text', message_text, conversation_id)
+
+    def _send(self, event, data, content_type, content, conversation_id):
+        client_id = uuid.uuid4().hex
+        message = Message(next_local_message_id(), conversation_id, self.current_user.id, content_type, content,
+                          int(time.time() * 1000), self.current_user.username, client_id)
+        self._pending[client_id] = message
+        self._sent_at[client_id] = time.perf_counter()
+        if conversation_id is not None:
+            self.message_store.add_messages([message])
+        self.outbox.enqueue(event, dict(data, clientId=client_id), message)
+        return message
+
+    def _confirm(self, message):
+        """Replaces the pending copy of one of our messages with the server's. False if there is none."""
+        pending = self._pending.pop(message.client_id, None) if message.client_id else None
+        if pending is None:
+            return False
+        sent_at = self._sent_at.pop(message.client_id, None)
+        if sent_at is not None:
+            message_send_rtt.observe((time.perf_counter() - sent_at) * 1000)
+        self.message_store.remove_message(pending.id)
+        self.message_store.add_messages([message])
+        if self.message_cache:
+            self.message_cache.save_messages([message])
+        self.message_confirmed.emit(pending, message)
+        return True
+
+    @Slot(str, dict)
+    def on_message_acked(self, client_id, row):
+        # Usually the echo got here first and this finds nothing pending
+        self._confirm(decode_messages([row])[0])
+
+    @Slot(str, str)
+    def on_message_rejected(self, client_id, error_msg):
+        pending = self._pending.pop(client_id, None)
+        self._sent_at.pop(client_id, None)
+        if pending is not None:
+            self.message_store.remove_message(pending.id)
+            self.message_send_failed.emit(pending, error_msg)
 
     def send_file(self, recipient_id, file_path):
-        # The upload process is now fully async
-        # The UI should listen to upload_complete and upload_failed signals
-        self.http_client.upload_file(file_path)
+        # The upload streams in chunks on the network loop and returns a key.
+        # The UI holds the context (recipient_id) for that key, listens to
+        # upload_progress/upload_complete/upload_failed and calls
+        # send_file_message once the upload is confirmed.
+        if not needs_preparing(file_path):
+            return self.http_client.upload_file(file_path)
+        # Images are prepared first; the key is handed out now and reused for the upload
+        upload_key = uuid.uuid4().hex
+        self._preparing[upload_key] = file_path
+        self.image_preparer.prepare(upload_key, file_path)
+        return upload_key
 
-    @Slot(dict)
-    def on_upload_complete(self, upload_result):
-        # This slot is now a potential point of confusion.
-        # The controller doesn't know which conversation the file was for.
-        # The UI (e.g., ChatView) will need to hold the context (recipient_id)
-        # and call send_file_message after receiving the upload_complete signal.
-        self.upload_complete.emit(upload_result)
-
-    def send_file_message(self, recipient_id, upload_result):
-        """Called by the UI after a file upload is confirmed."""
-        self.socket_manager.send_file_message(
-            recipient_id,
-            upload_result['fileUrl'],
-            upload_result['fileName'],
-            upload_result['fileType']
-        )
+    @Slot(str, dict)
+    def on_image_prepared(self, upload_key, result):
+        if self._preparing.pop(upload_key, None) is None:
+            self._discard_prepared(result) # Cancelled meanwhile
+            return
+        self._prepared[upload_key] = result
+        self.http_client.upload_file(result['path'], upload_key)
 
-    @Slot(dict)
-    def on_message_received(self, message_data):
-        message = Message(**message_data)
-        self.new_message_received.emit(message)
+    @Slot(str)
+    def on_image_prepare_failed(self, upload_key):
+        # Not decodable here (or the worker died): send the file as it is
+        file_path = self._preparing.pop(upload_key, None)
+        if file_path is not None:
+            self.http_client.upload_file(file_path, upload_key)
+
+    @Slot(str, dict)
+    def on_upload_complete(self, upload_key, upload_result):
+        prepared = self._prepared.pop(upload_key, None)
+        if prepared is not None:
+            self._discard_prepared(prepared)
+            # Recipients size the bubble and draw the preview before downloading anything
+            upload_result = dict(upload_result, width=prepared['width'], height=prepared['height'],
+                                 thumbnail=prepared['thumbnail'])
+        self.upload_complete.emit(upload_key, upload_result)
+
+    @Slot(str)
+    def on_upload_cancelled(self, upload_key):
+        prepared = self._prepared.pop(upload_key, None)
+        if prepared is not None:
+            self._discard_prepared(prepared)
+        self.upload_cancelled.emit(upload_key)
+
+    def _discard_prepared(self, prepared):
+        try:
+            os.remove(prepared['path'])
+            os.rmdir(os.path.dirname(prepared['path']))
+        except OSError:
+            pass
+
+    def cancel_upload(self, upload_key):
+        if self._preparing.pop(upload_key, None) is not None:
+            self.upload_cancelled.emit(upload_key)
+            return
+        self.http_client.cancel_upload(upload_key)
+
+    def resume_upload(self, upload_key):
+        """Continues a failed upload from the last chunk the server acknowledged."""
+        return self.http_client.resume_upload(upload_key)
+
+    def send_file_message(self, recipient_id, upload_result, conversation_id=None):
+        """Called by the UI after a file upload is confirmed. Queued like send_message."""
+        file_type = upload_result['fileType']
+        preview = {key: upload_result[key] for key in ('width', 'height', 'thumbnail') if upload_result.get(key)}
+        content = json.dumps({'url': upload_result['fileUrl'], 'name': upload_result['fileName'], 'type': file_type,
+                              **preview})
+        return self._send('file:send', {
+            'recipientId': recipient_id,
+            'fileUrl': upload_result['fileUrl'],
+            'fileName': upload_result['fileName'],
+            'fileType': file_type,
+            **preview,
+        }, 'image' if file_type.startswith('image/') else 'file', content, conversation_id)
+
+    def download_file(self, message):
+        """Fetches the attachment of a file message into the local download cache."""
+        file_info = message.file_info
+        if file_info and file_info.url:
+            self.download_manager.download(file_info.url, file_info.name or '')
+
+    def cancel_download(self, message):
+        file_info = message.file_info
+        if file_info and file_info.url:
+            self.download_manager.cancel(file_info.url)
+
+    @Slot(list)
+    @timed_slot('ChatController.on_messages_received')
+    def on_messages_received(self, messages_data):
+        # One store insert and one cache transaction per batch, so a burst of
+        # events costs a single relayout in each view
+        messages = decode_messages(messages_data)
+        if self._pending:
+            # The echoes of our own sends replace their pending copies instead
+            messages = [message for message in messages if not self._confirm(message)]
+        # The echo of our own message may already have arrived with a history page
+        added = self.message_store.add_messages(messages)
+        if not added:
+            return
+        for message in added:
+            # A delivered message ends its sender's typing indicator
+            self.presence.clear_typing(message.sender_id)
+        if self.message_cache:
+            self.message_cache.save_messages(added)
+        self.new_messages_received.emit(added)
 
     def send_typing_notification(self, recipient_id):
-        self.socket_manager.send_typing_notification(recipient_id)
+        # Throttled per recipient; call it on every keystroke
+        self.presence.send_typing(recipient_id)
 
     def shutdown(self):
+        if self.metrics_dumper:
+            self.metrics_dumper.dump()
         self.socket_manager.disconnect()
+        self.image_preparer.shutdown()
+        if self.message_cache:
+            self.message_cache.close()
@@ -0,0 +1,188 @@
+# app/download_manager.py
+import asyncio
+import hashlib
+import os
+import time
+import aiohttp
+from PySide6.QtCore import QObject, Signal, Slot
+from .network import NetworkJob, TRANSFER_TIMEOUT, error_message, network_loop, read_response
+from .scheduler import PRIORITY_HIGH, network_scheduler
+from .settings import cache_dir
+
+class DownloadSignals(QObject):
+    download_progress = Signal(str, 'qint64', 'qint64') # url, bytes received, total bytes (0 if unknown)
+    download_finished = Signal(str, str) # url, local path
+    download_failed = Signal(str, str) # url, error message
+    download_cancelled = Signal(str) # url
+
+class Download(NetworkJob):
+    """
+    Streams one file to disk in CHUNK_SIZE pieces. Data goes to a .part file
+    first; after a dropped connection the transfer continues with an HTTP
+    Range request from the bytes already on disk.
+    """
+    CHUNK_SIZE = 256 * 1024
+    MAX_RETRIES = 5
+    # Minimum time between progress signals, so a fast link does not flood the GUI thread
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, url, full_url, path, lane):
+        super().__init__()
+        self.url = url
+        self.full_url = full_url
+        self.path = path
+        self.part_path = f"{path}.part"
+        self.lane = lane # Scheduler lane the transfer takes a slot in
+        self.signals = DownloadSignals()
+        self._last_progress = 0.0
+
+    def _report_progress(self, received, total, force=False):
+        now = time.monotonic()
+        if force or now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = now
+            self.signals.download_progress.emit(self.url, received, total)
+
+    async def _transfer(self):
+        received = os.path.getsize(self.part_path) if os.path.exists(self.part_path) else 0
+        headers = {'Range': f'bytes={received}-'} if received else {}
+        async with network_loop().session().get(self.full_url, headers=headers, timeout=TRANSFER_TIMEOUT) as response:
+            if response.status == 416:
+                # Nothing left to fetch: the .part file already holds the whole resource
+                return
+            if response.status >= 400:
+                await read_response(response) # Raises with the error body
+            if received and response.status != 206:
+                received = 0 # Server ignored the Range header and sent the whole file
+            total = received + (response.content_length or 0)
+            loop = asyncio.get_running_loop()
+            with open(self.part_path, 'ab' if received else 'wb') as part_file:
+                async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                    # On an executor thread: a slow disk must not stall the network loop
+                    await loop.run_in_executor(None, part_file.write, chunk)
+                    received += len(chunk)
+                    self._report_progress(received, total)
+            self._report_progress(received, total, force=True)
+
+    async def run(self):
+        retries = 0
+        try:
+            # Ahead of queued uploads: the user is waiting to open this file
+            async with self.lane.slot(PRIORITY_HIGH, self.url):
+                while True:
+                    try:
+                        await self._transfer()
+                        break
+                    except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError):
+                        retries += 1
+                        if retries > self.MAX_RETRIES:
+                            raise
+                        await asyncio.sleep(min(2 ** retries, 30))
+            os.replace(self.part_path, self.path)
+            self.signals.download_finished.emit(self.url, self.path)
+        except asyncio.CancelledError:
+            # Keep the .part file: a later download of the same url resumes from it
+            self.signals.download_cancelled.emit(self.url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.signals.download_failed.emit(self.url, error_message(e))
+        except OSError as e:
+            self.signals.download_failed.emit(self.url, f"Failed to write file: {e}")
+
+class DownloadManager(QObject):
+    """
+    Downloads file attachments into a local content cache, in the scheduler's
+    bulk lane. A url that was already downloaded is answered from disk without
+    touching the network.
+    """
+    download_progress = Signal(str, 'qint64', 'qint64') # url, bytes received, total bytes
+    download_finished = Signal(str, str) # url, local path
+    download_failed = Signal(str, str) # url, error message
+    download_cancelled = Signal(str) # url
+
+    def __init__(self, base_url, parent=None):
+        super().__init__(parent)
+        self.base_url = base_url
+        self.directory = cache_dir('downloads')
+        self._lane = network_scheduler().bulk
+        self._workers = {} # url -> Download
+        self._progress = {} # url -> (received, total)
+        self._finished = {} # url -> local path of completed downloads
+        self._missing = set() # urls known not to be on disk, until their download finishes
+
+    def _path_for(self, url, file_name):
+        # One folder per url keeps the original file name for the user while avoiding clashes
+        folder = os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest())
+        return os.path.join(folder, os.path.basename(file_name) or 'download')
+
+    def local_path(self, url, file_name):
+        """Path of the finished download for url, or None if it has not been downloaded."""
+        path = self._finished.get(url)
+        if path is None:
+            # Called from paint(): only hit the disk for urls we have not seen yet
+            if url in self._missing:
+                return None
+            path = self._path_for(url, file_name)
+            if not os.path.exists(path):
+                self._missing.add(url)
+                return None
+            self._finished[url] = path
+        return path
+
+    def is_downloading(self, url):
+        return url in self._workers
+
+    def progress(self, url):
+        """(bytes received, total bytes) of a running download, or None."""
+        return self._progress.get(url)
+
+    def download(self, url, file_name):
+        """Starts downloading url unless it is already cached or in progress."""
+        path = self.local_path(url, file_name)
+        if path is not None:
+            self.download_finished.emit(url, path)
+            return
+        if url in self._workers:
+            return
+        path = self._path_for(url, file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        full_url = url if url.startswith(('http://', 'https://')) else f"{self.base_url}{url}"
+        worker = Download(url, full_url, path, self._lane)
+        worker.signals.download_progress.connect(self._on_progress)
+        worker.signals.download_finished.connect(self._on_finished)
+        worker.signals.download_failed.connect(self._on_failed)
+        worker.signals.download_cancelled.connect(self._on_cancelled)
+        self._workers[url] = worker
+        self._progress[url] = (0, 0)
+        worker.start()
+
+    def cancel(self, url):
+        worker = self._workers.get(url)
+        if worker is not None:
+            # Also stops a download still waiting for a free slot
+            worker.cancel()
+
+    def _forget(self, url):
+        self._workers.pop(url, None)
+        self._progress.pop(url, None)
+
+    @Slot(str, 'qint64', 'qint64')
+    def _on_progress(self, url, received, total):
+        if url in self._workers:
+            self._progress[url] = (received, total)
+            self.download_progress.emit(url, received, total)
+
+    @Slot(str, str)
+    def _on_finished(self, url, path):
+        self._forget(url)
+        self._missing.discard(url)
+        self._finished[url] = path
+        self.download_finished.emit(url, path)
+
+    @Slot(str, str)
+    def _on_failed(self, url, error_message):
+        self._forget(url)
+        self.download_failed.emit(url, error_message)
+
+    @Slot(str)
+    def _on_cancelled(self, url):
+        self._forget(url)
+        self.download_cancelled.emit(url)
@@ -1,46 +1,282 @@
 # app/file_upload_manager.py
-import requests
-from PySide6.QtCore import QObject, Signal, QRunnable, Slot
+import asyncio
+import json
+import mimetypes
+import os
+import uuid
+import aiohttp
+from PySide6.QtCore import QObject, Signal, Slot
+from .metrics import metrics
+from .network import HttpError, NetworkJob, REQUEST_TIMEOUT, error_message, network_loop, read_response
+from .scheduler import network_scheduler
+from .upload_index import UploadIndex
+
+uploads_deduplicated = metrics.counter(
+    'deplao_uploads_deduplicated_total', 'Uploads skipped because the server already had the file, by where '
+    'that was found (index, server).', ('source',))
 
 class FileUploadSignals(QObject):
-    upload_complete = Signal(dict)
-    upload_error = Signal(str)
+    upload_session_created = Signal(str, str) # upload_key, upload_id
+    upload_session_lost = Signal(str) # upload_key; the server no longer knows its upload id
+    upload_progress = Signal(str, 'qint64', 'qint64') # upload_key, bytes acknowledged, total bytes
+    upload_complete = Signal(str, dict) # upload_key, upload result
+    upload_error = Signal(str, str) # upload_key, error message
+    upload_cancelled = Signal(str) # upload_key
+
+class ChunkedUpload(NetworkJob):
+    """
+    Streams one file to the resumable upload endpoint in CHUNK_SIZE pieces.
+    Only one chunk is held in memory at a time. After a network error the
+    upload asks the server for the last acknowledged offset and continues from
+    there; a new upload given the same upload_id does the same. Only
+    failures of the connection or the server are retried: a session the
+    server has lost (404, e.g. after a restart) is replaced by a new one from
+    offset 0, and any other 4xx fails the upload at once.
 
-class FileUploadWorker(QRunnable):
-    def __init__(self, file_path, token, host='http://localhost:3000'):
+    With an index, a new upload first hashes the file and skips the transfer
+    if that content was sent before (index) or the server already has it.
+    """
+    CHUNK_SIZE = 1024 * 1024
+    MAX_RETRIES = 5
+
+    def __init__(self, base_url, headers, upload_key, file_path, lane, upload_id=None, index=None):
         super().__init__()
+        self.base_url = base_url
+        self.headers = headers
+        self.upload_key = upload_key
         self.file_path = file_path
-        self.token = token
-        self.host = host
+        self.lane = lane # Scheduler lane the transfer takes a slot in
+        self.upload_id = upload_id
+        self.index = index # UploadIndex shared by the manager's uploads, or None
+        self.digest = None # SHA-256 of the file, once hashed
         self.signals = FileUploadSignals()
 
-    @Slot()
-    def run(self):
+    async def _request(self, method, endpoint, **kwargs):
+        session = network_loop().session()
+        async with session.request(method, f"{self.base_url}/api/upload{endpoint}",
+                                   headers={**self.headers, **kwargs.pop('headers', {})},
+                                   timeout=REQUEST_TIMEOUT, **kwargs) as response:
+            if response.status == 409:
+                # The server holds a different offset than we sent; continue from its offset
+                body = await response.read()
+            else:
+                body = await read_response(response)
         try:
-            with open(self.file_path, 'rb') as f:
-                files = {'file': f}
-                headers = {'Authorization': f'Bearer {self.token}'}
-                response = requests.post(f'{self.host}/api/upload', files=files, headers=headers)
-                response.raise_for_status()
-                self.signals.upload_complete.emit(response.json())
-        except requests.exceptions.RequestException as e:
-            self.signals.upload_error.emit(str(e))
+            result = json.loads(body) if body else {}
+        except ValueError:
+            result = None
+        if not isinstance(result, dict):
+            raise aiohttp.ClientError("Malformed response from the upload server.")
+        return result
 
-class FileUploadManager(QObject):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        # You would typically use a QThreadPool to manage workers
-    
-    def upload_file(self, file_path, token):
-        # In a real app, you'd create a worker and run it in a QThreadPool
-        # For simplicity, this is a blocking example. Use QThreadPool for production.
+    @staticmethod
+    def _retryable(error):
+        """Whether a failed request is worth repeating: the connection or the server failed, not the request."""
+        if isinstance(error, HttpError):
+            return error.status >= 500
+        return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+    @staticmethod
+    def _field(result, key, kind):
+        """result[key], raising ClientError (which run() handles) if the server left it out."""
+        value = result.get(key)
+        if not isinstance(value, kind) or isinstance(value, bool):
+            raise aiohttp.ClientError(f"Malformed response from the upload server: no {key}.")
+        return value
+
+    def _file_name_and_type(self):
+        file_name = os.path.basename(self.file_path)
+        return file_name, mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+
+    async def _find_existing(self, size):
+        """The upload result for content the server already holds, or None if the file has to be sent."""
+        loop = asyncio.get_running_loop()
+        file_name, file_type = self._file_name_and_type()
+        file_url = await loop.run_in_executor(None, self.index.lookup, self.base_url, self.digest)
+        if file_url is not None:
+            uploads_deduplicated.inc('index')
+            return {'message': 'File uploaded successfully.', 'fileUrl': file_url,
+                    'fileName': file_name, 'fileType': file_type}
         try:
-            with open(file_path, 'rb') as f:
-                files = {'file': f}
-                headers = {'Authorization': f'Bearer {token}'}
-                response = requests.post('http://localhost:3000/api/upload', files=files, headers=headers)
-                response.raise_for_status()
-                return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"Upload failed: {e}")
+            async with network_scheduler().api.slot():
+                result = await self._request('POST', '/by-digest', json={
+                    'sha256': self.digest, 'size': size, 'fileName': file_name, 'fileType': file_type})
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return None # 404: not there. Any other failure: the upload has its own retries
+        if not isinstance(result.get('fileUrl'), str):
             return None
+        uploads_deduplicated.inc('server')
+        await loop.run_in_executor(None, self.index.store, self.base_url, self.digest, result['fileUrl'])
+        return result
+
+    async def _create_session(self, size):
+        file_name, file_type = self._file_name_and_type()
+        result = await self._request('POST', '/sessions', json={'fileName': file_name, 'fileType': file_type, 'size': size})
+        self.upload_id = self._field(result, 'uploadId', str)
+        self.signals.upload_session_created.emit(self.upload_key, self.upload_id)
+        return self._field(result, 'offset', int)
+
+    def _read_chunk(self, file_handle, offset):
+        # Runs on an executor thread: a slow disk must not stall the network loop
+        file_handle.seek(offset)
+        return file_handle.read(self.CHUNK_SIZE)
+
+    async def _send_chunks(self, file_handle, offset, size):
+        loop = asyncio.get_running_loop()
+        while offset < size:
+            chunk = await loop.run_in_executor(None, self._read_chunk, file_handle, offset)
+            result = await self._request('PUT', f'/sessions/{self.upload_id}', data=chunk, headers={
+                'Content-Type': 'application/octet-stream',
+                'Upload-Offset': str(offset),
+            })
+            offset = self._field(result, 'offset', int)
+            self.signals.upload_progress.emit(self.upload_key, offset, size)
+        return offset
+
+    async def run(self):
+        retries = 0
+        try:
+            size = os.path.getsize(self.file_path)
+            if self.index is not None:
+                # Hashed on a worker thread (once per file version); a resumed upload needs it to index its URL too
+                self.digest = await asyncio.get_running_loop().run_in_executor(None, self.index.digest, self.file_path)
+                existing = await self._find_existing(size) if self.upload_id is None else None
+                if existing is not None:
+                    self.signals.upload_progress.emit(self.upload_key, size, size)
+                    self.signals.upload_complete.emit(self.upload_key, existing)
+                    return
+            async with self.lane.slot():
+                with open(self.file_path, 'rb') as file_handle:
+                    while True:
+                        try:
+                            if self.upload_id is None:
+                                offset = await self._create_session(size)
+                            else:
+                                status = await self._request('GET', f'/sessions/{self.upload_id}')
+                                offset = self._field(status, 'offset', int)
+                            self.signals.upload_progress.emit(self.upload_key, offset, size)
+                            await self._send_chunks(file_handle, offset, size)
+                            result = await self._request('POST', f'/sessions/{self.upload_id}/complete')
+                            if isinstance(result.get('fileUrl'), str):
+                                break
+                            # The server is missing bytes (409): go round again from its offset
+                            retries += 1
+                            if retries > self.MAX_RETRIES:
+                                raise aiohttp.ClientError(result.get('message', 'Upload is incomplete.'))
+                        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                            retries += 1
+                            if isinstance(e, HttpError) and e.status == 404 and self.upload_id is not None:
+                                if retries > self.MAX_RETRIES:
+                                    raise
+                                # Sessions live in the server's memory: start a new one from offset 0
+                                self.upload_id = None
+                                self.signals.upload_session_lost.emit(self.upload_key)
+                                continue
+                            if not self._retryable(e) or retries > self.MAX_RETRIES:
+                                raise
+                            # Back off, then resume from whatever the server acknowledged
+                            await asyncio.sleep(min(2 ** retries, 30))
+            if self.index is not None:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.index.store, self.base_url, self.digest, result['fileUrl'])
+            self.signals.upload_complete.emit(self.upload_key, result)
+        except asyncio.CancelledError:
+            if self.upload_id is not None:
+                try:
+                    await self._request('DELETE', f'/sessions/{self.upload_id}')
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    pass
+            self.signals.upload_cancelled.emit(self.upload_key)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.signals.upload_error.emit(self.upload_key, error_message(e))
+        except OSError as e:
+            self.signals.upload_error.emit(self.upload_key, f"Failed to read file: {e}")
+
+class FileUploadManager(QObject):
+    """
+    Runs chunked uploads in the scheduler's bulk lane, so large transfers never
+    crowd out interactive API calls. Remembers the server-side upload id of
+    every unfinished upload so it can be resumed.
+    """
+    upload_progress = Signal(str, 'qint64', 'qint64') # upload_key, bytes acknowledged, total bytes
+    upload_complete = Signal(str, dict) # upload_key, upload result
+    upload_error = Signal(str, str) # upload_key, error message
+    upload_cancelled = Signal(str) # upload_key
+
+    def __init__(self, base_url, parent=None):
+        super().__init__(parent)
+        self.base_url = base_url
+        self._lane = network_scheduler().bulk
+        # Content already on the server, so a file sent before is not transferred again
+        self.index = UploadIndex()
+        self._uploads = {} # upload_key -> {'file_path', 'upload_id', 'worker'}
+
+    def upload_file(self, file_path, headers, upload_key=None):
+        """
+        Starts uploading file_path and returns the key identifying this upload
+        in signals: upload_key if given (a caller that handed out the key
+        before the file was ready), otherwise a new one.
+        """
+        upload_key = upload_key or uuid.uuid4().hex
+        self._uploads[upload_key] = {'file_path': file_path, 'upload_id': None, 'worker': None}
+        self._start_worker(upload_key, headers)
+        return upload_key
+
+    def resume(self, upload_key, headers):
+        """Restarts an interrupted upload from the last offset the server acknowledged."""
+        upload = self._uploads.get(upload_key)
+        if upload is None or upload['worker'] is not None:
+            return False
+        self._start_worker(upload_key, headers)
+        return True
+
+    def cancel(self, upload_key):
+        upload = self._uploads.get(upload_key)
+        if upload is None:
+            return
+        if upload['worker'] is not None:
+            upload['worker'].cancel()
+        else:
+            # Interrupted upload that is not running: just forget it
+            del self._uploads[upload_key]
+            self.upload_cancelled.emit(upload_key)
+
+    def _start_worker(self, upload_key, headers):
+        upload = self._uploads[upload_key]
+        worker = ChunkedUpload(self.base_url, headers, upload_key, upload['file_path'], self._lane,
+                               upload_id=upload['upload_id'], index=self.index)
+        worker.signals.upload_session_created.connect(self._on_session_created)
+        worker.signals.upload_session_lost.connect(self._on_session_lost)
+        worker.signals.upload_progress.connect(self.upload_progress)
+        worker.signals.upload_complete.connect(self._on_complete)
+        worker.signals.upload_error.connect(self._on_error)
+        worker.signals.upload_cancelled.connect(self._on_cancelled)
+        upload['worker'] = worker
+        worker.start()
+
+    @Slot(str, str)
+    def _on_session_created(self, upload_key, upload_id):
+        if upload_key in self._uploads:
+            self._uploads[upload_key]['upload_id'] = upload_id
+
+    @Slot(str)
+    def _on_session_lost(self, upload_key):
+        if upload_key in self._uploads:
+            self._uploads[upload_key]['upload_id'] = None
+
+    @Slot(str, dict)
+    def _on_complete(self, upload_key, result):
+        self._uploads.pop(upload_key, None)
+        self.upload_complete.emit(upload_key, result)
+
+    @Slot(str, str)
+    def _on_error(self, upload_key, error_message):
+        # Keep the entry (and its upload id) so resume() can pick up where it stopped
+        if upload_key in self._uploads:
+            self._uploads[upload_key]['worker'] = None
+        self.upload_error.emit(upload_key, error_message)
+
+    @Slot(str)
+    def _on_cancelled(self, upload_key):
+        self._uploads.pop(upload_key, None)
+        self.upload_cancelled.emit(upload_key)
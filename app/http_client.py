@@ -1,44 +1,33 @@
 # app/http_client.py
-import requests
-from PySide6.QtCore import QObject, Signal, QRunnable, Slot, QThreadPool
-
-class HttpClientSignals(QObject):
-    request_finished = Signal(object)
-    request_error = Signal(str)
-
-class ApiWorker(QRunnable):
-    def __init__(self, method, url, headers=None, json_data=None, files=None):
-        super().__init__()
-        self.method = method
-        self.url = url
-        self.headers = headers
-        self.json_data = json_data
-        self.files = files
-        self.signals = HttpClientSignals()
-
-    @Slot()
-    def run(self):
-        try:
-            response = requests.request(
-                self.method,
-                self.url,
-                headers=self.headers,
-                json=self.json_data,
-                files=self.files,
-                timeout=10 # 10-second timeout
-            )
-            response.raise_for_status()
-            self.signals.request_finished.emit(response.json())
-        except requests.exceptions.RequestException as e:
-            error_message = str(e)
-            if e.response is not None:
-                error_message = f"{e.response.status_code}: {e.response.text}"
-            self.signals.request_error.emit(error_message)
-        except json.JSONDecodeError:
-            self.signals.request_error.emit("Failed to decode server response.")
+import asyncio
+import json
+import re
+import time
+import aiohttp
+from PySide6.QtCore import QObject, Signal, Slot
+from .file_upload_manager import FileUploadManager
+from .metrics import metrics
+from .models import decode_messages
+from .network import API_TIMEOUT, error_message, network_loop, read_response
+from .scheduler import PRIORITY_HIGH, PRIORITY_NORMAL, network_scheduler
+from .settings import SERVER_URL
+
+http_request_time = metrics.histogram(
+    'deplao_http_request_ms', 'HTTP request time per endpoint, ms.', ('method', 'endpoint'))
+http_request_errors = metrics.counter(
+    'deplao_http_request_errors_total', 'Failed HTTP requests per endpoint.', ('method', 'endpoint'))
+http_queue_wait = metrics.histogram(
+    'deplao_http_queue_wait_ms', 'Time HTTP requests wait to start (network loop and API lane), ms.')
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+def endpoint_label(endpoint):
+    # "/api/chat/42/messages" -> "/api/chat/:id/messages", so ids do not explode the label set
+    return _ID_SEGMENT.sub('/:id', endpoint)
 
 class HttpClient(QObject):
-    BASE_URL = "http://localhost:3000"
+    BASE_URL = SERVER_URL
+    HISTORY_PAGE_SIZE = 50
     
     login_success = Signal(dict)
     login_error = Signal(str)
@@ -46,45 +35,99 @@ class HttpClient(QObject):
     register_success = Signal(dict)
     register_error = Signal(str)
     
-    history_success = Signal(list)
+    history_success = Signal(object, dict, list) # conversation_id, cursor, messages
     history_error = Signal(str)
 
-    upload_success = Signal(dict)
-    upload_error = Signal(str)
+    upload_progress = Signal(str, 'qint64', 'qint64') # upload_key, bytes acknowledged, total bytes
+    upload_success = Signal(str, dict) # upload_key, upload result
+    upload_error = Signal(str, str) # upload_key, error message
+    upload_cancelled = Signal(str) # upload_key
+
+    user_search_success = Signal(int, str, list) # request_id, query, users
+    user_search_error = Signal(int, str) # request_id, error message
 
-    user_search_success = Signal(list)
-    user_search_error = Signal(str)
+    # Internal: carries (callback, result) from the network loop to the GUI thread
+    _request_done = Signal(object, object)
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.thread_pool = QThreadPool()
+        self.network = network_loop()
+        self.scheduler = network_scheduler()
         self.token = None
+        self._request_done.connect(self._deliver)
+
+        self.upload_manager = FileUploadManager(self.BASE_URL, self)
+        self.upload_manager.upload_progress.connect(self.upload_progress)
+        self.upload_manager.upload_complete.connect(self.upload_success)
+        self.upload_manager.upload_error.connect(self.upload_error)
+        self.upload_manager.upload_cancelled.connect(self.upload_cancelled)
 
     def _create_headers(self):
         if not self.token:
             return {}
         return {'Authorization': f'Bearer {self.token}'}
 
-    def _execute_request(self, method, endpoint, on_success, on_error, json_data=None, files=None):
-        # To support search, we need to handle params for GET requests
-        url = f"{self.BASE_URL}{endpoint}"
-        worker = ApiWorker(
-            method=method,
-            url=url,
-            headers=self._create_headers(),
-            json_data=json_data,
-            files=files
-        )
-        worker.signals.request_finished.connect(on_success)
-        worker.signals.request_error.connect(on_error)
-        self.thread_pool.start(worker)
+    @Slot(object, object)
+    def _deliver(self, callback, result):
+        callback(result)
+
+    def _execute_request(self, method, endpoint, on_success, on_error, json_data=None, params=None, decode=None,
+                         priority=PRIORITY_NORMAL, conversation_id=None):
+        """
+        Runs the request in the scheduler's API lane; on_success(result) or
+        on_error(message) is then called on the GUI thread. decode is an optional
+        callable applied to the JSON body on the network thread, e.g. to build
+        model objects. A request for conversation_id is prioritized by whether
+        that conversation is in focus, instead of by priority.
+        """
+        self.network.submit(self._request(
+            method, endpoint, on_success, on_error, self._create_headers(), json_data, params, decode,
+            priority, conversation_id, time.perf_counter()))
+
+    async def _request(self, method, endpoint, on_success, on_error, headers, json_data, params, decode,
+                       priority, conversation_id, queued_at):
+        label = endpoint_label(endpoint) # Metrics label
+        if conversation_id is not None:
+            priority = self.scheduler.conversation_priority(conversation_id)
+        try:
+            async with self.scheduler.api.slot(priority, conversation_id):
+                started_at = time.perf_counter()
+                http_queue_wait.observe((started_at - queued_at) * 1000)
+                async with self.network.session().request(method, f"{self.BASE_URL}{endpoint}", headers=headers,
+                                                          params=params, json=json_data,
+                                                          timeout=API_TIMEOUT) as response:
+                    body = await read_response(response)
+            http_request_time.observe((time.perf_counter() - started_at) * 1000, method, label)
+            result = json.loads(body)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            http_request_errors.inc(method, label)
+            self._request_done.emit(on_error, error_message(e))
+            return
+        except ValueError:
+            http_request_errors.inc(method, label)
+            self._request_done.emit(on_error, "Failed to decode server response.")
+            return
+        if decode is not None:
+            try:
+                result = decode(result)
+            except Exception:
+                # A malformed row (missing key, wrong type) must still answer the caller, who may be waiting on it
+                http_request_errors.inc(method, label)
+                self._request_done.emit(on_error, "Failed to decode server response.")
+                return
+        self._request_done.emit(on_success, result)
+
+    def get(self, endpoint, on_success, on_error, params=None):
+        """GET endpoint; the decoded JSON body goes to on_success, an error message to on_error."""
+        self._execute_request('GET', endpoint, on_success, on_error, params=params)
 
     def login(self, username, password):
         self._execute_request(
             'POST', '/api/auth/login',
             self.login_success.emit,
             self.login_error.emit,
-            json_data={'username': username, 'password': password}
+            json_data={'username': username, 'password': password},
+            priority=PRIORITY_HIGH
         )
 
     def register(self, username, password):
@@ -92,36 +135,57 @@ class HttpClient(QObject):
             'POST', '/api/auth/register',
             self.register_success.emit,
             self.register_error.emit,
-            json_data={'username': username, 'password': password}
+            json_data={'username': username, 'password': password},
+            priority=PRIORITY_HIGH
         )
 
-    def search_users(self, query):
+    def search_users(self, query, request_id):
+        """request_id is echoed back so callers can drop responses to queries they have moved past."""
         self._execute_request(
-            'GET', f'/api/users/search?q={query}',
-            self.user_search_success.emit,
-            self.user_search_error.emit
+            'GET', '/api/users/search',
+            lambda users: self.user_search_success.emit(request_id, query, users),
+            lambda error: self.user_search_error.emit(request_id, error),
+            params={'q': query},
+            priority=PRIORITY_HIGH
         )
 
-    def get_message_history(self, conversation_id):
+    def get_message_history(self, conversation_id, before_id=None, after_id=None, limit=HISTORY_PAGE_SIZE):
+        """
+        Fetches one page of history. Without a cursor this is the newest page.
+        before_id gives the page preceding that message, after_id the messages
+        following it (oldest first). The cursor is echoed back in history_success.
+        """
+        cursor = {}
+        if before_id is not None:
+            cursor['before'] = before_id
+        if after_id is not None:
+            cursor['after'] = after_id
         self._execute_request(
             'GET', f'/api/chat/{conversation_id}/messages',
-            self.history_success.emit,
-            self.history_error.emit
+            lambda messages: self.history_success.emit(conversation_id, cursor, messages),
+            self.history_error.emit,
+            params={'limit': limit, **cursor},
+            # The page becomes Message objects on the network thread, not on the GUI thread
+            decode=decode_messages,
+            conversation_id=conversation_id
         )
 
-    def upload_file(self, file_path):
-        try:
-            # File opening must be done in the main thread
-            file_handle = open(file_path, 'rb')
-            files = {'file': (file_path.split('/')[-1], file_handle)}
-            self._execute_request(
-                'POST', '/api/upload',
-                self.upload_success.emit,
-                self.upload_error.emit,
-                files=files
-            )
-        except IOError as e:
-            self.upload_error.emit(f"Failed to open file: {e}")
+    def upload_file(self, file_path, upload_key=None):
+        """
+        Streams file_path to the server in chunks on the network loop and returns
+        the upload key used by the upload_* signals, cancel_upload and resume_upload.
+        """
+        return self.upload_manager.upload_file(file_path, self._create_headers(), upload_key)
+
+    def cancel_upload(self, upload_key):
+        self.upload_manager.cancel(upload_key)
+
+    def resume_upload(self, upload_key):
+        return self.upload_manager.resume(upload_key, self._create_headers())
+
+    def set_focus(self, conversation_id):
+        """Queued history requests for conversation_id go first from now on; those for others wait."""
+        self.scheduler.set_focus(conversation_id)
 
     def set_token(self, token):
         self.token = token
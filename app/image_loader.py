@@ -0,0 +1,220 @@
+# app/image_loader.py
+import asyncio
+import base64
+import binascii
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+from PySide6.QtCore import QObject, Signal, Slot, QSize, Qt, QTimer
+from PySide6.QtGui import QImage, QPixmap
+from .network import REQUEST_TIMEOUT, HttpError, error_message, network_loop, read_response
+from .scheduler import network_scheduler
+from .settings import cache_dir
+
+class DiskImageCache:
+    """
+    Size-capped directory of encoded thumbnails, evicted least recently used
+    first (by mtime). Safe to use from several worker threads.
+    """
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def path_for(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.png')
+
+    def get(self, key):
+        path = self.path_for(key)
+        image = QImage(path)
+        if image.isNull():
+            return None
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        return image
+
+    def put(self, key, image):
+        path = self.path_for(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        if not image.save(tmp_path, 'PNG'):
+            return
+        size = os.path.getsize(tmp_path)
+        with self._lock:
+            if os.path.exists(path):
+                self._total_bytes -= os.path.getsize(path)
+            os.replace(tmp_path, path)
+            self._total_bytes += size
+            if self._total_bytes > self.max_bytes:
+                self._trim()
+
+    def _trim(self):
+        entries = sorted((entry for entry in os.scandir(self.directory) if entry.is_file()),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self._total_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._total_bytes -= size
+            except OSError:
+                pass
+
+class ImageLoader(QObject):
+    """
+    Asynchronous thumbnail provider for image messages.
+    thumbnail() never blocks: it returns a cached pixmap or None and schedules
+    the load, emitting image_ready once the pixmap is available. Decoded
+    thumbnails live in a byte-bounded in-memory LRU in front of a size-capped
+    disk cache, so each image is downloaded at most once per cache lifetime.
+    Images are fetched in the scheduler's media lane; reading the disk cache,
+    decoding and scaling run on a few worker threads so they never stall the
+    loop.
+    """
+    THUMBNAIL_SIZE = QSize(200, 150)
+    MEMORY_CACHE_BYTES = 64 * 1024 * 1024
+    DISK_CACHE_BYTES = 256 * 1024 * 1024
+    MAX_THREADS = 4
+    # Decoded inline previews kept; each is a few KB
+    PREVIEW_CACHE_SIZE = 500
+    # After a timeout, dropped connection or server error, wait this long before fetching again (ms)
+    RETRY_DELAY_MS = 10000
+
+    image_ready = Signal(str) # url
+    # Internal: cross from the network loop to the GUI thread
+    _loaded = Signal(str, QImage) # url, thumbnail
+    _load_failed = Signal(str, str, bool) # url, error, permanent (not worth retrying)
+    _load_cancelled = Signal(str) # url
+
+    def __init__(self, base_url, parent=None):
+        super().__init__(parent)
+        self.base_url = base_url
+        self.network = network_loop()
+        self.scheduler = network_scheduler()
+        self.executor = ThreadPoolExecutor(self.MAX_THREADS, thread_name_prefix='deplao-images')
+        self._loaded.connect(self._on_loaded)
+        self._load_failed.connect(self._on_failed)
+        self._load_cancelled.connect(self._on_cancelled)
+        self.disk_cache = DiskImageCache(cache_dir('thumbnails'), self.DISK_CACHE_BYTES)
+        self._memory_cache = OrderedDict() # url -> (QPixmap, size in bytes)
+        self._memory_bytes = 0
+        self._previews = OrderedDict() # url -> QPixmap of the message's inline preview, or None
+        self._pending = set()
+        self._failed = set() # Urls that cannot load: not found, forbidden, not an image
+        self._retry_at = {} # url -> time.monotonic() before which a transient failure is not retried
+
+    def thumbnail(self, url):
+        """Returns the thumbnail QPixmap for url, or None if it is not loaded yet."""
+        entry = self._memory_cache.get(url)
+        if entry is not None:
+            self._memory_cache.move_to_end(url)
+            return entry[0]
+        if url not in self._pending and url not in self._failed:
+            retry_at = self._retry_at.get(url)
+            if retry_at is None or time.monotonic() >= retry_at:
+                self._start_load(url)
+        return None
+
+    def inline_preview(self, url, thumbnail):
+        """
+        The base64 preview sent inline with an image message (see app.image_prep)
+        as a QPixmap, decoded once per url; None if it is not a valid image.
+        Small enough to decode on the GUI thread.
+        """
+        if url in self._previews:
+            self._previews.move_to_end(url)
+            return self._previews[url]
+        try:
+            image = QImage.fromData(base64.b64decode(thumbnail, validate=True))
+        except (binascii.Error, ValueError):
+            image = QImage()
+        pixmap = None if image.isNull() else QPixmap.fromImage(image)
+        self._previews[url] = pixmap
+        if len(self._previews) > self.PREVIEW_CACHE_SIZE:
+            self._previews.popitem(last=False)
+        return pixmap
+
+    def has_failed(self, url):
+        return url in self._failed
+
+    def cancel_queued(self):
+        """
+        Drops the fetches still waiting for a slot, e.g. for the view the user
+        just left. Their urls load again if they are painted again.
+        """
+        self.scheduler.cancel_queued('media')
+
+    def _start_load(self, url):
+        self._pending.add(url)
+        full_url = url if url.startswith(('http://', 'https://')) else f"{self.base_url}{url}"
+        self.network.submit(self._load(url, full_url))
+
+    async def _load(self, url, full_url):
+        """Disk cache first, then the network."""
+        loop = asyncio.get_running_loop()
+        thumbnail = await loop.run_in_executor(self.executor, self.disk_cache.get, url)
+        if thumbnail is None:
+            try:
+                async with self.scheduler.media.slot(tag=url):
+                    async with self.network.session().get(full_url, timeout=REQUEST_TIMEOUT) as response:
+                        data = await read_response(response)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # A 4xx answer will not change; anything else may work next time
+                self._load_failed.emit(url, error_message(e), isinstance(e, HttpError) and 400 <= e.status < 500)
+                return
+            except asyncio.CancelledError:
+                self._load_cancelled.emit(url)
+                raise
+            thumbnail = await loop.run_in_executor(self.executor, self._make_thumbnail, url, data)
+            if thumbnail is None:
+                self._load_failed.emit(url, "Could not decode image.", True)
+                return
+        self._loaded.emit(url, thumbnail)
+
+    def _make_thumbnail(self, url, data):
+        # Runs on an executor thread
+        image = QImage.fromData(data)
+        if image.isNull():
+            return None
+        thumbnail = image.scaled(self.THUMBNAIL_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        self.disk_cache.put(url, thumbnail)
+        return thumbnail
+
+    @Slot(str, QImage)
+    def _on_loaded(self, url, image):
+        self._pending.discard(url)
+        self._retry_at.pop(url, None)
+        # QPixmap must be created on the GUI thread; doing it once here keeps paint() cheap
+        pixmap = QPixmap.fromImage(image)
+        size = image.sizeInBytes()
+        self._memory_cache[url] = (pixmap, size)
+        self._memory_bytes += size
+        while self._memory_bytes > self.MEMORY_CACHE_BYTES and len(self._memory_cache) > 1:
+            _, (_, evicted_size) = self._memory_cache.popitem(last=False)
+            self._memory_bytes -= evicted_size
+        self.image_ready.emit(url)
+
+    @Slot(str, str, bool)
+    def _on_failed(self, url, error, permanent):
+        self._pending.discard(url)
+        if permanent:
+            self._failed.add(url)
+            self._retry_at.pop(url, None)
+            self.image_ready.emit(url)
+            return
+        self._retry_at[url] = time.monotonic() + self.RETRY_DELAY_MS / 1000
+        # Views repaint then, which fetches the url again if it is still on screen
+        QTimer.singleShot(self.RETRY_DELAY_MS, self, lambda: self.image_ready.emit(url))
+
+    @Slot(str)
+    def _on_cancelled(self, url):
+        self._pending.discard(url)
+        # Views repaint, which asks again for the urls still on screen
+        self.image_ready.emit(url)
@@ -0,0 +1,123 @@
+# app/image_prep.py
+import base64
+import mimetypes
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PySide6.QtCore import QObject, Signal, Slot, QBuffer, QByteArray, QIODevice, Qt
+from PySide6.QtGui import QImage, QImageReader
+from .metrics import metrics
+from .settings import MAX_IMAGE_DIMENSION, cache_dir
+
+image_prep_ms = metrics.histogram('deplao_image_prep_ms', 'Time to prepare an image for upload, ms.')
+
+# Formats re-encoded before upload; anything else (GIF animations, SVG, ...) is sent as it is
+PREPARED_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/bmp', 'image/tiff')
+JPEG_QUALITY = 85
+# The inline preview sent with the message: a tiny JPEG, about a kilobyte as base64
+INLINE_THUMBNAIL_SIZE = 24
+INLINE_THUMBNAIL_QUALITY = 40
+
+def needs_preparing(file_path):
+    return mimetypes.guess_type(file_path)[0] in PREPARED_TYPES
+
+def _encode(image, image_format, quality):
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.WriteOnly)
+    if not image.save(buffer, image_format, quality):
+        return None
+    return data.data()
+
+def prepare_image(source_path, output_dir, max_dimension=MAX_IMAGE_DIMENSION, quality=JPEG_QUALITY):
+    """
+    Runs in a worker process. Decodes source_path (turned upright by its EXIF
+    orientation), scales it down to max_dimension on the longer side and
+    re-encodes it into a new file under output_dir, which drops EXIF, GPS and
+    other metadata. Images with transparency stay PNG, the rest become JPEG.
+    Returns {'path', 'width', 'height', 'thumbnail'} where thumbnail is a
+    base64 JPEG preview, or None if the file cannot be decoded.
+    """
+    reader = QImageReader(source_path)
+    reader.setAutoTransform(True)
+    image = reader.read()
+    if image.isNull():
+        return None
+    if max(image.width(), image.height()) > max_dimension:
+        image = image.scaled(max_dimension, max_dimension, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+    if image.hasAlphaChannel():
+        image_format, extension = 'PNG', '.png'
+    else:
+        image_format, extension = 'JPEG', '.jpg'
+        image = image.convertToFormat(QImage.Format_RGB32)
+    data = _encode(image, image_format, quality)
+    if data is None:
+        return None
+    # A directory per upload keeps the original name, which becomes the file name recipients see
+    directory = os.path.join(output_dir, uuid.uuid4().hex)
+    os.makedirs(directory)
+    path = os.path.join(directory, os.path.splitext(os.path.basename(source_path))[0] + extension)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+    preview = image.scaled(INLINE_THUMBNAIL_SIZE, INLINE_THUMBNAIL_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    if preview.hasAlphaChannel():
+        preview = preview.convertToFormat(QImage.Format_RGB32) # JPEG has no alpha; flatten to an opaque preview
+    thumbnail = _encode(preview, 'JPEG', INLINE_THUMBNAIL_QUALITY)
+    return {
+        'path': path,
+        'width': image.width(),
+        'height': image.height(),
+        'thumbnail': base64.b64encode(thumbnail).decode('ascii') if thumbnail else None,
+    }
+
+class ImagePreparer(QObject):
+    """
+    Prepares images for upload (see prepare_image) in a separate process, so
+    decoding and recompressing a large photo never blocks the GUI or competes
+    with it for the GIL. The process is started on first use and kept.
+    """
+    prepared = Signal(str, dict) # key, prepare_image() result
+    failed = Signal(str) # key; the original file should be used as it is
+
+    # Internal: crosses from the executor's callback thread to the GUI thread
+    _done = Signal(str, object, float) # key, result or None, elapsed ms
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.output_dir = cache_dir('prepared_uploads')
+        self._executor = None
+        self._done.connect(self._on_done)
+
+    def prepare(self, key, file_path):
+        """Starts preparing file_path; the outcome arrives as prepared or failed with key."""
+        if self._executor is None:
+            # spawn, not fork: a forked copy of a running Qt application is not safe to use
+            self._executor = ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn'))
+        started = time.perf_counter()
+        try:
+            future = self._executor.submit(prepare_image, file_path, self.output_dir)
+        except BrokenProcessPool:
+            # The worker died (e.g. killed by the OS); start a new one next time
+            self._executor = None
+            self.failed.emit(key)
+            return
+        future.add_done_callback(lambda f: self._done.emit(
+            key, None if f.cancelled() or f.exception() else f.result(), (time.perf_counter() - started) * 1000))
+
+    @Slot(str, object, float)
+    def _on_done(self, key, result, elapsed_ms):
+        image_prep_ms.observe(elapsed_ms)
+        if result is None:
+            self.failed.emit(key)
+        else:
+            self.prepared.emit(key, result)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,352 @@
+# app/message_cache.py
+import json
+import os
+import re
+import sqlite3
+import unicodedata
+from .models import Message, User, Conversation
+from .settings import data_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY
+);
+
+-- The cache holds every message of the conversation with from_id <= id <= to_id,
+-- for each of its ranges. from_id = 0 means the range reaches the start of the
+-- conversation. Ranges never overlap: overlapping ones are merged.
+CREATE TABLE IF NOT EXISTS synced_ranges (
+    conversation_id INTEGER NOT NULL,
+    from_id INTEGER NOT NULL,
+    to_id INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_synced_ranges_conversation_id ON synced_ranges(conversation_id, to_id);
+
+CREATE TABLE IF NOT EXISTS conversation_participants (
+    conversation_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (conversation_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    conversation_id INTEGER NOT NULL,
+    sender_id INTEGER NOT NULL,
+    content_type TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at INTEGER NOT NULL, -- epoch milliseconds
+    sender_username TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_id_id ON messages(conversation_id, id);
+"""
+
+# Bumped whenever the layout changes; caches with another version are rebuilt
+SCHEMA_VERSION = 2
+
+# Messages sent on this device that the server has not acknowledged yet. Unlike the
+# rest of the file this is not a copy of server data, so a rebuild never drops it.
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, -- send order
+    client_id TEXT NOT NULL UNIQUE,
+    event TEXT NOT NULL,
+    payload TEXT NOT NULL, -- JSON event data
+    conversation_id, -- where the pending copy is shown; may be a temporary id
+    content_type TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at INTEGER NOT NULL -- epoch milliseconds
+);
+"""
+
+DROP_SCHEMA = """
+DROP TABLE IF EXISTS messages_fts;
+DROP TABLE IF EXISTS messages;
+DROP TABLE IF EXISTS synced_ranges;
+DROP TABLE IF EXISTS conversation_participants;
+DROP TABLE IF EXISTS conversations;
+DROP TABLE IF EXISTS users;
+"""
+
+# Full-text index over the text of cached text messages, kept in step with the
+# messages table by triggers. External content: the text is stored only once.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content,
+    content='messages',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages
+WHEN new.content_type = 'text' BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages
+WHEN old.content_type = 'text' BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content)
+        SELECT 'delete', old.id, old.content WHERE old.content_type = 'text';
+    INSERT INTO messages_fts (rowid, content)
+        SELECT new.id, new.content WHERE new.content_type = 'text';
+END;
+"""
+
+MESSAGE_COLUMNS = "id, conversation_id, sender_id, content_type, content, created_at, sender_username"
+
+# Marks the matched terms in search snippets
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+
+def fts_query(text):
+    """
+    Turns what the user typed into an FTS5 query: every word must match and
+    the last one may be a prefix, so results follow the user while typing.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    query = ' '.join(f'"{word}"' for word in words)
+    # A one-letter prefix would expand to a large part of the vocabulary
+    return query + '*' if len(words[-1]) > 1 else query
+
+class MessageCache:
+    """
+    On-disk SQLite store of conversations, messages and users for one account.
+    Lets a conversation render before the network answers, lets the controller
+    ask the server only for messages newer than what is already here, and keeps
+    cached chats readable offline.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # Written by an older client. It is only a cache of server data, so start over
+            self.db.executescript(DROP_SCHEMA)
+        self.db.executescript(SCHEMA)
+        self.db.executescript(FTS_SCHEMA)
+        self.db.executescript(OUTBOX_SCHEMA)
+        self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @classmethod
+    def for_user(cls, user_id):
+        return cls(os.path.join(data_dir(), f'cache_{user_id}.sqlite3'))
+
+    def close(self):
+        self.db.close()
+
+    def _rows_to_messages(self, rows):
+        return [Message(*row) for row in rows]
+
+    def save_messages(self, messages):
+        """Stores messages and their senders. Does not touch the synced range."""
+        if not messages:
+            return
+        with self.db:
+            # An upsert, not INSERT OR REPLACE: the implicit delete of REPLACE would
+            # bypass the triggers that keep messages_fts in step
+            self.db.executemany(
+                f"INSERT INTO messages ({MESSAGE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET conversation_id = excluded.conversation_id, "
+                "sender_id = excluded.sender_id, content_type = excluded.content_type, "
+                "content = excluded.content, created_at = excluded.created_at, "
+                "sender_username = excluded.sender_username",
+                [(m.id, m.conversation_id, m.sender_id, m.content_type, m.content, m.created_at, m.sender_username)
+                 for m in messages]
+            )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO users (id, username) VALUES (?, ?)",
+                {(m.sender_id, m.sender_username) for m in messages}
+            )
+            self.db.executemany(
+                "INSERT OR IGNORE INTO conversation_participants (conversation_id, user_id) VALUES (?, ?)",
+                {(m.conversation_id, m.sender_id) for m in messages}
+            )
+            self.db.executemany("INSERT OR IGNORE INTO conversations (id) VALUES (?)",
+                                {(m.conversation_id,) for m in messages})
+
+    def _synced_range(self, conversation_id, containing=None):
+        """The newest synced range as (from_id, to_id), or the one containing that id; None if there is none."""
+        if containing is None:
+            return self.db.execute(
+                "SELECT from_id, to_id FROM synced_ranges WHERE conversation_id = ? ORDER BY to_id DESC LIMIT 1",
+                (conversation_id,)).fetchone()
+        return self.db.execute(
+            "SELECT from_id, to_id FROM synced_ranges WHERE conversation_id = ? AND from_id <= ? AND to_id >= ?",
+            (conversation_id, containing, containing)).fetchone()
+
+    def extend_synced_range(self, conversation_id, low, high):
+        """
+        Records that every message of the conversation with low <= id <= high is
+        cached. Message ids are global, so ranges can only be merged when they
+        overlap; a range that does not is kept beside the others, and the page
+        that later bridges the gap merges them.
+        """
+        with self.db:
+            overlapping = self.db.execute(
+                "SELECT from_id, to_id FROM synced_ranges WHERE conversation_id = ? AND from_id <= ? AND to_id >= ?",
+                (conversation_id, high, low)).fetchall()
+            if overlapping:
+                low = min(low, *(row[0] for row in overlapping))
+                high = max(high, *(row[1] for row in overlapping))
+                self.db.execute("DELETE FROM synced_ranges WHERE conversation_id = ? AND from_id <= ? AND to_id >= ?",
+                                (conversation_id, high, low))
+            self.db.execute("INSERT OR IGNORE INTO conversations (id) VALUES (?)", (conversation_id,))
+            self.db.execute("INSERT INTO synced_ranges (conversation_id, from_id, to_id) VALUES (?, ?, ?)",
+                            (conversation_id, low, high))
+
+    def synced_message_id(self, conversation_id):
+        """Newest message id of the newest synced range, or None."""
+        synced = self._synced_range(conversation_id)
+        return synced[1] if synced else None
+
+    def load_latest(self, conversation_id, limit):
+        """
+        Newest cached page within the newest synced range, oldest first, as
+        (messages, has_more). Returns ([], False) if nothing is synced.
+        """
+        synced = self._synced_range(conversation_id)
+        if synced is None:
+            return [], False
+        rows = self.db.execute(
+            f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE conversation_id = ? AND id BETWEEN ? AND ? "
+            "ORDER BY id DESC LIMIT ?",
+            (conversation_id, synced[0], synced[1], limit)
+        ).fetchall()
+        return self._rows_to_messages(reversed(rows)), len(rows) == limit or synced[0] > 0
+
+    def load_before(self, conversation_id, before_id, limit):
+        """
+        The page preceding before_id as (messages, has_more), or None when the
+        synced range around before_id cannot answer it and the server has to be asked.
+        """
+        synced = self._synced_range(conversation_id, containing=before_id)
+        if synced is None:
+            return None
+        rows = self.db.execute(
+            f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE conversation_id = ? AND id >= ? AND id < ? "
+            "ORDER BY id DESC LIMIT ?",
+            (conversation_id, synced[0], before_id, limit)
+        ).fetchall()
+        if len(rows) == limit:
+            return self._rows_to_messages(reversed(rows)), True
+        if synced[0] == 0:
+            return self._rows_to_messages(reversed(rows)), False
+        return None
+
+    def add_outbox_entry(self, client_id, event, payload, message):
+        with self.db:
+            self.db.execute(
+                "INSERT OR IGNORE INTO outbox (client_id, event, payload, conversation_id, content_type, content, "
+                "created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (client_id, event, json.dumps(payload), message.conversation_id, message.content_type,
+                 message.content, message.created_at)
+            )
+
+    def load_outbox(self):
+        """Unacknowledged entries in send order, as (client_id, event, payload, conversation_id, content_type, content, created_at)."""
+        rows = self.db.execute(
+            "SELECT client_id, event, payload, conversation_id, content_type, content, created_at FROM outbox "
+            "ORDER BY seq"
+        ).fetchall()
+        return [(row[0], row[1], json.loads(row[2]), *row[3:]) for row in rows]
+
+    def remove_outbox_entries(self, client_ids):
+        with self.db:
+            self.db.executemany("DELETE FROM outbox WHERE client_id = ?", [(client_id,) for client_id in client_ids])
+
+    def save_users(self, users):
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO users (id, username) VALUES (?, ?)",
+                                [(u.id, u.username) for u in users])
+
+    def _load_conversations(self, current_user, where='', params=()):
+        conversations = []
+        rows = self.db.execute(
+            f"SELECT c.id, {', '.join('m.' + col for col in MESSAGE_COLUMNS.split(', '))} FROM conversations c "
+            "LEFT JOIN messages m ON m.id = (SELECT MAX(id) FROM messages WHERE conversation_id = c.id) "
+            f"{where} ORDER BY m.id DESC", params
+        ).fetchall()
+        for row in rows:
+            conversation_id, message_row = row[0], row[1:]
+            participants = [current_user] + [
+                User(id=uid, username=username) for uid, username in self.db.execute(
+                    "SELECT u.id, u.username FROM conversation_participants cp JOIN users u ON u.id = cp.user_id "
+                    "WHERE cp.conversation_id = ? AND u.id != ?", (conversation_id, current_user.id))
+            ]
+            last_message = Message(*message_row) if message_row[0] is not None else None
+            conversations.append(Conversation(id=conversation_id, participants=participants, last_message=last_message))
+        return conversations
+
+    def load_conversations(self, current_user):
+        """Cached conversations with their participants and last message, most recent first."""
+        return self._load_conversations(current_user)
+
+    def load_conversation(self, conversation_id, current_user):
+        """One cached conversation as load_conversations() builds it, or None."""
+        conversations = self._load_conversations(current_user, "WHERE c.id = ?", (conversation_id,))
+        return conversations[0] if conversations else None
+
+def _fold(word):
+    # Same folding as the unicode61 tokenizer with remove_diacritics: "Chào" -> "chao"
+    return ''.join(ch for ch in unicodedata.normalize('NFD', word.lower()) if not unicodedata.combining(ch))
+
+def snippet(content, words, size=12):
+    """
+    Up to size words of content around the first match of words, with each
+    matching word wrapped in SNIPPET_START/SNIPPET_END. Built here rather
+    than with FTS5 snippet(), which has to re-expand prefix terms per row.
+    """
+    folded_words = [_fold(word) for word in words]
+    tokens = list(re.finditer(r'\w+', content))
+    matches = [any(_fold(token.group()).startswith(word) for word in folded_words) for token in tokens]
+    first = matches.index(True) if True in matches else 0
+    start = max(0, first - 2) # Keep the match near the left edge, where a narrow list still shows it
+    end = min(len(tokens), start + size)
+    parts = ['…' if start > 0 else '']
+    position = tokens[start].start() if tokens else 0
+    for token, matched in zip(tokens[start:end], matches[start:end]):
+        parts.append(content[position:token.start()])
+        parts.append(f"{SNIPPET_START}{token.group()}{SNIPPET_END}" if matched else token.group())
+        position = token.end()
+    parts.append('…' if end < len(tokens) else content[position:])
+    return ''.join(parts)
+
+def search_messages(path, text, limit=50, window=2000):
+    """
+    Best matches for text across every cached conversation, as a list of
+    (Message, snippet) with matched terms between SNIPPET_START and
+    SNIPPET_END. Only the newest window hits are ranked, which bounds the
+    cost of words that occur in a large part of the history. Opens its own
+    read-only connection, so it can run on a worker thread while the GUI
+    thread keeps writing through MessageCache.
+    """
+    query = fts_query(text)
+    if query is None:
+        return []
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = db.execute(
+            f"SELECT {', '.join('m.' + col for col in MESSAGE_COLUMNS.split(', '))} FROM ("
+            "    SELECT rowid, rank FROM messages_fts WHERE messages_fts MATCH ? ORDER BY rowid DESC LIMIT ?"
+            ") AS hits JOIN messages m ON m.id = hits.rowid ORDER BY hits.rank LIMIT ?",
+            (query, window, limit)
+        ).fetchall()
+    finally:
+        db.close()
+    words = re.findall(r'\w+', text)
+    messages = [Message(*row) for row in rows]
+    return [(message, snippet(message.content, words)) for message in messages]
@@ -0,0 +1,61 @@
+# app/message_search.py
+import sqlite3
+from PySide6.QtCore import QObject, Signal, QRunnable, Slot, QThreadPool
+from .message_cache import search_messages
+
+class MessageSearchSignals(QObject):
+    finished = Signal(int, str, list) # request_id, text, [(Message, snippet)]
+    failed = Signal(int, str) # request_id, error message
+
+class MessageSearchWorker(QRunnable):
+    def __init__(self, request_id, cache_path, text, limit):
+        super().__init__()
+        self.request_id = request_id
+        self.cache_path = cache_path
+        self.text = text
+        self.limit = limit
+        self.signals = MessageSearchSignals()
+
+    @Slot()
+    def run(self):
+        try:
+            results = search_messages(self.cache_path, self.text, self.limit)
+        except sqlite3.Error as e:
+            self.signals.failed.emit(self.request_id, str(e))
+            return
+        self.signals.finished.emit(self.request_id, self.text, results)
+
+class MessageSearch(QObject):
+    """
+    Runs full-text searches of the local message cache on one background
+    thread. A new search drops any that has not started yet, and results of
+    searches the user has typed past are never emitted.
+    """
+    RESULT_LIMIT = 50
+
+    results_ready = Signal(str, list) # text, [(Message, snippet)] best match first
+    search_failed = Signal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self._request_id = 0
+
+    def search(self, cache_path, text):
+        self._request_id += 1
+        self.thread_pool.clear()
+        worker = MessageSearchWorker(self._request_id, cache_path, text, self.RESULT_LIMIT)
+        worker.signals.finished.connect(self._on_finished)
+        worker.signals.failed.connect(self._on_failed)
+        self.thread_pool.start(worker)
+
+    @Slot(int, str, list)
+    def _on_finished(self, request_id, text, results):
+        if request_id == self._request_id:
+            self.results_ready.emit(text, results)
+
+    @Slot(int, str)
+    def _on_failed(self, request_id, error_msg):
+        if request_id == self._request_id:
+            self.search_failed.emit(error_msg)
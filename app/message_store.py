@@ -0,0 +1,131 @@
+# app/message_store.py
+from bisect import bisect_left, bisect_right
+from PySide6.QtCore import QObject, Signal
+
+def sort_key(message):
+    # Local ids count down from -1, so they are ordered by magnitude: two
+    # messages sent in the same millisecond stay in the order they were sent
+    return (message.created_at, message.id < 0, abs(message.id))
+
+class _ConversationMessages:
+    __slots__ = ('messages', 'keys')
+
+    def __init__(self):
+        self.messages = []
+        self.keys = []  # sort_key of each entry in messages, kept in step
+
+class MessageStore(QObject):
+    """
+    The single in-memory copy of every message the client knows about.
+    Messages are grouped by conversation, indexed by id for O(1) dedupe and
+    kept ordered by sort_key(), so views only have to mirror the
+    row-level change signals below.
+    """
+    # Emitted around each contiguous run of inserted rows: conversation_id, first, last
+    messages_about_to_be_inserted = Signal(object, int, int)
+    messages_inserted = Signal(object, int, int)
+    # Emitted around the removal of one row: conversation_id, row
+    message_about_to_be_removed = Signal(object, int)
+    message_removed = Signal(object, int)
+    # The newest non-system message of a conversation changed
+    last_message_changed = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._conversations = {}
+        self._by_id = {}
+
+    def _conversation(self, conversation_id):
+        conversation = self._conversations.get(conversation_id)
+        if conversation is None:
+            conversation = self._conversations[conversation_id] = _ConversationMessages()
+        return conversation
+
+    def messages(self, conversation_id):
+        """The ordered message list of a conversation. Views may keep the reference but must not mutate it."""
+        return self._conversation(conversation_id).messages
+
+    def get(self, message_id):
+        return self._by_id.get(message_id)
+
+    def __contains__(self, message_id):
+        return message_id in self._by_id
+
+    def conversation_ids(self):
+        return list(self._conversations)
+
+    def latest_server_message_id(self, conversation_id):
+        """Id of the newest message that came from the server (local ones have negative ids), or None."""
+        conversation = self._conversations.get(conversation_id)
+        if conversation is None:
+            return None
+        return next((m.id for m in reversed(conversation.messages) if m.id > 0), None)
+
+    def last_message(self, conversation_id):
+        conversation = self._conversations.get(conversation_id)
+        if conversation is None:
+            return None
+        return next((m for m in reversed(conversation.messages) if m.content_type != 'system'), None)
+
+    def add_messages(self, messages):
+        """
+        Inserts messages that are not already known and returns them. A batch
+        that lands entirely after (or before) the existing messages of its
+        conversation is inserted as one run; anything else is bisected in.
+        """
+        by_conversation = {}
+        for message in messages:
+            if message.id in self._by_id:
+                continue
+            self._by_id[message.id] = message
+            by_conversation.setdefault(message.conversation_id, []).append(message)
+
+        added = []
+        for conversation_id, new_messages in by_conversation.items():
+            new_messages.sort(key=sort_key)
+            self._insert_sorted(conversation_id, new_messages)
+            added.extend(new_messages)
+        return added
+
+    def remove_message(self, message_id):
+        """Removes a message (e.g. a pending copy once the server's arrives) and returns it, or None."""
+        message = self._by_id.pop(message_id, None)
+        if message is None:
+            return None
+        conversation_id = message.conversation_id
+        conversation = self._conversations[conversation_id]
+        previous_last = self.last_message(conversation_id)
+        row = bisect_left(conversation.keys, sort_key(message))
+        while conversation.messages[row] is not message:
+            row += 1
+        self.message_about_to_be_removed.emit(conversation_id, row)
+        del conversation.messages[row]
+        del conversation.keys[row]
+        self.message_removed.emit(conversation_id, row)
+        if self.last_message(conversation_id) is not previous_last:
+            self.last_message_changed.emit(conversation_id)
+        return message
+
+    def _insert_sorted(self, conversation_id, new_messages):
+        conversation = self._conversation(conversation_id)
+        keys = conversation.keys
+        new_keys = [sort_key(m) for m in new_messages]
+        previous_last = self.last_message(conversation_id)
+
+        if not keys or new_keys[0] >= keys[-1]:
+            self._insert_run(conversation_id, conversation, len(keys), new_messages, new_keys)
+        elif new_keys[-1] <= keys[0]:
+            self._insert_run(conversation_id, conversation, 0, new_messages, new_keys)
+        else:
+            for message, key in zip(new_messages, new_keys):
+                self._insert_run(conversation_id, conversation, bisect_right(keys, key), [message], [key])
+
+        if self.last_message(conversation_id) is not previous_last:
+            self.last_message_changed.emit(conversation_id)
+
+    def _insert_run(self, conversation_id, conversation, position, messages, keys):
+        last = position + len(messages) - 1
+        self.messages_about_to_be_inserted.emit(conversation_id, position, last)
+        conversation.messages[position:position] = messages
+        conversation.keys[position:position] = keys
+        self.messages_inserted.emit(conversation_id, position, last)
@@ -0,0 +1,261 @@
+# app/metrics.py
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from PySide6.QtCore import QObject, QTimer, Slot
+
+METRICS_FILE_ENV = 'DEPLAO_METRICS_FILE'
+METRICS_INTERVAL_ENV = 'DEPLAO_METRICS_INTERVAL'
+
+# Upper bounds of histogram buckets. Network latencies span ms to tens of seconds;
+# GUI slots should stay well inside a 16 ms frame, so their buckets are finer.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+SLOT_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 33, 50, 100, 250, 1000)
+
+class Counter:
+    """A monotonically increasing count per combination of label values."""
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {} # label values -> count
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        """{label values: count}, copied so it can be read without the lock."""
+        with self._lock:
+            return dict(self._values)
+
+class Histogram:
+    """
+    Counts observations into fixed buckets per combination of label values.
+    An observation is a bisect and three additions under a lock, cheap enough
+    for every request and every GUI slot; quantiles are estimated from the
+    buckets when read.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS_MS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {} # label values -> [bucket counts (last one is +Inf), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *label_values):
+        """Context manager observing the milliseconds spent inside it."""
+        return _Timer(self, label_values)
+
+    def samples(self):
+        """{label values: (bucket counts, sum, count)}, copied."""
+        with self._lock:
+            return {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+
+    def quantile(self, counts, q):
+        """Estimates the q-quantile from bucket counts, interpolating inside the bucket."""
+        count = sum(counts)
+        if not count:
+            return 0.0
+        rank = q * count
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            if seen + bucket_count >= rank and bucket_count:
+                low = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return low # Above the last bound: the best we can say is "at least"
+                return low + (self.buckets[index] - low) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+class _Timer:
+    __slots__ = ('histogram', 'label_values', 'start')
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe((time.perf_counter() - self.start) * 1000, *self.label_values)
+
+class MetricsRegistry:
+    """
+    All metrics of the process by name. counter() and histogram() return the
+    existing metric when the name is already registered, so modules can
+    declare what they record at import time.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def _get_or_create(self, cls, name, help, labels, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labels, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get_or_create(Counter, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS_MS):
+        return self._get_or_create(Histogram, name, help, labels, buckets=buckets)
+
+    def collect(self):
+        with self._lock:
+            return [self._metrics[name] for name in sorted(self._metrics)]
+
+    def client_info(self):
+        # Lets dumps from different machines be told apart and compared
+        return {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+        }
+
+    def to_json(self):
+        result = {'timestamp': time.time(), 'client': self.client_info(), 'metrics': {}}
+        for metric in self.collect():
+            series = []
+            if metric.kind == 'counter':
+                for label_values, value in metric.samples().items():
+                    series.append({'labels': dict(zip(metric.labels, label_values)), 'value': value})
+            else:
+                for label_values, (counts, total, count) in metric.samples().items():
+                    series.append({
+                        'labels': dict(zip(metric.labels, label_values)),
+                        'count': count,
+                        'sum': total,
+                        'p50': metric.quantile(counts, 0.5),
+                        'p99': metric.quantile(counts, 0.99),
+                        'buckets': dict(zip([str(bound) for bound in metric.buckets] + ['+Inf'], counts)),
+                    })
+            result['metrics'][metric.name] = {'type': metric.kind, 'help': metric.help, 'series': series}
+        return result
+
+    def to_prometheus(self):
+        """The registry in the Prometheus text exposition format."""
+        info = self.client_info()
+        lines = [
+            '# HELP deplao_client_info Client that wrote these metrics.',
+            '# TYPE deplao_client_info gauge',
+            f'deplao_client_info{_format_labels(("platform", "python", "pid"), (info["platform"], info["python"], info["pid"]))} 1',
+        ]
+        for metric in self.collect():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            if metric.kind == 'counter':
+                for label_values, value in sorted(metric.samples().items()):
+                    lines.append(f'{metric.name}{_format_labels(metric.labels, label_values)} {value}')
+                continue
+            for label_values, (counts, total, count) in sorted(metric.samples().items()):
+                cumulative = 0
+                for bound, bucket_count in zip(list(metric.buckets) + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(metric.labels + ('le',), label_values + (bound,))
+                    lines.append(f'{metric.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(metric.labels, label_values)
+                lines.append(f'{metric.name}_sum{labels} {total}')
+                lines.append(f'{metric.name}_count{labels} {count}')
+        return '\n'.join(lines) + '\n'
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+# The process-wide registry everything records into
+metrics = MetricsRegistry()
+
+gui_slot_time = metrics.histogram(
+    'deplao_gui_slot_ms', 'Time spent in GUI thread slots, ms.', ('slot',), buckets=SLOT_BUCKETS_MS)
+
+def timed_slot(name):
+    """
+    Decorator recording the time a slot takes in deplao_gui_slot_ms. Put it
+    below @Slot so Qt still sees the slot signature.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                gui_slot_time.observe((time.perf_counter() - start) * 1000, name)
+        return wrapper
+    return decorator
+
+class MetricsDumper(QObject):
+    """
+    Writes the registry to a file every interval seconds and on shutdown, as
+    JSON if the path ends in .json and in the Prometheus text format
+    otherwise (e.g. for node_exporter's textfile collector). The file is
+    replaced atomically so a reader never sees half a dump.
+    """
+    DEFAULT_INTERVAL = 60 # seconds
+
+    def __init__(self, path, interval=DEFAULT_INTERVAL, registry=metrics, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.registry = registry
+        self.timer = QTimer(self)
+        self.timer.setInterval(int(interval * 1000))
+        self.timer.timeout.connect(self.dump)
+        self.timer.start()
+
+    @classmethod
+    def from_environment(cls, parent=None):
+        """A dumper configured by DEPLAO_METRICS_FILE/_INTERVAL, or None if no file is set."""
+        path = os.environ.get(METRICS_FILE_ENV)
+        if not path:
+            return None
+        try:
+            interval = float(os.environ.get(METRICS_INTERVAL_ENV) or cls.DEFAULT_INTERVAL)
+        except ValueError:
+            interval = cls.DEFAULT_INTERVAL
+        return cls(path, max(interval, 1.0), parent=parent)
+
+    @Slot()
+    def dump(self):
+        if self.path.endswith('.json'):
+            text = json.dumps(self.registry.to_json(), indent=1)
+        else:
+            text = self.registry.to_prometheus()
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Could not write metrics to {self.path}: {e}", file=sys.stderr)
@@ -1,50 +1,126 @@
 # app/models.py
+import itertools
 import json
+import sys
 from dataclasses import dataclass, field
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
 
-@dataclass
+@dataclass(slots=True)
 class User:
     id: int
     username: str
     is_online: bool = False
 
-@dataclass
+@dataclass(slots=True)
 class FileInfo:
     url: str
     name: str
     type: str
+    # Images prepared before upload (app.image_prep) also carry their size and a tiny preview
+    width: int | None = None
+    height: int | None = None
+    thumbnail: str | None = None # base64 JPEG
 
-@dataclass
+def parse_timestamp(value) -> int:
+    """
+    Converts a backend timestamp ("2024-01-01T10:00:00.000Z") to epoch
+    milliseconds. Integers are assumed to be converted already.
+    """
+    if isinstance(value, int):
+        return value
+    if not value:
+        return 0
+    if value[-1] in 'Zz':
+        # fromisoformat() only accepts a trailing Z from Python 3.11 on
+        value = value[:-1] + '+00:00'
+    try:
+        dt_obj = datetime.fromisoformat(value)
+    except ValueError:
+        return 0
+    if dt_obj.tzinfo is None:
+        dt_obj = dt_obj.replace(tzinfo=timezone.utc)
+    return int(dt_obj.timestamp() * 1000)
+
+@lru_cache(maxsize=1024)
+def _format_minute(minute) -> str:
+    return datetime.fromtimestamp(minute * 60).strftime('%H:%M')
+
+# Marks file_info as not parsed yet; None means the content was not valid file JSON
+_UNPARSED = object()
+
+# Messages created on this client (notices, unsent messages) never come from the
+# server, so they get negative ids that cannot clash with server ids
+_local_message_ids = itertools.count(-1, -1)
+
+def next_local_message_id() -> int:
+    return next(_local_message_ids)
+
+@dataclass(slots=True)
 class Message:
     id: int
     conversation_id: int
     sender_id: int
     content_type: str  # 'text', 'image', 'file', 'system'
     content: str
-    created_at: str # Keep as string for easier parsing from JSON
+    created_at: int # Epoch milliseconds, see parse_timestamp()
     sender_username: str
-    file_info: FileInfo | None = None
+    # Chosen by the sending client; lets its pending copy be matched with the stored message
+    client_id: str | None = None
+    _file_info: object = field(init=False, default=_UNPARSED, repr=False, compare=False)
 
     def __post_init__(self):
-        # Parse content for file/image messages
-        if self.content_type in ['image', 'file']:
-            try:
-                data = json.loads(self.content)
-                self.file_info = FileInfo(url=data.get('url'), name=data.get('name'), type=data.get('type'))
-                # The visual bubble can now use self.file_info
-            except (json.JSONDecodeError, TypeError):
-                self.content_type = 'system' # Fallback if content is invalid
-                self.content = "Error: Could not display received file."
+        if not isinstance(self.created_at, int):
+            self.created_at = parse_timestamp(self.created_at)
+
+    @property
+    def file_info(self) -> FileInfo | None:
+        # Parsed on first use: most file messages in a long history are never displayed
+        if self._file_info is _UNPARSED:
+            self._file_info = None
+            if self.content_type in ('image', 'file'):
+                try:
+                    data = json.loads(self.content)
+                    self._file_info = FileInfo(url=data.get('url'), name=data.get('name'), type=data.get('type'),
+                                               width=data.get('width'), height=data.get('height'),
+                                               thumbnail=data.get('thumbnail'))
+                except (json.JSONDecodeError, TypeError, AttributeError):
+                    pass
+        return self._file_info
+
+    @property
+    def is_pending(self) -> bool:
+        """Sent by us but not confirmed by the server yet (see app.outbox)."""
+        return self.id < 0 and self.client_id is not None
 
     @property
     def display_time(self) -> str:
-        try:
-            # Assumes ISO format with timezone from backend
-            dt_obj = datetime.fromisoformat(self.created_at)
-            return dt_obj.strftime('%H:%M')
-        except (ValueError, TypeError):
+        # Local wall-clock time; formatting is cached per minute since many messages share one
+        if not self.created_at:
             return ''
+        return _format_minute(self.created_at // 60000)
+
+def decode_messages(items):
+    """
+    Builds Messages from decoded JSON objects (a history page or socket
+    events) in one pass. Timestamps are parsed here, once, and the strings
+    repeated on every message are interned so a page shares one copy.
+    """
+    intern = sys.intern
+    return [
+        Message(
+            item['id'],
+            item['conversation_id'],
+            item['sender_id'],
+            intern(item.get('content_type') or 'text'),
+            item['content'],
+            parse_timestamp(item.get('created_at')),
+            # Socket events carry the raw row, without the joined username
+            intern(item.get('sender_username') or ''),
+            item.get('client_id'),
+        )
+        for item in items
+    ]
 
 @dataclass
 class Conversation:
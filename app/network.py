@@ -0,0 +1,154 @@
+# app/network.py
+"""
+The client's network core: one asyncio event loop on one dedicated thread,
+owning a pooled aiohttp session. HTTP requests, uploads, downloads, image
+fetches and the Socket.IO connection all run as coroutines on it, so the
+number of network threads does not grow with the number of requests, and
+every transfer is cancelled and timed out the same way.
+
+GUI code never touches the loop directly. Components submit coroutines with
+submit() and hand results back to the GUI thread through Qt signals, which
+are queued across threads automatically.
+"""
+import asyncio
+import atexit
+import threading
+import aiohttp
+from . import settings
+
+# Keep-alive connections per host, shared by every request of the process
+POOL_MAXSIZE = settings.POOL_PER_HOST
+# Connections open at once across all hosts
+POOL_TOTAL = max(settings.POOL_TOTAL, POOL_MAXSIZE)
+
+# Short interactive calls (login, history, search)
+API_TIMEOUT = aiohttp.ClientTimeout(total=10)
+# One upload chunk or small download; bulk transfers use TRANSFER_TIMEOUT
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30)
+# Streams with no overall deadline, only a limit on how long the link may stall
+TRANSFER_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
+# How long closing the loop at exit may take (seconds)
+SHUTDOWN_TIMEOUT = 2.0
+
+class NetworkLoop:
+    """
+    Lazily started event loop thread. submit() and call_soon() are safe to
+    call from any thread; session() only from coroutines running on the loop.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._session = None
+
+    @property
+    def loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                started = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(started,), name='deplao-network', daemon=True)
+                self._thread.start()
+                started.wait()
+                atexit.register(self.stop)
+            return self._loop
+
+    def _run(self, started):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(started.set)
+        self._loop.run_forever()
+
+    def is_running(self):
+        return self._loop is not None and self._loop.is_running()
+
+    def submit(self, coro):
+        """Schedules coro on the loop; returns a concurrent.futures.Future for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, callback, *args):
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def session(self):
+        """The shared aiohttp session; warm connections are reused by every caller."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=POOL_TOTAL, limit_per_host=POOL_MAXSIZE)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def _close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def stop(self):
+        """Closes the session and stops the loop thread. Called at exit."""
+        if not self.is_running():
+            return
+        try:
+            self.submit(self._close()).result(SHUTDOWN_TIMEOUT)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(SHUTDOWN_TIMEOUT)
+
+class NetworkJob:
+    """
+    Base for long-running transfers that the GUI thread can cancel at any
+    point, even before the loop has started them. Subclasses implement run()
+    and handle asyncio.CancelledError there.
+    """
+    def __init__(self):
+        self._task = None
+        self._cancel_requested = False
+
+    def start(self):
+        network_loop().submit(self._run_job())
+
+    def cancel(self):
+        network_loop().call_soon(self._cancel)
+
+    def _cancel(self):
+        self._cancel_requested = True
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run_job(self):
+        self._task = asyncio.current_task()
+        if self._cancel_requested:
+            self._task.cancel() # Raised at the first await inside run()
+        await self.run()
+
+    async def run(self):
+        raise NotImplementedError
+
+class HttpError(aiohttp.ClientError):
+    """A response with an error status; carries the status code and body text."""
+    def __init__(self, status, body):
+        super().__init__(f"{status}: {body}")
+        self.status = status
+        self.body = body
+
+def error_message(error):
+    """Text for a failed request, in the "<status>: <body>" form the UI already shows."""
+    if isinstance(error, HttpError):
+        return f"{error.status}: {error.body}"
+    if isinstance(error, asyncio.TimeoutError):
+        return "Request timed out."
+    return str(error) or type(error).__name__
+
+async def read_response(response):
+    """The body of response, raising HttpError for an error status."""
+    body = await response.read()
+    if response.status >= 400:
+        raise HttpError(response.status, body.decode('utf-8', errors='replace'))
+    return body
+
+_network_loop = None
+_network_loop_lock = threading.Lock()
+
+def network_loop():
+    """The process-wide network loop."""
+    global _network_loop
+    with _network_loop_lock:
+        if _network_loop is None:
+            _network_loop = NetworkLoop()
+        return _network_loop
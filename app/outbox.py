@@ -0,0 +1,123 @@
+# app/outbox.py
+from PySide6.QtCore import QObject, Signal, Slot, QTimer
+from .metrics import metrics
+from .models import Message, next_local_message_id
+
+outbox_batches = metrics.counter(
+    'deplao_outbox_batches_total', 'Outbox batches sent, by result (acked, failed).', ('result',))
+
+class Outbox(QObject):
+    """
+    Messages waiting for the server, oldest first. Each entry is written to
+    the message cache before it is sent and deleted only once the server has
+    acknowledged it, so nothing typed is lost to a dropped socket, a crash or
+    a restart. Entries go out in order, BATCH_SIZE per message:send-batch
+    call, one call at a time. The server stores each entry under its client
+    id at most once, so resending a batch whose ack was lost is harmless.
+    """
+    BATCH_SIZE = 20
+    # Seconds to wait for a batch's acknowledgement before it is sent again
+    ACK_TIMEOUT = 15
+    # After a failed batch while still connected, wait this long before retrying (ms)
+    RETRY_INTERVAL_MS = 2000
+
+    entry_acked = Signal(str, dict) # client_id, the stored message row
+    entry_rejected = Signal(str, str) # client_id, error message
+
+    def __init__(self, socket_manager, parent=None):
+        super().__init__(parent)
+        self.socket_manager = socket_manager
+        self.cache = None
+        self._entries = [] # [(client_id, event, data)] in send order
+        self._connected = False
+        self._in_flight = False
+        # Bumped on disconnect so the answer to a batch sent on an old connection is ignored
+        self._generation = 0
+        self._retry_timer = QTimer(self)
+        self._retry_timer.setSingleShot(True)
+        self._retry_timer.setInterval(self.RETRY_INTERVAL_MS)
+        self._retry_timer.timeout.connect(self._flush)
+        socket_manager.connected.connect(self._on_connected)
+        socket_manager.disconnected.connect(self._on_disconnected)
+
+    def load(self, cache, sender):
+        """
+        Restores the entries left by an earlier session from cache and returns
+        their pending Messages from sender (a User), under fresh local ids.
+        """
+        self.cache = cache
+        known = {entry[0] for entry in self._entries}
+        pending = []
+        for client_id, event, data, conversation_id, content_type, content, created_at in cache.load_outbox():
+            if client_id in known:
+                continue
+            self._entries.append((client_id, event, data))
+            pending.append(Message(next_local_message_id(), conversation_id, sender.id, content_type, content,
+                                   created_at, sender.username, client_id))
+        self._flush()
+        return pending
+
+    def enqueue(self, event, data, message):
+        """Persists an entry for message (whose client_id is data['clientId']) and sends it when possible."""
+        if self.cache:
+            self.cache.add_outbox_entry(message.client_id, event, data, message)
+        self._entries.append((message.client_id, event, data))
+        self._flush()
+
+    @Slot()
+    def _on_connected(self):
+        self._connected = True
+        self._flush()
+
+    @Slot()
+    def _on_disconnected(self):
+        self._connected = False
+        self._in_flight = False
+        self._generation += 1
+        self._retry_timer.stop()
+
+    @Slot()
+    def _flush(self):
+        if not self._connected or self._in_flight or not self._entries:
+            return
+        self._in_flight = True
+        batch = self._entries[:self.BATCH_SIZE]
+        generation = self._generation
+        self.socket_manager.call(
+            'message:send-batch',
+            [{'event': event, 'data': data} for _client_id, event, data in batch],
+            lambda results: self._on_batch_acked(generation, results),
+            lambda error: self._on_batch_failed(generation, error),
+            self.ACK_TIMEOUT
+        )
+
+    def _on_batch_acked(self, generation, results):
+        if generation != self._generation:
+            return
+        self._in_flight = False
+        outbox_batches.inc('acked')
+        results = {result.get('clientId'): result for result in results or () if isinstance(result, dict)}
+        done = [entry[0] for entry in self._entries if entry[0] in results]
+        if not done:
+            # An answer that covers nothing; don't spin on it
+            self._retry_timer.start()
+            return
+        if self.cache:
+            self.cache.remove_outbox_entries(done)
+        self._entries = [entry for entry in self._entries if entry[0] not in results]
+        for client_id in done:
+            result = results[client_id]
+            if result.get('message'):
+                self.entry_acked.emit(client_id, result['message'])
+            else:
+                self.entry_rejected.emit(client_id, result.get('error') or "Rejected by the server.")
+        self._flush()
+
+    def _on_batch_failed(self, generation, error):
+        if generation != self._generation:
+            return
+        self._in_flight = False
+        outbox_batches.inc('failed')
+        if self._connected:
+            self._retry_timer.start()
+        # Otherwise the next connected signal sends it again
@@ -0,0 +1,129 @@
+# app/presence.py
+import time
+from PySide6.QtCore import QObject, Signal, Slot, QTimer
+
+class PresenceService(QObject):
+    """
+    Typing indicators and online state, kept in one place.
+    Outgoing typing events are sent at most once per TYPING_SEND_INTERVAL per
+    recipient. Incoming indicators expire after TYPING_TTL_MS through a single
+    timer wheel instead of a timer per user. Online/offline events only update
+    a map; changes are emitted in one batch per PRESENCE_FLUSH_MS, and a user
+    who flaps back to their previous state within that window emits nothing.
+    """
+    TYPING_SEND_INTERVAL = 3.0 # seconds
+    TYPING_TTL_MS = 5000
+    WHEEL_TICK_MS = 500
+    PRESENCE_FLUSH_MS = 250
+
+    typing_changed = Signal(int, bool) # user_id, is_typing
+    presence_changed = Signal(object) # {user_id: is_online}, only users whose state changed
+
+    def __init__(self, socket_manager, parent=None):
+        super().__init__(parent)
+        self.socket_manager = socket_manager
+        self._typing_sent_at = {} # recipient_id -> monotonic time of the last typing event sent
+
+        # Timer wheel: a user typing now is put in the slot the cursor reaches after the TTL
+        self._wheel_ticks = -(-self.TYPING_TTL_MS // self.WHEEL_TICK_MS)
+        self._wheel = [set() for _ in range(self._wheel_ticks + 1)]
+        self._wheel_cursor = 0
+        self._typing_slot = {} # user_id -> index of the wheel slot holding them
+        self._wheel_timer = QTimer(self)
+        self._wheel_timer.setInterval(self.WHEEL_TICK_MS)
+        self._wheel_timer.timeout.connect(self._advance_wheel)
+
+        self._online = set()
+        self._pending_presence = {} # user_id -> latest is_online since the last flush
+        self._presence_timer = QTimer(self)
+        self._presence_timer.setSingleShot(True)
+        self._presence_timer.setInterval(self.PRESENCE_FLUSH_MS)
+        self._presence_timer.timeout.connect(self._flush_presence)
+
+        self.socket_manager.typing_received.connect(self.on_typing_received)
+        self.socket_manager.user_online.connect(lambda data: self._queue_presence(data.get('userId'), True))
+        self.socket_manager.user_offline.connect(lambda data: self._queue_presence(data.get('userId'), False))
+
+    # --- Outgoing typing ---
+
+    def send_typing(self, recipient_id):
+        """Tells recipient_id we are typing, unless we already did so recently."""
+        now = time.monotonic()
+        if now - self._typing_sent_at.get(recipient_id, float('-inf')) < self.TYPING_SEND_INTERVAL:
+            return False
+        self._typing_sent_at[recipient_id] = now
+        self.socket_manager.send_typing_notification(recipient_id)
+        return True
+
+    def reset_typing(self, recipient_id):
+        # After a message is sent the recipient's indicator is gone, so the next keystroke should go out at once
+        self._typing_sent_at.pop(recipient_id, None)
+
+    # --- Incoming typing ---
+
+    def is_typing(self, user_id):
+        return user_id in self._typing_slot
+
+    @Slot(dict)
+    def on_typing_received(self, data):
+        user_id = data.get('senderId')
+        if user_id is None:
+            return
+        was_typing = user_id in self._typing_slot
+        if was_typing:
+            self._wheel[self._typing_slot[user_id]].discard(user_id)
+        slot = (self._wheel_cursor + self._wheel_ticks) % len(self._wheel)
+        self._wheel[slot].add(user_id)
+        self._typing_slot[user_id] = slot
+        if not self._wheel_timer.isActive():
+            self._wheel_timer.start()
+        if not was_typing:
+            self.typing_changed.emit(user_id, True)
+
+    def clear_typing(self, user_id):
+        """Ends a typing indicator early, e.g. when the user's message arrives."""
+        slot = self._typing_slot.pop(user_id, None)
+        if slot is not None:
+            self._wheel[slot].discard(user_id)
+            self.typing_changed.emit(user_id, False)
+
+    @Slot()
+    def _advance_wheel(self):
+        self._wheel_cursor = (self._wheel_cursor + 1) % len(self._wheel)
+        expired = self._wheel[self._wheel_cursor]
+        self._wheel[self._wheel_cursor] = set()
+        for user_id in expired:
+            del self._typing_slot[user_id]
+            self.typing_changed.emit(user_id, False)
+        if not self._typing_slot:
+            # Nobody is typing: stop ticking until the next indicator arrives
+            self._wheel_timer.stop()
+
+    # --- Online state ---
+
+    def is_online(self, user_id):
+        return user_id in self._online
+
+    def _queue_presence(self, user_id, is_online):
+        if user_id is None:
+            return
+        self._pending_presence[user_id] = is_online
+        if not self._presence_timer.isActive():
+            self._presence_timer.start()
+
+    @Slot()
+    def _flush_presence(self):
+        pending, self._pending_presence = self._pending_presence, {}
+        changed = {}
+        for user_id, is_online in pending.items():
+            if is_online == (user_id in self._online):
+                continue # Flapped back to where it was
+            if is_online:
+                self._online.add(user_id)
+            else:
+                self._online.discard(user_id)
+                # Someone who went offline is no longer typing
+                self.clear_typing(user_id)
+            changed[user_id] = is_online
+        if changed:
+            self.presence_changed.emit(changed)
@@ -0,0 +1,164 @@
+# app/scheduler.py
+"""
+Lanes for the work on the network loop, so one kind of traffic cannot
+starve another. Interactive API calls, media fetches (image thumbnails)
+and bulk transfers (uploads, downloads) each get a bounded number of
+concurrent operations and a priority queue in front of it: two large
+uploads never hold up the history of the conversation the user just
+opened, and a screenful of images never delays a search.
+
+The lane limits add up to less than the default network.POOL_MAXSIZE, so no
+lane can take the pooled connections another one needs; a pool shrunk below
+their sum (DEPLAO_POOL_PER_HOST) makes the lanes share it.
+
+Lanes are only touched on the network loop. NetworkScheduler's public
+methods may be called from any thread.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from .metrics import metrics
+from .network import network_loop
+
+# Lower values start first; equal priorities start in the order they were queued
+PRIORITY_HIGH = 0 # What the user is looking at or waiting for
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2 # Catch-up work for things not on screen
+
+lane_queue_wait = metrics.histogram(
+    'deplao_lane_queue_wait_ms', 'Time network work waits for a slot in its lane, ms.', ('lane',))
+lane_cancelled = metrics.counter(
+    'deplao_lane_cancelled_total', 'Queued network work cancelled before it started, per lane.', ('lane',))
+
+class _Waiter:
+    __slots__ = ('priority', 'tag', 'future', 'task', 'queued_at')
+
+    def __init__(self, priority, tag, future, task):
+        self.priority = priority
+        self.tag = tag
+        self.future = future # Resolved when the slot is handed over
+        self.task = task
+        self.queued_at = time.perf_counter()
+
+class Lane:
+    """
+    At most limit operations at a time; the rest wait in priority order.
+    Work holds a slot for the body of `async with lane.slot(...)`. Queued work
+    carries an optional tag (a conversation id, a url) by which it can be
+    re-prioritized or cancelled before it starts.
+    """
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self._queue = [] # heap of (priority, sequence, _Waiter)
+        self._sequence = itertools.count()
+
+    def slot(self, priority=PRIORITY_NORMAL, tag=None):
+        return _Slot(self, priority, tag)
+
+    def queued(self):
+        return sum(1 for _, _, waiter in self._queue if not waiter.future.done())
+
+    async def _acquire(self, priority, tag):
+        if self.active < self.limit and not self.queued():
+            self.active += 1
+            lane_queue_wait.observe(0, self.name)
+            return
+        waiter = _Waiter(priority, tag, asyncio.get_running_loop().create_future(), asyncio.current_task())
+        heapq.heappush(self._queue, (priority, next(self._sequence), waiter))
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Handed the slot in the same moment it was cancelled: pass it on
+                self._release()
+            else:
+                waiter.future.cancel() # Skipped when it comes up
+            raise
+        lane_queue_wait.observe((time.perf_counter() - waiter.queued_at) * 1000, self.name)
+
+    def _release(self):
+        self.active -= 1
+        while self._queue and self.active < self.limit:
+            _, _, waiter = heapq.heappop(self._queue)
+            if not waiter.future.done():
+                self.active += 1
+                waiter.future.set_result(None)
+
+    def reprioritize(self, priority_for):
+        """Gives every queued item with a tag the priority priority_for(tag), unless that is None."""
+        entries = []
+        for priority, sequence, waiter in self._queue:
+            if waiter.future.done():
+                continue
+            if waiter.tag is not None:
+                new_priority = priority_for(waiter.tag)
+                if new_priority is not None:
+                    priority = waiter.priority = new_priority
+            entries.append((priority, sequence, waiter))
+        heapq.heapify(entries)
+        self._queue = entries
+
+    def cancel_queued(self, matches=None):
+        """Cancels the tasks of queued items whose tag satisfies matches (all of them if None)."""
+        for _, _, waiter in self._queue:
+            if not waiter.future.done() and (matches is None or matches(waiter.tag)):
+                lane_cancelled.inc(self.name)
+                waiter.task.cancel()
+
+class _Slot:
+    def __init__(self, lane, priority, tag):
+        self.lane = lane
+        self.priority = priority
+        self.tag = tag
+
+    async def __aenter__(self):
+        await self.lane._acquire(self.priority, self.tag)
+
+    async def __aexit__(self, *exc_info):
+        self.lane._release()
+
+class NetworkScheduler:
+    """
+    The process's lanes. API calls from the conversation in focus go first;
+    queued ones for other conversations are moved back when focus changes.
+    """
+    API_LIMIT = 6
+    MEDIA_LIMIT = 4
+    BULK_LIMIT = 3
+
+    def __init__(self):
+        self.api = Lane('api', self.API_LIMIT)
+        self.media = Lane('media', self.MEDIA_LIMIT)
+        self.bulk = Lane('bulk', self.BULK_LIMIT)
+        self.focus = None # Conversation id on screen; read and written on the loop
+
+    def conversation_priority(self, conversation_id):
+        """Priority of API work for conversation_id; call on the loop."""
+        return PRIORITY_HIGH if conversation_id == self.focus else PRIORITY_LOW
+
+    def set_focus(self, conversation_id):
+        """Marks conversation_id as the one on screen and re-prioritizes queued API calls tagged with it."""
+        network_loop().call_soon(self._set_focus, conversation_id)
+
+    def _set_focus(self, conversation_id):
+        self.focus = conversation_id
+        self.api.reprioritize(self.conversation_priority)
+
+    def cancel_queued(self, lane_name, matches=None):
+        """Cancels queued (not yet started) work in the named lane; see Lane.cancel_queued."""
+        network_loop().call_soon(lambda: getattr(self, lane_name).cancel_queued(matches))
+
+_network_scheduler = None
+_network_scheduler_lock = threading.Lock()
+
+def network_scheduler():
+    """The process-wide scheduler."""
+    global _network_scheduler
+    with _network_scheduler_lock:
+        if _network_scheduler is None:
+            _network_scheduler = NetworkScheduler()
+        return _network_scheduler
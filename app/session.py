@@ -0,0 +1,31 @@
+# app/session.py
+import json
+import os
+from .models import User
+from .settings import data_dir
+
+def _session_path():
+    return os.path.join(data_dir(), 'session.json')
+
+def save_session(user, token):
+    """Remembers who is logged in, so the next start opens their cached chats without a network login."""
+    path = _session_path()
+    temporary = path + '.tmp'
+    with open(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as f:
+        json.dump({'user': {'id': user.id, 'username': user.username}, 'token': token}, f)
+    os.replace(temporary, path)
+
+def load_session():
+    """The (User, token) saved by the last login, or None."""
+    try:
+        with open(_session_path(), encoding='utf-8') as f:
+            data = json.load(f)
+        return User(id=int(data['user']['id']), username=str(data['user']['username'])), str(data['token'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def clear_session():
+    try:
+        os.remove(_session_path())
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,39 @@
+# app/settings.py
+import os
+from PySide6.QtCore import QStandardPaths
+
+APP_NAME = "Deplao"
+
+# Backend for both the REST API and the socket; DEPLAO_SERVER_URL points the client elsewhere
+SERVER_URL = os.environ.get('DEPLAO_SERVER_URL') or "http://localhost:3000"
+
+# Images are scaled down to this many pixels on their longer side before upload
+MAX_IMAGE_DIMENSION = int(os.environ.get('DEPLAO_MAX_IMAGE_DIMENSION') or 2048)
+
+# Pooled keep-alive connections: per host (the backend) and in total across hosts
+POOL_PER_HOST = int(os.environ.get('DEPLAO_POOL_PER_HOST') or 16)
+POOL_TOTAL = int(os.environ.get('DEPLAO_POOL_TOTAL') or 32)
+
+def data_dir():
+    """
+    Per-user directory for persistent client data (message cache, etc.).
+    DEPLAO_DATA_DIR overrides the platform default, which is handy for tests
+    and for running several clients side by side.
+    """
+    path = os.environ.get('DEPLAO_DATA_DIR') or QStandardPaths.writableLocation(QStandardPaths.AppDataLocation)
+    if not path:
+        path = os.path.join(os.path.expanduser('~'), f'.{APP_NAME.lower()}')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def cache_dir(name):
+    """
+    Directory for disposable caches (thumbnails, downloads). Unlike data_dir()
+    its contents may be deleted at any time. DEPLAO_CACHE_DIR overrides it.
+    """
+    root = os.environ.get('DEPLAO_CACHE_DIR') or QStandardPaths.writableLocation(QStandardPaths.CacheLocation)
+    if not root:
+        root = os.path.join(data_dir(), 'cache')
+    path = os.path.join(root, name)
+    os.makedirs(path, exist_ok=True)
+    return path
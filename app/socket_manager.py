@@ -1,70 +1,223 @@
 # app/socket_manager.py
+import asyncio
+import random
+import threading
 import socketio
-from PySide6.QtCore import QObject, Signal
+from PySide6.QtCore import QObject, Signal, Slot, QTimer
+from .metrics import metrics
+from .network import SHUTDOWN_TIMEOUT, network_loop
+from .settings import SERVER_URL
+
+socket_events = metrics.counter('deplao_socket_events_total', 'Socket.IO events received, by event.', ('event',))
+socket_events_sent = metrics.counter('deplao_socket_events_sent_total', 'Socket.IO events sent, by event.', ('event',))
+socket_batch_size = metrics.histogram(
+    'deplao_socket_message_batch_size', 'Messages delivered per batch.', buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500))
+socket_reconnects = metrics.counter('deplao_socket_reconnects_total', 'Socket connections re-established.')
+
+# Reconnect backoff: the ceiling doubles per failed attempt from BASE up to MAX (seconds)
+RECONNECT_BASE_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+
+def reconnect_delay(attempt, rng=random):
+    """
+    Delay before reconnect attempt number attempt (1, 2, ...): a random value
+    between half and all of the exponential ceiling, so clients dropped by
+    the same outage do not all come back at the same instant.
+    """
+    ceiling = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** (attempt - 1))
+    return ceiling / 2 + rng.uniform(0, ceiling / 2)
 
 class SocketManager(QObject):
+    # Incoming messages are collected for this long and delivered as one batch (ms, ~1 frame)
+    BATCH_INTERVAL_MS = 16
+    # Seconds the Socket.IO handshake may take before the attempt counts as failed
+    CONNECT_TIMEOUT = 10
+
     # Signals to be emitted when an event is received
     connected = Signal()
     disconnected = Signal()
-    message_received = Signal(dict)
+    reconnecting = Signal(int, float) # attempt, seconds until it starts
+    # Connected again after a drop or failed attempts: messages may have been missed meanwhile
+    reconnected = Signal()
+    messages_received = Signal(list) # message dicts, in arrival order
     user_online = Signal(dict)
     user_offline = Signal(dict)
     typing_received = Signal(dict)
     connect_error = Signal(object)
+    # The server refused the token; no further attempts are made until connect() is called again
+    auth_rejected = Signal()
+    # Internal: crosses from the network loop to the GUI thread to arm the batch timer
+    _batch_started = Signal()
+    # Internal: callback, argument; runs an acknowledgement callback on the GUI thread
+    _call_done = Signal(object, object)
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.sio = socketio.Client()
+        # Runs on the shared network loop; its handlers are called on the loop thread
+        self.network = network_loop()
+        # Reconnecting is done by _stay_connected, with our own backoff and a reconnected signal
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self._supervisor = None # Task running _stay_connected
+        self._auth_rejected = False # Set by the connect_error handler during an attempt
+        self._pending_messages = []
+        self._pending_lock = threading.Lock()
+        self._batch_timer = QTimer(self)
+        self._batch_timer.setSingleShot(True)
+        self._batch_timer.setInterval(self.BATCH_INTERVAL_MS)
+        self._batch_timer.timeout.connect(self._flush_messages)
+        self._batch_started.connect(self._batch_timer.start)
+        self._call_done.connect(self._deliver)
         self.register_handlers()
 
+    def _queue_message(self, data):
+        # Runs on the network loop. Only the first event of a batch arms the
+        # timer; the rest just join the list until it fires on the GUI thread.
+        with self._pending_lock:
+            self._pending_messages.append(data)
+            first = len(self._pending_messages) == 1
+        if first:
+            self._batch_started.emit()
+
+    @Slot()
+    def _flush_messages(self):
+        with self._pending_lock:
+            batch, self._pending_messages = self._pending_messages, []
+        if batch:
+            socket_batch_size.observe(len(batch))
+            self.messages_received.emit(batch)
+
     def register_handlers(self):
         @self.sio.event
         def connect():
+            socket_events.inc('connect')
             self.connected.emit()
 
         @self.sio.event
         def disconnect():
+            socket_events.inc('disconnect')
             self.disconnected.emit()
 
         @self.sio.on('message:receive')
         def on_message(data):
-            self.message_received.emit(data)
+            socket_events.inc('message:receive')
+            self._queue_message(data)
         
         @self.sio.on('status:user-online')
         def on_user_online(data):
+            socket_events.inc('status:user-online')
             self.user_online.emit(data)
 
         @self.sio.on('status:user-offline')
         def on_user_offline(data):
+            socket_events.inc('status:user-offline')
             self.user_offline.emit(data)
 
         @self.sio.on('typing')
         def on_typing(data):
+            socket_events.inc('typing')
             self.typing_received.emit(data)
 
         @self.sio.event
         def connect_error(data):
-            self.connect_error.emit(data)
+            # Reported by _stay_connected, which also sees timeouts and transport failures
+            socket_events.inc('connect_error')
+            message = data.get('message', '') if isinstance(data, dict) else str(data or '')
+            if message.startswith('Authentication error'):
+                self._auth_rejected = True
+
+    def connect(self, token, host=SERVER_URL):
+        """
+        Returns at once. The connection is then kept up until disconnect():
+        every failed attempt emits connect_error, every drop disconnected,
+        and both are followed by reconnecting and a new attempt. A refused
+        token emits auth_rejected instead and ends the attempts.
+        """
+        self.network.submit(self._stay_connected(token, host))
 
-    def connect(self, token, host='http://localhost:3000'):
+    async def _stay_connected(self, token, host):
+        if self._supervisor is not None:
+            # Connecting again, e.g. with a new token
+            await self._disconnect()
+        self._supervisor = asyncio.current_task()
+        attempt = 0
+        had_connection = False
         try:
-            self.sio.connect(host, auth={'token': token})
-        except socketio.exceptions.ConnectionError as e:
-            self.connect_error.emit(e)
+            while True:
+                self._auth_rejected = False
+                try:
+                    await self.sio.connect(host, auth={'token': token}, wait_timeout=self.CONNECT_TIMEOUT)
+                except socketio.exceptions.ConnectionError as e:
+                    self.connect_error.emit(e)
+                    if self._auth_rejected:
+                        # Retrying the same token cannot succeed
+                        self._supervisor = None
+                        self.auth_rejected.emit()
+                        return
+                else:
+                    if had_connection or attempt:
+                        socket_reconnects.inc()
+                        self.reconnected.emit()
+                    had_connection = True
+                    attempt = 0
+                    # Until the connection drops. sio.wait() would add a pause meant for
+                    # its own reconnect task, which is disabled here.
+                    await self.sio.eio.wait()
+                attempt += 1
+                delay = reconnect_delay(attempt)
+                self.reconnecting.emit(attempt, delay)
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            pass
 
     def disconnect(self):
-        self.sio.disconnect()
-
-    def send_message(self, recipient_id, content):
-        self.sio.emit('message:send', {'recipientId': recipient_id, 'content': content})
-
-    def send_file_message(self, recipient_id, file_url, file_name, file_type):
-        self.sio.emit('file:send', {
-            'recipientId': recipient_id,
-            'fileUrl': file_url,
-            'fileName': file_name,
-            'fileType': file_type,
-        })
-    
+        if not self.network.is_running():
+            return
+        try:
+            self.network.submit(self._disconnect()).result(SHUTDOWN_TIMEOUT)
+        except Exception:
+            pass # Shutting down anyway
+
+    async def _disconnect(self):
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            self._supervisor = None
+        await self.sio.disconnect()
+
+    def _emit(self, event, data):
+        socket_events_sent.inc(event)
+        self.network.submit(self._send(event, data))
+
+    async def _send(self, event, data):
+        try:
+            await self.sio.emit(event, data)
+        except socketio.exceptions.BadNamespaceError:
+            pass # Not connected; the event is dropped as with any offline send
+
+    def call(self, event, data, on_ack, on_error, timeout):
+        """
+        Emits event and waits for the server's acknowledgement. on_ack(response)
+        or on_error(message) is then called on the GUI thread; not being
+        connected and getting no answer within timeout seconds are errors.
+        """
+        socket_events_sent.inc(event)
+        self.network.submit(self._call(event, data, on_ack, on_error, timeout))
+
+    async def _call(self, event, data, on_ack, on_error, timeout):
+        try:
+            response = await self.sio.call(event, data, timeout=timeout)
+        except socketio.exceptions.BadNamespaceError:
+            self._call_done.emit(on_error, "Not connected.")
+        except socketio.exceptions.TimeoutError:
+            self._call_done.emit(on_error, "No acknowledgement from the server.")
+        else:
+            self._call_done.emit(on_ack, response)
+
+    @Slot(object, object)
+    def _deliver(self, callback, argument):
+        callback(argument)
+
+    # Messages are not sent from here: they go through the outbox (app.outbox), which
+    # batches them with call() and keeps them until the server acknowledges them
+
     def send_typing_notification(self, recipient_id):
-        self.sio.emit('typing', {'recipientId': recipient_id})
+        self._emit('typing', {'recipientId': recipient_id})
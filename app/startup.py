@@ -0,0 +1,84 @@
+# app/startup.py
+import importlib
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+TIMELINE_ENV = 'DEPLAO_STARTUP_TIMELINE'
+TIMELINE_FLAG = '--startup-timeline'
+
+class StartupTimeline:
+    """
+    Records how long each startup phase and lazy import takes, so a change
+    that slows down cold start shows up as a number instead of a feeling.
+    Enabled with DEPLAO_STARTUP_TIMELINE=1 or --startup-timeline; when
+    disabled every method is a cheap no-op. Times are milliseconds since
+    this module was imported, which main.py does first.
+    """
+    def __init__(self):
+        self.enabled = False
+        self._origin = time.perf_counter()
+        self._entries = [] # (start, end, kind, name, thread name); end is None for marks
+        self._lock = threading.Lock() # Imports are timed on the preload thread too
+        self._reported = False
+
+    def enable_if_requested(self, argv):
+        if TIMELINE_FLAG in argv:
+            argv.remove(TIMELINE_FLAG) # Qt would otherwise see an unknown argument
+            self.enabled = True
+        elif os.environ.get(TIMELINE_ENV, '') not in ('', '0'):
+            self.enabled = True
+        return self.enabled
+
+    def _record(self, start, end, kind, name):
+        with self._lock:
+            self._entries.append((start - self._origin, None if end is None else end - self._origin,
+                                  kind, name, threading.current_thread().name))
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(start, time.perf_counter(), 'phase', name)
+
+    def mark(self, name):
+        """Records a point in time, e.g. a window becoming visible."""
+        if self.enabled:
+            now = time.perf_counter()
+            self._record(now, None, 'mark', name)
+
+    def import_module(self, name):
+        """importlib.import_module(), timed. Only the first import of a module costs anything."""
+        if not self.enabled or name in sys.modules:
+            return importlib.import_module(name)
+        start = time.perf_counter()
+        try:
+            return importlib.import_module(name)
+        finally:
+            self._record(start, time.perf_counter(), 'import', name)
+
+    def report(self, stream=None):
+        """Writes the timeline once, ordered by start time."""
+        if not self.enabled or self._reported:
+            return
+        self._reported = True
+        stream = stream or sys.stderr
+        with self._lock:
+            entries = sorted(self._entries)
+        print("Startup timeline (ms since start):", file=stream)
+        for start, end, kind, name, thread in entries:
+            if end is None:
+                print(f"  {start * 1000:8.1f}            {name}", file=stream)
+            else:
+                print(f"  {start * 1000:8.1f} {(end - start) * 1000:+9.1f}  {kind} {name} [{thread}]", file=stream)
+        stream.flush()
+
+# One timeline per process, shared by everything that takes part in startup
+timeline = StartupTimeline()
@@ -0,0 +1,86 @@
+# app/upload_index.py
+import hashlib
+import os
+import sqlite3
+import threading
+from .settings import data_dir
+
+DIGEST_CHUNK_SIZE = 1024 * 1024
+
+def file_digest(path):
+    """
+    Hex SHA-256 of the file at path, read in DIGEST_CHUNK_SIZE pieces into one
+    reused buffer, so memory stays flat whatever the file size. hashlib drops
+    the GIL while hashing, so this can run on a worker thread without stalling
+    the GUI.
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray(DIGEST_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.hexdigest()
+
+class UploadIndex:
+    """
+    Content digest -> server URL of every file this device has uploaded (or
+    found already on the server), so sending the same file again needs no
+    network at all. The digest of each file is remembered too, under its
+    size and modification time, so an unchanged file is not hashed again.
+    Opened on first use; safe to use from worker threads.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path or os.path.join(data_dir(), 'upload_index.sqlite3'),
+                                       check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "server TEXT NOT NULL, digest TEXT NOT NULL, file_url TEXT NOT NULL, "
+                "PRIMARY KEY (server, digest)) WITHOUT ROWID"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS file_digests ("
+                "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, digest TEXT NOT NULL"
+                ") WITHOUT ROWID"
+            )
+        return self._db
+
+    def digest(self, path):
+        """file_digest(path), hashing the file only if its size or modification time changed since the last time."""
+        stat = os.stat(path)
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT digest FROM file_digests WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if row:
+            return row[0]
+        digest = file_digest(path)
+        with self._lock:
+            db = self._connection()
+            with db:
+                db.execute("INSERT OR REPLACE INTO file_digests (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+                           (path, stat.st_size, stat.st_mtime_ns, digest))
+        return digest
+
+    def lookup(self, server, digest):
+        """The URL a file with this digest was stored under on server, or None."""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT file_url FROM uploads WHERE server = ? AND digest = ?", (server, digest)).fetchone()
+        return row[0] if row else None
+
+    def store(self, server, digest, file_url):
+        with self._lock:
+            db = self._connection()
+            with db:
+                db.execute("INSERT OR REPLACE INTO uploads (server, digest, file_url) VALUES (?, ?, ?)",
+                           (server, digest, file_url))
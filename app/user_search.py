@@ -0,0 +1,53 @@
+# app/user_search.py
+import time
+from collections import OrderedDict
+
+class UserSearchCache:
+    """
+    Short-lived cache of user search results keyed by lower-cased query.
+    The server matches usernames by substring and returns at most
+    RESULT_LIMIT users, so results for "ab" that came back below the limit
+    contain every match for "abc" as well: a longer query can be answered by
+    filtering the cached results of its longest cached prefix.
+    """
+    RESULT_LIMIT = 10 # Must match the LIMIT of the server's search query
+    TTL = 30.0 # seconds
+    MAX_ENTRIES = 64
+
+    def __init__(self):
+        self._entries = OrderedDict() # query -> (stored at, users)
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, users = entry
+        if now - stored_at > self.TTL:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return users
+
+    def lookup(self, query):
+        """
+        Returns (users, complete) for query, or None if nothing cached applies.
+        complete is False when the answer was filtered from a truncated prefix
+        result and the server may know more users.
+        """
+        key = query.lower()
+        now = time.monotonic()
+        users = self._get(key, now)
+        if users is not None:
+            return users, True
+        for length in range(len(key) - 1, 0, -1):
+            users = self._get(key[:length], now)
+            if users is not None:
+                matches = [user for user in users if key in user.username.lower()]
+                return matches, len(users) < self.RESULT_LIMIT
+        return None
+
+    def store(self, query, users):
+        self._entries[query.lower()] = (time.monotonic(), users)
+        self._entries.move_to_end(query.lower())
+        while len(self._entries) > self.MAX_ENTRIES:
+            self._entries.popitem(last=False)
@@ -4,13 +4,22 @@ const authMiddleware = require('../middleware/authMiddleware');
 
 const router = express.Router();
 
-// GET /api/chat/:conversationId/messages
+// GET /api/chat/:conversationId/messages?limit=50&before=<messageId>|after=<messageId>
+// `before` pages backwards and `after` forwards by message id (keyset);
+// `offset` is kept for older clients.
 router.get('/:conversationId/messages', authMiddleware, async (req, res) => {
   const { conversationId } = req.params;
-  const { limit = 50, offset = 0 } = req.query;
+  const { limit = 50, offset = 0, before, after } = req.query;
 
   try {
-    const messages = await Message.findByConversation(conversationId, limit, offset);
+    let messages;
+    if (before) {
+      messages = await Message.findBefore(conversationId, before, limit);
+    } else if (after) {
+      messages = await Message.findAfter(conversationId, after, limit);
+    } else {
+      messages = await Message.findByConversation(conversationId, limit, offset);
+    }
     res.json(messages);
   } catch (error) {
     console.error('Error fetching messages:', error);
@@ -1,9 +1,78 @@
 const express = require('express');
-const { upload } = require('../services/fileService');
+const crypto = require('crypto');
+const fs = require('fs');
+const path = require('path');
+const { upload, storagePath, partialPath, finalFilename } = require('../services/fileService');
 const authMiddleware = require('../middleware/authMiddleware');
+const UploadedFile = require('../../models/UploadedFile');
 
 const router = express.Router();
 
+// Largest chunk accepted by PUT /sessions/:uploadId
+const MAX_CHUNK_SIZE = '16mb';
+
+// A session not touched for this long is abandoned: it and its partial file are deleted
+const SESSION_TTL_MS = 24 * 60 * 60 * 1000;
+const SESSION_SWEEP_INTERVAL_MS = 60 * 60 * 1000;
+
+// In-memory store of resumable uploads { uploadId: { userId, fileName, fileType, size, offset, touchedAt, writing } }
+const uploadSessions = new Map();
+
+function removePartial(uploadId) {
+  return fs.promises.rm(path.join(partialPath, uploadId), { force: true });
+}
+
+function sweepSessions() {
+  const cutoff = Date.now() - SESSION_TTL_MS;
+  for (const [uploadId, session] of uploadSessions) {
+    if (session.touchedAt < cutoff && !session.writing) {
+      uploadSessions.delete(uploadId);
+      removePartial(uploadId).catch((error) => console.error('Error removing abandoned upload:', error));
+    }
+  }
+}
+
+// Sessions do not survive a restart, so every partial file left by an earlier run is abandoned
+fs.promises
+  .readdir(partialPath)
+  .then((names) => Promise.all(names.filter((name) => !uploadSessions.has(name)).map(removePartial)))
+  .catch((error) => console.error('Error removing abandoned uploads:', error));
+setInterval(sweepSessions, SESSION_SWEEP_INTERVAL_MS).unref();
+
+function uploadResult(fileName, fileType, filename) {
+  return {
+    message: 'File uploaded successfully.',
+    fileUrl: `/uploads/${filename}`,
+    fileName,
+    fileType,
+  };
+}
+
+// SHA-256 of a file on disk, read as a stream so memory stays flat whatever its size
+function fileDigest(filePath) {
+  return new Promise((resolve, reject) => {
+    const hash = crypto.createHash('sha256');
+    fs.createReadStream(filePath)
+      .on('data', (chunk) => hash.update(chunk))
+      .on('error', reject)
+      .on('end', () => resolve(hash.digest('hex')));
+  });
+}
+
+function fileExists(filePath) {
+  return fs.promises.access(filePath).then(() => true, () => false);
+}
+
+function findSession(req, res) {
+  const session = uploadSessions.get(req.params.uploadId);
+  if (!session || session.userId !== req.user.id) {
+    res.status(404).json({ message: 'Upload session not found.' });
+    return null;
+  }
+  session.touchedAt = Date.now();
+  return session;
+}
+
 // POST /api/upload
 router.post('/', [authMiddleware, upload.single('file')], (req, res) => {
   if (!req.file) {
@@ -12,13 +81,142 @@ router.post('/', [authMiddleware, upload.single('file')], (req, res) => {
 
   // The file is saved by multer. We return the path to the client.
   // The client will then send a socket event with this info.
-  const fileUrl = `/uploads/${req.file.filename}`;
-  res.status(201).json({
-    message: 'File uploaded successfully.',
-    fileUrl: fileUrl,
-    fileName: req.file.originalname,
-    fileType: req.file.mimetype,
+  res.status(201).json(uploadResult(req.file.originalname, req.file.mimetype, req.file.filename));
+});
+
+// POST /api/upload/by-digest { sha256, size, fileName, fileType }
+// Returns the upload result for content the server already has, so the client
+// can skip sending it, or 404. Only someone holding the content knows its
+// digest, so this reveals a file URL to no one who could not upload it anyway.
+router.post('/by-digest', authMiddleware, async (req, res) => {
+  const { sha256, size, fileName, fileType } = req.body;
+  if (typeof sha256 !== 'string' || !/^[0-9a-f]{64}$/.test(sha256) || !fileName) {
+    return res.status(400).json({ message: 'sha256 and fileName are required.' });
+  }
+
+  try {
+    const file = await UploadedFile.findByDigest(sha256);
+    if (!file || Number(file.size) !== size || !(await fileExists(path.join(storagePath, file.filename)))) {
+      return res.status(404).json({ message: 'File not found.' });
+    }
+    res.json(uploadResult(fileName, fileType || 'application/octet-stream', file.filename));
+  } catch (error) {
+    console.error('Error looking up upload:', error);
+    res.status(500).json({ message: 'Internal server error' });
+  }
+});
+
+// POST /api/upload/sessions { fileName, fileType, size }
+// Starts a resumable upload. The client then PUTs the file in chunks.
+router.post('/sessions', authMiddleware, async (req, res) => {
+  const { fileName, fileType, size } = req.body;
+  if (!fileName || !Number.isInteger(size) || size < 0) {
+    return res.status(400).json({ message: 'fileName and size are required.' });
+  }
+
+  const uploadId = crypto.randomBytes(16).toString('hex');
+  try {
+    await fs.promises.writeFile(path.join(partialPath, uploadId), '');
+  } catch (error) {
+    console.error('Error creating upload session:', error);
+    return res.status(500).json({ message: 'Internal server error' });
+  }
+  uploadSessions.set(uploadId, {
+    userId: req.user.id,
+    fileName,
+    fileType: fileType || 'application/octet-stream',
+    size,
+    offset: 0,
+    touchedAt: Date.now(),
+    writing: false,
   });
+  res.status(201).json({ uploadId, offset: 0 });
+});
+
+// GET /api/upload/sessions/:uploadId
+// Returns the last acknowledged offset so an interrupted upload can resume from it.
+router.get('/sessions/:uploadId', authMiddleware, (req, res) => {
+  const session = findSession(req, res);
+  if (!session) return;
+  res.json({ uploadId: req.params.uploadId, offset: session.offset, size: session.size });
+});
+
+// PUT /api/upload/sessions/:uploadId  (Upload-Offset header, raw chunk body)
+router.put(
+  '/sessions/:uploadId',
+  [authMiddleware, express.raw({ type: 'application/octet-stream', limit: MAX_CHUNK_SIZE })],
+  async (req, res) => {
+    const session = findSession(req, res);
+    if (!session) return;
+
+    const offset = Number(req.get('Upload-Offset'));
+    // A chunk still being written has not moved the offset yet, so a second one is refused too
+    if (offset !== session.offset || session.writing) {
+      // Tell the client where to continue from
+      return res.status(409).json({ message: 'Offset mismatch.', offset: session.offset });
+    }
+    if (!Buffer.isBuffer(req.body) || session.offset + req.body.length > session.size) {
+      return res.status(400).json({ message: 'Invalid chunk.', offset: session.offset });
+    }
+
+    session.writing = true;
+    try {
+      await fs.promises.appendFile(path.join(partialPath, req.params.uploadId), req.body);
+      session.offset += req.body.length;
+    } catch (error) {
+      console.error('Error writing upload chunk:', error);
+      return res.status(500).json({ message: 'Internal server error' });
+    } finally {
+      session.writing = false;
+    }
+    res.json({ offset: session.offset });
+  }
+);
+
+// POST /api/upload/sessions/:uploadId/complete
+// The assembled file is hashed here, not trusted from the client; content
+// stored before is kept once and the new copy dropped.
+router.post('/sessions/:uploadId/complete', authMiddleware, async (req, res) => {
+  const session = findSession(req, res);
+  if (!session) return;
+  if (session.offset !== session.size || session.writing) {
+    return res.status(409).json({ message: 'Upload is incomplete.', offset: session.offset });
+  }
+
+  const partial = path.join(partialPath, req.params.uploadId);
+  try {
+    const sha256 = await fileDigest(partial);
+    let file = await UploadedFile.findByDigest(sha256);
+    if (file && (await fileExists(path.join(storagePath, file.filename)))) {
+      await fs.promises.rm(partial, { force: true });
+    } else {
+      const filename = finalFilename('file', session.fileName);
+      await fs.promises.rename(partial, path.join(storagePath, filename));
+      file = await UploadedFile.create(sha256, filename, session.size);
+      if (file.filename !== filename) {
+        // A file whose copy had gone missing, or a concurrent upload of the same content
+        await fs.promises.rename(path.join(storagePath, filename), path.join(storagePath, file.filename));
+      }
+    }
+    uploadSessions.delete(req.params.uploadId);
+    res.status(201).json(uploadResult(session.fileName, session.fileType, file.filename));
+  } catch (error) {
+    console.error('Error completing upload:', error);
+    res.status(500).json({ message: 'Internal server error' });
+  }
+});
+
+// DELETE /api/upload/sessions/:uploadId
+router.delete('/sessions/:uploadId', authMiddleware, async (req, res) => {
+  const session = findSession(req, res);
+  if (!session) return;
+  uploadSessions.delete(req.params.uploadId);
+  try {
+    await removePartial(req.params.uploadId);
+  } catch (error) {
+    console.error('Error removing upload:', error);
+  }
+  res.status(204).end();
 });
 
 module.exports = router;
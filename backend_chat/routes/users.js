@@ -9,7 +9,7 @@ router.get('/search', authMiddleware, async (req, res) => {
   const { q } = req.query;
   const currentUserId = req.user.id;
 
-  if (!q) {
+  if (!q || typeof q !== 'string') {
     return res.status(400).json({ message: 'Search query (q) is required.' });
   }
 
@@ -26,8 +26,22 @@ CREATE TABLE messages (
     sender_id INTEGER NOT NULL REFERENCES users(id),
     content_type VARCHAR(20) NOT NULL DEFAULT 'text', -- 'text', 'image', 'file'
     content TEXT NOT NULL,
+    client_id VARCHAR(64), -- Sender-generated id of an outbox entry; NULL for older clients
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Index for faster message retrieval
 CREATE INDEX idx_messages_conversation_id ON messages(conversation_id);
+-- Keyset pagination of history (WHERE conversation_id = $1 AND id < $2 ORDER BY id DESC)
+CREATE INDEX idx_messages_conversation_id_id ON messages(conversation_id, id);
+-- A resent outbox entry is stored once (existing databases:
+-- ALTER TABLE messages ADD COLUMN client_id VARCHAR(64); then this index)
+CREATE UNIQUE INDEX idx_messages_sender_id_client_id ON messages(sender_id, client_id);
+
+-- Uploaded files by content, so a file already on the server is not sent again
+CREATE TABLE uploaded_files (
+    sha256 CHAR(64) PRIMARY KEY,
+    filename VARCHAR(255) NOT NULL, -- Name under uploads/
+    size BIGINT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
@@ -3,10 +3,17 @@ const path = require('path');
 const fs = require('fs');
 
 const storagePath = path.join(__dirname, '..', 'uploads');
+// Chunks of resumable uploads are assembled here before being moved to storagePath
+const partialPath = path.join(storagePath, '.partial');
 
-// Ensure upload directory exists
-if (!fs.existsSync(storagePath)) {
-  fs.mkdirSync(storagePath, { recursive: true });
+// Ensure upload directories exist
+if (!fs.existsSync(partialPath)) {
+  fs.mkdirSync(partialPath, { recursive: true });
+}
+
+function finalFilename(fieldname, originalname) {
+  const uniqueSuffix = Date.now() + '-' + Math.round(Math.random() * 1e9);
+  return fieldname + '-' + uniqueSuffix + path.extname(originalname);
 }
 
 const storage = multer.diskStorage({
@@ -14,11 +21,10 @@ const storage = multer.diskStorage({
     cb(null, storagePath);
   },
   filename: function (req, file, cb) {
-    const uniqueSuffix = Date.now() + '-' + Math.round(Math.random() * 1e9);
-    cb(null, file.fieldname + '-' + uniqueSuffix + path.extname(file.originalname));
+    cb(null, finalFilename(file.fieldname, file.originalname));
   },
 });
 
 const upload = multer({ storage: storage });
 
-module.exports = { upload };
+module.exports = { upload, storagePath, partialPath, finalFilename };
@@ -7,6 +7,22 @@ const Conversation = require('../../models/Conversation');
 // In-memory store for active users { userId: socketId }
 const activeUsers = new Map();
 
+// Longest inline image preview accepted in file:send (base64 characters)
+const MAX_THUMBNAIL_LENGTH = 8192;
+
+// The optional size and inline preview of an image prepared by the sending client
+function imagePreview({ width, height, thumbnail }) {
+  const preview = {};
+  if (Number.isInteger(width) && width > 0 && Number.isInteger(height) && height > 0) {
+    preview.width = width;
+    preview.height = height;
+  }
+  if (typeof thumbnail === 'string' && thumbnail.length <= MAX_THUMBNAIL_LENGTH) {
+    preview.thumbnail = thumbnail;
+  }
+  return preview;
+}
+
 function initializeSocket(server) {
   const io = new Server(server, {
     cors: {
@@ -43,9 +59,23 @@ function initializeSocket(server) {
       socket.broadcast.emit('status:user-offline', { userId: socket.user.id });
     });
 
-    socket.on('message:send', async (data) => {
-        const { recipientId, content } = data;
+    // Stores one message:send or file:send and delivers it to the recipient and back to
+    // the sender. A resend of a client id already stored is answered with the stored row
+    // and not delivered again. Returns the acknowledgement for the client's outbox.
+    async function saveAndDeliver(event, data) {
+        const { recipientId, clientId } = data;
         const senderId = socket.user.id;
+        let contentType, content;
+        if (event === 'message:send') {
+            contentType = 'text';
+            content = data.content;
+        } else if (event === 'file:send') {
+            const { fileUrl, fileName, fileType } = data;
+            contentType = fileType.startsWith('image/') ? 'image' : 'file';
+            content = JSON.stringify({ url: fileUrl, name: fileName, type: fileType, ...imagePreview(data) });
+        } else {
+            return { clientId, error: `Unknown event ${event}.` };
+        }
 
         try {
             let conv = await Conversation.findBetween(senderId, recipientId);
@@ -54,46 +84,44 @@ function initializeSocket(server) {
             }
             const conversationId = conv.conversation_id;
 
-            const message = await Message.create(conversationId, senderId, 'text', content);
+            const { message, created } = await Message.createOnce(
+                conversationId, senderId, contentType, content, clientId || null);
 
-            const recipientSocketId = activeUsers.get(recipientId.toString());
-            if (recipientSocketId) {
-                io.to(recipientSocketId).emit('message:receive', message);
+            if (created) {
+                const recipientSocketId = activeUsers.get(recipientId.toString());
+                if (recipientSocketId) {
+                    io.to(recipientSocketId).emit('message:receive', message);
+                }
+                // Echo back to sender
+                socket.emit('message:receive', message);
             }
-            // Echo back to sender
-            socket.emit('message:receive', message);
+            return { clientId, message };
 
         } catch (error) {
-            console.error('Error sending message:', error);
-            socket.emit('error', { message: 'Failed to send message.' });
+            console.error(`Error handling ${event}:`, error);
+            return { clientId, error: 'Failed to send message.' };
         }
-    });
-    
-    socket.on('file:send', async (data) => {
-        const { recipientId, fileUrl, fileName, fileType } = data;
-        const senderId = socket.user.id;
-        const contentType = fileType.startsWith('image/') ? 'image' : 'file';
-        const content = JSON.stringify({ url: fileUrl, name: fileName, type: fileType });
-
-        try {
-            let conv = await Conversation.findBetween(senderId, recipientId);
-            if (!conv) {
-                conv = await Conversation.create([senderId, recipientId]);
-            }
-            const conversationId = conv.conversation_id;
+    }
 
-            const message = await Message.create(conversationId, senderId, contentType, content);
-            
-            const recipientSocketId = activeUsers.get(recipientId.toString());
-            if (recipientSocketId) {
-                io.to(recipientSocketId).emit('message:receive', message);
+    for (const event of ['message:send', 'file:send']) {
+        socket.on(event, async (data, ack) => {
+            const result = await saveAndDeliver(event, data);
+            if (typeof ack === 'function') {
+                ack(result);
+            } else if (result.error) {
+                socket.emit('error', { message: result.error });
             }
-            // Echo back to sender
-            socket.emit('message:receive', message);
+        });
+    }
 
-        } catch (error) {
-            console.error('Error sending file message:', error);
-            socket.emit('error', { message: 'Failed to send file message.' });
+    // Outbox flush: [{ event, data }] stored in order; the ack lists each entry's result
+    socket.on('message:send-batch', async (items, ack) => {
+        const results = [];
+        for (const { event, data } of items || []) {
+            results.push(await saveAndDeliver(event, data || {}));
+        }
+        if (typeof ack === 'function') {
+            ack(results);
         }
     });
 
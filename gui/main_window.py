@@ -1,13 +1,22 @@
 # gui/main_window.py
 import sys
-from PySide6.QtWidgets import QApplication, QMainWindow, QDialog
-from app.chat_controller import ChatController
+import threading
+import traceback
+from PySide6.QtWidgets import QApplication, QMainWindow, QDialog, QMessageBox
+from PySide6.QtCore import QObject, Signal, Slot, QTimer
+from PySide6.QtGui import QKeySequence, QShortcut
+from app.session import load_session
+from app.settings import APP_NAME
+from app.startup import timeline
+from .theme import apply_theme
 from .widgets.auth_window import AuthWindow
-from .widgets.dashboard import Dashboard
+# The controller (socketio, aiohttp) and the dashboard widgets are imported
+# by StartupLoader in the background; importing them here would delay the login window.
 
 class MainWindow(QMainWindow):
     def __init__(self, controller, parent=None):
         super().__init__(parent)
+        from .widgets.dashboard import Dashboard
         self.controller = controller
         self.setWindowTitle("Deplao Messenger")
         self.setGeometry(100, 100, 800, 600)
@@ -16,25 +25,128 @@ class MainWindow(QMainWindow):
         self.dashboard = Dashboard(self.controller)
         self.setCentralWidget(self.dashboard)
 
+        # Latency and throughput metrics, for support and performance work
+        self.diagnostics_panel = None
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self.show_diagnostics)
+        self.controller.session_expired.connect(self.on_session_expired)
+
+    def show_diagnostics(self):
+        if self.diagnostics_panel is None:
+            from .widgets.diagnostics_panel import DiagnosticsPanel
+            self.diagnostics_panel = DiagnosticsPanel(parent=self)
+        self.diagnostics_panel.show()
+        self.diagnostics_panel.raise_()
+
+    @Slot()
+    def on_session_expired(self):
+        # The cached chats stay readable behind the dialog; logging in reconnects
+        auth_dialog = AuthWindow(self.controller, self)
+        auth_dialog.set_username(self.controller.current_user.username)
+        auth_dialog.exec()
+        auth_dialog.deleteLater()
+
     def closeEvent(self, event):
         """Ensure sockets are closed on exit."""
         self.controller.shutdown()
         event.accept()
 
+class StartupLoader(QObject):
+    """
+    Gets the rest of the app ready while the login window is up. The
+    networking stack and the dashboard modules are imported on a background
+    thread; once they are in, the controller is created and handed to the
+    login window, and the main window is built on a later event loop turn,
+    all before the user has finished typing their credentials.
+    """
+    PRELOAD_MODULES = ('app.chat_controller', 'gui.widgets.dashboard')
+
+    # Internal: cross from the import thread to the GUI thread
+    _imported = Signal()
+    _import_failed = Signal(str)
+
+    def __init__(self, auth_window, parent=None):
+        super().__init__(parent)
+        self.auth_window = auth_window
+        self.controller = None
+        self.main_window = None
+        self._imported.connect(self._create_controller)
+        self._import_failed.connect(self._on_import_failed)
+
+    def load_now(self):
+        """Imports and creates everything on this thread, for a start that skips the login window."""
+        for name in self.PRELOAD_MODULES:
+            timeline.import_module(name)
+        from app.chat_controller import ChatController
+        with timeline.phase('create controller'):
+            self.controller = ChatController()
+        return self.controller
+
+    def start(self):
+        threading.Thread(target=self._import_modules, name='startup-preload', daemon=True).start()
+
+    def _import_modules(self):
+        try:
+            for name in self.PRELOAD_MODULES:
+                timeline.import_module(name)
+        except Exception as e:
+            traceback.print_exc()
+            self._import_failed.emit(str(e))
+            return
+        self._imported.emit()
+
+    @Slot()
+    def _create_controller(self):
+        from app.chat_controller import ChatController
+        with timeline.phase('create controller'):
+            self.controller = ChatController()
+        self.auth_window.set_controller(self.controller)
+        # Let pending input events through before the (longer) widget build
+        QTimer.singleShot(0, self.build_main_window)
+
+    @Slot()
+    def build_main_window(self):
+        if self.main_window is None:
+            with timeline.phase('build main window'):
+                self.main_window = MainWindow(self.controller)
+        return self.main_window
+
+    @Slot(str)
+    def _on_import_failed(self, error_msg):
+        QMessageBox.critical(self.auth_window, "Startup Failed", f"Could not load the application: {error_msg}")
+        self.auth_window.reject()
+
 def run_app():
-    app = QApplication(sys.argv)
-    
-    # Controller is the core of the app, created first
-    chat_controller = ChatController()
-
-    # Show auth window first
-    auth_dialog = AuthWindow(chat_controller)
-    
+    with timeline.phase('create QApplication'):
+        app = QApplication(sys.argv)
+        # Used by QStandardPaths to locate the per-user data directory
+        app.setApplicationName(APP_NAME)
+        apply_theme(app)
+
+    if load_session() is not None:
+        # Logged in before: open straight onto the cached chats, whether or not the server is reachable
+        controller = StartupLoader(None).load_now()
+        if controller.restore_session():
+            main_window = MainWindow(controller)
+            main_window.show()
+            timeline.mark('main window shown')
+            timeline.report()
+            sys.exit(app.exec())
+
+    # Show auth window first; it gets its controller once the network stack is loaded
+    with timeline.phase('create login window'):
+        auth_dialog = AuthWindow()
+    loader = StartupLoader(auth_dialog)
+    loader.start()
+    QTimer.singleShot(0, lambda: timeline.mark('login window shown'))
+
     # If login is successful, show the main window
     if auth_dialog.exec() == QDialog.Accepted:
-        main_window = MainWindow(chat_controller)
+        main_window = loader.build_main_window() # Already built unless the login beat it
         main_window.show()
+        timeline.mark('main window shown')
+        timeline.report()
         sys.exit(app.exec())
     else:
         # User closed the login dialog or failed to log in
+        timeline.report()
         sys.exit(0)
@@ -0,0 +1,149 @@
+# gui/theme.py
+"""
+The application's look in one place. The stylesheet is installed once on
+the QApplication, so Qt parses it a single time; widgets only carry an
+objectName for the rules below instead of a stylesheet of their own (each
+setStyleSheet call is parsed and re-polished separately). Delegates paint
+with the colors defined here and take avatars from the shared pixmap cache.
+"""
+import zlib
+from PySide6.QtGui import QPixmap, QPainter, QColor, QFont
+from PySide6.QtCore import Qt
+
+PANEL_COLOR = QColor("#f0f0f0")
+SIDEBAR_COLOR = QColor("#f5f5f5")
+BORDER_COLOR = QColor("#ddd")
+SELECTED_COLOR = QColor("#e0e0e0")
+SECONDARY_TEXT_COLOR = QColor("gray")
+ACCENT_COLOR = QColor("#0078d7")
+# Avatar backgrounds; a conversation keeps the same one, picked from its name
+AVATAR_COLORS = tuple(QColor(c) for c in ("#34b7f1", "#e17076", "#7bc862", "#faa774", "#6ec9cb", "#a695e7"))
+
+STYLESHEET = f"""
+#chatHeader {{
+    background-color: {PANEL_COLOR.name()};
+    border-bottom: 1px solid {BORDER_COLOR.name()};
+    padding: 10px;
+}}
+#contactName {{
+    font-weight: bold;
+}}
+#typingIndicator {{
+    color: {SECONDARY_TEXT_COLOR.name()};
+    font-style: italic;
+}}
+#inputBar {{
+    background-color: {PANEL_COLOR.name()};
+    border-top: 1px solid {BORDER_COLOR.name()};
+    padding: 5px;
+}}
+#newChatButton {{
+    padding: 8px;
+    font-weight: bold;
+}}
+#connectionBanner {{
+    color: #8a6d3b;
+    background-color: #fcf8e3;
+    padding: 4px;
+}}
+#sidebarList {{
+    border: none;
+    background-color: {SIDEBAR_COLOR.name()};
+}}
+
+AuthWindow {{
+    background-color: #f7f9fc;
+}}
+AuthWindow #title {{
+    font-size: 24px;
+    font-weight: bold;
+    color: #333;
+    padding-bottom: 10px;
+}}
+AuthWindow #input-label {{
+    font-size: 13px;
+    font-weight: bold;
+    color: #555;
+    padding-left: 2px;
+}}
+AuthWindow QLineEdit {{
+    background-color: white;
+    border: 1px solid #dcdcdc;
+    border-radius: 5px;
+    padding: 10px;
+    font-size: 14px;
+}}
+AuthWindow QLineEdit:focus {{
+    border: 1px solid {ACCENT_COLOR.name()};
+}}
+AuthWindow #submit-button {{
+    background-color: {ACCENT_COLOR.name()};
+    color: white;
+    border: none;
+    border-radius: 5px;
+    padding: 10px;
+    font-size: 14px;
+    font-weight: bold;
+    margin-top: 10px;
+}}
+AuthWindow #submit-button:hover {{
+    background-color: #005a9e;
+}}
+AuthWindow #submit-button:disabled {{
+    background-color: #b0b0b0;
+}}
+AuthWindow #link-button {{
+    background-color: transparent;
+    border: none;
+    color: {ACCENT_COLOR.name()};
+    font-size: 12px;
+    text-decoration: underline;
+}}
+AuthWindow #link-button:hover {{
+    color: #005a9e;
+}}
+AuthWindow #status-label {{
+    color: #d32f2f; /* Red for errors */
+    font-size: 12px;
+}}
+"""
+
+def apply_theme(app):
+    """Installs the stylesheet on app; call once, before the first window is created."""
+    app.setStyleSheet(STYLESHEET)
+
+def avatar_color(name):
+    # crc32 rather than hash(): str hashes change between runs
+    return AVATAR_COLORS[zlib.crc32(name.encode('utf-8')) % len(AVATAR_COLORS)]
+
+_avatars = {} # (letter, color rgba, size, device pixel ratio) -> QPixmap
+
+def avatar_pixmap(letter, color, size, device_pixel_ratio=1.0):
+    """
+    A round avatar with letter on color, size logical pixels wide. Painted once
+    per key at the device's pixel ratio and shared by every view after that.
+    """
+    key = (letter, color.rgba(), size, device_pixel_ratio)
+    pixmap = _avatars.get(key)
+    if pixmap is None:
+        pixmap = _avatars[key] = _paint_avatar(letter, color, size, device_pixel_ratio)
+    return pixmap
+
+def _paint_avatar(letter, color, size, device_pixel_ratio):
+    pixels = round(size * device_pixel_ratio)
+    pixmap = QPixmap(pixels, pixels)
+    pixmap.setDevicePixelRatio(device_pixel_ratio)
+    pixmap.fill(Qt.transparent)
+    painter = QPainter(pixmap)
+    painter.setRenderHint(QPainter.Antialiasing)
+    painter.setBrush(color)
+    painter.setPen(Qt.NoPen)
+    painter.drawEllipse(0, 0, size, size)
+    painter.setPen(QColor("white"))
+    font = QFont(painter.font())
+    font.setPixelSize(size // 2)
+    font.setBold(True)
+    painter.setFont(font)
+    painter.drawText(0, 0, size, size, Qt.AlignCenter, letter)
+    painter.end()
+    return pixmap
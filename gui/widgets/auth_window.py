@@ -5,9 +5,12 @@ from PySide6.QtCore import Qt, Slot
 from PySide6.QtGui import QIcon
 
 class AuthWindow(QDialog):
-    def __init__(self, controller, parent=None):
+    def __init__(self, controller=None, parent=None):
         super().__init__(parent)
-        self.controller = controller
+        # May arrive after the window is shown (see set_controller); a submit made
+        # before that is held here and sent once it does
+        self.controller = None
+        self._pending_request = None
         self.setWindowTitle("Welcome")
         self.setMinimumSize(360, 450)
 
@@ -23,8 +26,9 @@ class AuthWindow(QDialog):
         main_layout = QVBoxLayout(self)
         main_layout.addWidget(self.stacked_widget)
 
-        self._apply_styles()
         self._connect_signals()
+        if controller is not None:
+            self.set_controller(controller)
 
     def _create_login_widget(self):
         widget = QWidget()
@@ -142,10 +146,29 @@ class AuthWindow(QDialog):
         self.login_button.clicked.connect(self.handle_login)
         self.register_button.clicked.connect(self.handle_register)
 
+    def set_controller(self, controller):
+        self.controller = controller
         self.controller.login_success.connect(self.on_login_success)
         self.controller.login_error.connect(self.on_login_error)
         self.controller.register_success.connect(self.on_register_success)
         self.controller.register_error.connect(self.on_register_error)
+        if self._pending_request:
+            pending, self._pending_request = self._pending_request, None
+            self._submit(*pending)
+
+    def set_username(self, username):
+        """Logging in again as username, e.g. after the session expired: only the password is asked for."""
+        self.login_username.setText(username)
+        self.login_username.setReadOnly(True)
+        self.stacked_widget.setCurrentWidget(self.login_widget)
+        self.login_status_label.setText("Your session has expired. Log in again to reconnect.")
+        self.login_password.setFocus()
+
+    def _submit(self, action, username, password):
+        if self.controller is None:
+            self._pending_request = (action, username, password)
+        else:
+            getattr(self.controller, action)(username, password)
 
     def handle_login(self):
         username = self.login_username.text()
@@ -153,7 +176,7 @@ class AuthWindow(QDialog):
         if username and password:
             self.login_button.setEnabled(False)
             self.login_status_label.setText("Logging in...")
-            self.controller.login(username, password)
+            self._submit('login', username, password)
         else:
             self.login_status_label.setText("Fields cannot be empty.")
 
@@ -171,7 +194,7 @@ class AuthWindow(QDialog):
         
         self.register_button.setEnabled(False)
         self.reg_status_label.setText("Registering...")
-        self.controller.register(username, password)
+        self._submit('register', username, password)
 
     @Slot(dict)
     def on_login_success(self, user_info):
@@ -195,62 +218,3 @@ class AuthWindow(QDialog):
         self.register_button.setEnabled(True)
         self.reg_status_label.setText("")
         QMessageBox.warning(self, "Registration Failed", f"Could not register: {error_msg}")
-
-    def _apply_styles(self):
-        self.setStyleSheet("""
-            QDialog {
-                background-color: #f7f9fc;
-            }
-            #title {
-                font-size: 24px;
-                font-weight: bold;
-                color: #333;
-                padding-bottom: 10px;
-            }
-            #input-label {
-                font-size: 13px;
-                font-weight: bold;
-                color: #555;
-                padding-left: 2px;
-            }
-            QLineEdit {
-                background-color: white;
-                border: 1px solid #dcdcdc;
-                border-radius: 5px;
-                padding: 10px;
-                font-size: 14px;
-            }
-            QLineEdit:focus {
-                border: 1px solid #0078d7;
-            }
-            #submit-button {
-                background-color: #0078d7;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                padding: 10px;
-                font-size: 14px;
-                font-weight: bold;
-                margin-top: 10px;
-            }
-            #submit-button:hover {
-                background-color: #005a9e;
-            }
-            #submit-button:disabled {
-                background-color: #b0b0b0;
-            }
-            #link-button {
-                background-color: transparent;
-                border: none;
-                color: #0078d7;
-                font-size: 12px;
-                text-decoration: underline;
-            }
-            #link-button:hover {
-                color: #005a9e;
-            }
-            #status-label {
-                color: #d32f2f; /* Red for errors */
-                font-size: 12px;
-            }
-        """)
@@ -1,6 +1,6 @@
-import requests
+from app.http_client import HttpClient
 from PySide6.QtWidgets import QWidget, QVBoxLayout, QPushButton, QLabel, QMessageBox
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, Slot
 
 class BackendViewer(QWidget):
     """
@@ -10,6 +10,7 @@ class BackendViewer(QWidget):
         super().__init__(parent)
 
         self.setWindowTitle("Backend Interaction")
+        self.http_client = HttpClient(self)
 
         self.layout = QVBoxLayout(self)
         self.fetch_button = QPushButton("Tải dữ liệu từ Backend")
@@ -23,16 +24,21 @@ class BackendViewer(QWidget):
 
     def fetch_data(self):
         """
-        Fetches data from the backend and updates the label.
+        Fetches data from the backend; the label is updated when it arrives.
         """
         self.result_label.setText("Đang tải...")
-        try:
-            # Make sure your Node.js backend is running
-            response = requests.get("http://localhost:3000/api/data")
-            response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
-            data = response.json()
-            message = data.get("message", "Không có thông điệp")
-            self.result_label.setText(message)
-        except requests.exceptions.RequestException as e:
-            self.result_label.setText("Lỗi khi kết nối tới backend!")
-            QMessageBox.critical(self, "Lỗi kết nối", f"Không thể kết nối tới backend:\n{e}")
+        self.fetch_button.setEnabled(False)
+        # Make sure your Node.js backend is running
+        self.http_client.get('/api/data', self.on_data_loaded, self.on_data_error)
+
+    @Slot(object)
+    def on_data_loaded(self, data):
+        self.fetch_button.setEnabled(True)
+        message = data.get("message", "Không có thông điệp")
+        self.result_label.setText(message)
+
+    @Slot(str)
+    def on_data_error(self, error_msg):
+        self.fetch_button.setEnabled(True)
+        self.result_label.setText("Lỗi khi kết nối tới backend!")
+        QMessageBox.critical(self, "Lỗi kết nối", f"Không thể kết nối tới backend:\n{error_msg}")
@@ -1,9 +1,19 @@
 # gui/widgets/chat_view.py
-from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
-                               QLineEdit, QPushButton, QScrollArea, QFrame, QFileDialog)
-from PySide6.QtCore import Qt, Slot
-from .message_bubbles import TextMessageBubble, ImageMessageBubble, FileMessageBubble, SystemMessageBubble
-from app.models import Message
+import time
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel, QAbstractItemView,
+                               QLineEdit, QPushButton, QListView, QFrame, QFileDialog, QProgressBar,
+                               QStyleOptionViewItem)
+from PySide6.QtCore import Qt, Slot, QUrl, QRect
+from PySide6.QtGui import QDesktopServices
+from .message_bubbles import MessageBubbleDelegate
+from .message_model import MessageListModel
+from app.metrics import timed_slot
+from app.models import Message, next_local_message_id
+
+# Start fetching the previous page once the view is this close to the top (px)
+PREFETCH_THRESHOLD = 400
+# New rows keep the view pinned to the bottom if it was within this distance of it (px)
+STICKY_BOTTOM_MARGIN = 20
 
 class ChatView(QWidget):
     def __init__(self, controller, parent=None):
@@ -11,6 +21,16 @@ class ChatView(QWidget):
         self.controller = controller
         self.current_conversation_id = None
         self.current_recipient_id = None
+        self.has_more_history = False
+        self.loading_older_history = False
+        self._stick_to_bottom = True
+        self._keep_scroll_anchor = False
+        # upload_key -> {'recipient_id', 'conversation_id', 'file_name', 'sent', 'total'};
+        # the bar shows the most recent one
+        self.uploads = {}
+        self.shown_upload_key = None
+        # Urls the user asked to download; they are opened once the file arrives
+        self.pending_opens = set()
 
         self.setup_ui()
         self.connect_signals()
@@ -21,30 +41,50 @@ class ChatView(QWidget):
         layout.setSpacing(0)
 
         # Header
+        # Styled by the application stylesheet (gui/theme.py) through the object names
         header = QFrame()
-        header.setProperty("class", "header")
+        header.setObjectName("chatHeader")
         header_layout = QHBoxLayout(header)
         self.contact_name_label = QLabel("Select a conversation")
-        self.contact_name_label.setStyleSheet("font-weight: bold;")
+        self.contact_name_label.setObjectName("contactName")
         self.typing_indicator_label = QLabel("")
-        self.typing_indicator_label.setStyleSheet("color: gray; font-style: italic;")
+        self.typing_indicator_label.setObjectName("typingIndicator")
         header_layout.addWidget(self.contact_name_label)
         header_layout.addStretch()
         header_layout.addWidget(self.typing_indicator_label)
-        header.setStyleSheet(".header { background-color: #f0f0f0; padding: 10px; border-bottom: 1px solid #ddd; }")
 
-        # Message Area
-        self.scroll_area = QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.message_container = QWidget()
-        self.message_layout = QVBoxLayout(self.message_container)
-        self.message_layout.addStretch()
-        self.scroll_area.setWidget(self.message_container)
+        # Message Area: a virtualized list, only visible rows are painted
+        self.message_model = MessageListModel(self.controller.message_store, self)
+        self.message_delegate = MessageBubbleDelegate(self.controller.image_loader,
+                                                      self.controller.download_manager, self)
+        self.message_list = QListView()
+        self.message_list.setModel(self.message_model)
+        self.message_list.setItemDelegate(self.message_delegate)
+        self.message_list.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.message_list.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.message_list.setSelectionMode(QAbstractItemView.NoSelection)
+        self.message_list.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.message_list.setResizeMode(QListView.Adjust)
+        self.message_list.setFrameShape(QFrame.NoFrame)
+        self.message_list.setFocusPolicy(Qt.NoFocus)
+
+        # Upload progress, hidden while nothing is uploading
+        self.upload_bar = QFrame()
+        upload_layout = QHBoxLayout(self.upload_bar)
+        upload_layout.setContentsMargins(10, 2, 10, 2)
+        self.upload_label = QLabel("")
+        self.upload_progress_bar = QProgressBar()
+        self.upload_progress_bar.setRange(0, 1000)
+        self.upload_progress_bar.setTextVisible(False)
+        self.upload_action_button = QPushButton("Cancel")
+        upload_layout.addWidget(self.upload_label)
+        upload_layout.addWidget(self.upload_progress_bar, 1)
+        upload_layout.addWidget(self.upload_action_button)
+        self.upload_bar.hide()
 
         # Input Bar
         input_bar = QFrame()
-        input_bar.setProperty("class", "input-bar")
+        input_bar.setObjectName("inputBar")
         input_layout = QHBoxLayout(input_bar)
         self.attach_button = QPushButton("📎")
         self.message_input = QLineEdit()
@@ -53,98 +93,189 @@ class ChatView(QWidget):
         input_layout.addWidget(self.attach_button)
         input_layout.addWidget(self.message_input)
         input_layout.addWidget(self.send_button)
-        input_bar.setStyleSheet(".input-bar { background-color: #f0f0f0; padding: 5px; border-top: 1px solid #ddd; }")
 
         layout.addWidget(header)
-        layout.addWidget(self.scroll_area)
+        layout.addWidget(self.message_list)
+        layout.addWidget(self.upload_bar)
         layout.addWidget(input_bar)
 
     def connect_signals(self):
         self.send_button.clicked.connect(self.send_message)
         self.message_input.returnPressed.connect(self.send_message)
+        self.message_input.textEdited.connect(self.on_text_edited)
         self.attach_button.clicked.connect(self.attach_file)
+        self.upload_action_button.clicked.connect(self.on_upload_action)
         
         # Connect controller signals for async operations
         self.controller.history_loaded.connect(self.display_history)
-        self.controller.new_message_received.connect(self.add_message)
+        self.controller.older_history_loaded.connect(self.on_older_history_loaded)
+        self.controller.history_load_error.connect(self.on_history_load_error)
+        self.message_list.verticalScrollBar().valueChanged.connect(self.maybe_load_older_history)
+        self.message_model.rowsAboutToBeInserted.connect(self._remember_scroll_position)
+        self.message_model.rowsInserted.connect(self._restore_scroll_position)
         self.controller.upload_complete.connect(self.on_upload_complete)
-        self.controller.upload_failed.connect(lambda error_msg: self.add_system_message(f"Upload Failed: {error_msg}"))
+        self.controller.upload_progress.connect(self.on_upload_progress)
+        self.controller.upload_failed.connect(self.on_upload_failed)
+        self.controller.upload_cancelled.connect(self.on_upload_cancelled)
+        self.controller.message_confirmed.connect(self.on_message_confirmed)
+        self.controller.message_send_failed.connect(self.on_message_send_failed)
+        self.message_model.modelReset.connect(self.message_delegate.clear_cache)
+        self.message_model.rowsAboutToBeRemoved.connect(self._forget_layouts)
+        # A reset shows the newest messages (a new conversation, a large catch-up): keep them in view
+        self.message_model.modelReset.connect(self.scroll_to_bottom)
+        self.controller.image_loader.image_ready.connect(lambda url: self.message_list.viewport().update())
+        self.message_delegate.file_button_clicked.connect(self.on_file_button_clicked)
+        downloads = self.controller.download_manager
+        downloads.download_progress.connect(lambda url, received, total: self.message_list.viewport().update())
+        downloads.download_finished.connect(self.on_download_finished)
+        downloads.download_failed.connect(self.on_download_failed)
+        downloads.download_cancelled.connect(self.on_download_cancelled)
+        self.controller.presence.typing_changed.connect(self.on_typing_changed)
+        self.controller.presence.presence_changed.connect(self.on_presence_changed)
 
+    @timed_slot('ChatView.set_conversation')
     def set_conversation(self, conversation):
-        self.clear_messages()
         self.current_conversation_id = conversation.id
+        self.has_more_history = False
+        self.loading_older_history = False
+        self.message_model.current_user_id = self.controller.current_user.id
+        self.message_model.set_conversation(conversation.id)
         # Simple logic for 1-on-1 chat to find the other user
         self.current_recipient_id = next((p.id for p in conversation.participants if p.id != self.controller.current_user.id), None)
         
         self.contact_name_label.setText(conversation.name)
-        self.add_system_message(f"Chat with {conversation.name} started.")
+        self.update_status_label()
+        if self.message_model.rowCount() == 0:
+            # A zero timestamp sorts the notice before any history
+            self.add_system_message(f"Chat with {conversation.name} started.", created_at=0)
+        self.scroll_to_bottom()
+        self.controller.set_active_conversation(self.current_conversation_id)
         self.controller.load_conversation_history(self.current_conversation_id)
 
-    @Slot(int, list)
-    def display_history(self, conversation_id, messages):
+    @Slot(int, list, bool)
+    @timed_slot('ChatView.display_history')
+    def display_history(self, conversation_id, messages, has_more):
         if conversation_id != self.current_conversation_id:
             return
-        for msg in messages:
-            self.add_message(msg, scroll_to_bottom=False)
+        self.has_more_history = has_more
         self.scroll_to_bottom()
+        # A short first page may not fill the viewport, so there is nothing to scroll
+        self.maybe_load_older_history()
 
-    @Slot(Message)
-    def add_message(self, message, scroll_to_bottom=True):
-        if message.conversation_id != self.current_conversation_id:
+    @Slot(int, list, bool)
+    @timed_slot('ChatView.on_older_history_loaded')
+    def on_older_history_loaded(self, conversation_id, messages, has_more):
+        if conversation_id != self.current_conversation_id:
             return
+        self.has_more_history = has_more
+        self.loading_older_history = False
+        self.maybe_load_older_history()
 
-        is_own = message.sender_id == self.controller.current_user.id
-        
-        if message.content_type == 'text':
-            bubble = TextMessageBubble(message, is_own)
-        elif message.content_type == 'image':
-            bubble = ImageMessageBubble(message, is_own)
-        elif message.content_type == 'file':
-            bubble = FileMessageBubble(message, is_own)
-        else: # system
-            self.add_system_message(message.content)
+    def maybe_load_older_history(self, _scroll_value=None):
+        if self.message_list.verticalScrollBar().value() > PREFETCH_THRESHOLD:
             return
+        # Messages already in memory first; the server is only asked once all of them are shown
+        if self.message_model.show_older_rows():
+            return
+        if not self.has_more_history or self.loading_older_history:
+            return
+        before_id = self.message_model.oldest_server_id()
+        if before_id is None:
+            return
+        self.loading_older_history = True
+        self.controller.load_older_history(self.current_conversation_id, before_id)
 
-        # Layout to align bubble left/right
-        row_layout = QHBoxLayout()
-        if is_own:
-            row_layout.addStretch()
-            row_layout.addWidget(bubble)
-        else:
-            row_layout.addWidget(bubble)
-            row_layout.addStretch()
-        
-        # Insert bubble before the final stretch
-        self.message_layout.insertLayout(self.message_layout.count() - 1, row_layout)
+    def _forget_layouts(self, parent, first, last):
+        # Removed rows are pending messages replaced by the server's copy or dropped after a failed send
+        for row in range(first, last + 1):
+            message = self.message_model.index(row).data(MessageListModel.MessageRole)
+            if message is not None:
+                self.message_delegate.forget(message.id)
+
+    def _remember_scroll_position(self, parent, first, last):
+        scroll_bar = self.message_list.verticalScrollBar()
+        self._stick_to_bottom = scroll_bar.value() >= scroll_bar.maximum() - STICKY_BOTTOM_MARGIN
+        self._keep_scroll_anchor = False
+        if self._stick_to_bottom or first >= self.message_model.rowCount():
+            return
+        # The row currently at the insertion point gets pushed down; if it is on screen or
+        # above it, it is kept where it is (older history, late arrivals)
+        anchor_top = self.message_list.visualRect(self.message_model.index(first)).top()
+        self._keep_scroll_anchor = anchor_top <= self.message_list.viewport().height()
 
-        if scroll_to_bottom:
+    def _restore_scroll_position(self, parent, first, last):
+        if self._stick_to_bottom:
             self.scroll_to_bottom()
+        elif self._keep_scroll_anchor:
+            self._keep_scroll_anchor = False
+            # Scroll down by the new rows' height, taken from the delegate's layouts. The view lays
+            # the rows out later, once, and arrives at the same range, so nothing is laid out here
+            option = QStyleOptionViewItem()
+            option.font = self.message_list.font()
+            option.rect = QRect(0, 0, self.message_list.viewport().width(), 0)
+            height = sum(self.message_delegate.sizeHint(option, self.message_model.index(row)).height()
+                         for row in range(first, last + 1))
+            scroll_bar = self.message_list.verticalScrollBar()
+            scroll_bar.setMaximum(scroll_bar.maximum() + height)
+            scroll_bar.setValue(scroll_bar.value() + height)
+
+    @Slot(str)
+    def on_history_load_error(self, error_msg):
+        # Allow the next scroll to retry the page that failed
+        self.loading_older_history = False
+
+    def add_system_message(self, text, created_at=None):
+        if created_at is None:
+            created_at = int(time.time() * 1000)
+        message = Message(id=next_local_message_id(), conversation_id=self.current_conversation_id,
+                          sender_id=None, content_type='system', content=text,
+                          created_at=created_at, sender_username='')
+        self.controller.message_store.add_messages([message])
+
+    def update_status_label(self):
+        presence = self.controller.presence
+        if self.current_recipient_id is not None and presence.is_typing(self.current_recipient_id):
+            self.typing_indicator_label.setText("typing...")
+        elif self.current_recipient_id is not None and presence.is_online(self.current_recipient_id):
+            self.typing_indicator_label.setText("online")
+        else:
+            self.typing_indicator_label.setText("")
+
+    @Slot(int, bool)
+    def on_typing_changed(self, user_id, is_typing):
+        if user_id == self.current_recipient_id:
+            self.update_status_label()
+
+    @Slot(object)
+    def on_presence_changed(self, changes):
+        if self.current_recipient_id in changes:
+            self.update_status_label()
 
-    def add_system_message(self, text):
-        bubble = SystemMessageBubble(text)
-        row_layout = QHBoxLayout()
-        row_layout.setAlignment(Qt.AlignCenter)
-        row_layout.addWidget(bubble)
-        self.message_layout.insertLayout(self.message_layout.count() - 1, row_layout)
-
-    def clear_messages(self):
-        while self.message_layout.count() > 1: # Keep the stretch
-            item = self.message_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-            elif item.layout():
-                # Clear nested layouts
-                while item.layout().count() > 0:
-                    child = item.layout().takeAt(0)
-                    if child.widget():
-                        child.widget().deleteLater()
-                item.layout().deleteLater()
+    @Slot(str)
+    def on_text_edited(self, text):
+        if text and self.current_recipient_id:
+            self.controller.send_typing_notification(self.current_recipient_id)
 
     def send_message(self):
         text = self.message_input.text()
         if text and self.current_recipient_id:
-            self.controller.send_message(self.current_recipient_id, text)
+            self.controller.send_message(self.current_recipient_id, text, self.current_conversation_id)
             self.message_input.clear()
+            self.scroll_to_bottom()
+
+    @Slot(Message, Message)
+    def on_message_confirmed(self, pending, message):
+        if pending.conversation_id == self.current_conversation_id != message.conversation_id:
+            # The first message of a new chat: the server has created the conversation
+            self.current_conversation_id = message.conversation_id
+            self.message_model.set_conversation(message.conversation_id)
+            self.controller.set_active_conversation(message.conversation_id)
+            self.controller.load_conversation_history(message.conversation_id)
+
+    @Slot(Message, str)
+    def on_message_send_failed(self, pending, error_msg):
+        if pending.conversation_id == self.current_conversation_id:
+            self.add_system_message(f"Message not sent: {error_msg}")
 
     def attach_file(self):
         if not self.current_recipient_id:
@@ -152,14 +283,98 @@ class ChatView(QWidget):
             return
         file_path, _ = QFileDialog.getOpenFileName(self, "Select File")
         if file_path:
-            self.add_system_message(f"Uploading {file_path.split('/')[-1]}...")
-            self.controller.send_file(self.current_recipient_id, file_path)
+            file_name = file_path.split('/')[-1]
+            self.add_system_message(f"Uploading {file_name}...")
+            upload_key = self.controller.send_file(self.current_recipient_id, file_path)
+            # Remember who the file is for: the user may switch chats before it finishes
+            self.uploads[upload_key] = {'recipient_id': self.current_recipient_id,
+                                        'conversation_id': self.current_conversation_id, 'file_name': file_name,
+                                        'sent': 0, 'total': 1}
+            self._show_upload(upload_key, 0, 1)
+
+    def _show_upload(self, upload_key, sent, total, failed=False):
+        self.shown_upload_key = upload_key
+        self.upload_label.setText(self.uploads[upload_key]['file_name'])
+        self.upload_progress_bar.setValue(sent * 1000 // total if total else 1000)
+        self.upload_action_button.setText("Resume" if failed else "Cancel")
+        self.upload_bar.show()
+
+    def _finish_upload(self, upload_key):
+        upload = self.uploads.pop(upload_key, None)
+        if upload_key == self.shown_upload_key:
+            self.shown_upload_key = None
+            self.upload_bar.hide()
+        return upload
+
+    @Slot(str, 'qint64', 'qint64')
+    def on_upload_progress(self, upload_key, sent, total):
+        upload = self.uploads.get(upload_key)
+        if upload is not None:
+            upload['sent'], upload['total'] = sent, total
+            self._show_upload(upload_key, sent, total)
+
+    def on_upload_action(self):
+        upload_key = self.shown_upload_key
+        if upload_key is None:
+            return
+        if self.upload_action_button.text() == "Resume":
+            if self.controller.resume_upload(upload_key):
+                self.upload_action_button.setText("Cancel")
+        else:
+            self.controller.cancel_upload(upload_key)
 
-    @Slot(dict)
-    def on_upload_complete(self, upload_result):
+    @Slot(str, dict)
+    def on_upload_complete(self, upload_key, upload_result):
         # Now that upload is done, send the actual file message
-        if self.current_recipient_id:
-            self.controller.send_file_message(self.current_recipient_id, upload_result)
+        upload = self._finish_upload(upload_key)
+        if upload:
+            self.controller.send_file_message(upload['recipient_id'], upload_result, upload['conversation_id'])
+
+    @Slot(str, str)
+    def on_upload_failed(self, upload_key, error_msg):
+        self.add_system_message(f"Upload Failed: {error_msg}")
+        upload = self.uploads.get(upload_key)
+        if upload is not None:
+            # The upload can be resumed from the last acknowledged chunk
+            self._show_upload(upload_key, upload['sent'], upload['total'], failed=True)
+
+    @Slot(str)
+    def on_upload_cancelled(self, upload_key):
+        upload = self._finish_upload(upload_key)
+        if upload:
+            self.add_system_message(f"Upload of {upload['file_name']} cancelled.")
+
+    @Slot(object)
+    def on_file_button_clicked(self, message):
+        file_info = message.file_info
+        if not file_info or not file_info.url:
+            return # Unreadable file message: nothing to download
+        downloads = self.controller.download_manager
+        if downloads.is_downloading(file_info.url):
+            self.controller.cancel_download(message)
+            return
+        # Already downloaded files open straight from the local cache
+        self.pending_opens.add(file_info.url)
+        self.controller.download_file(message)
+
+    @Slot(str, str)
+    def on_download_finished(self, url, path):
+        self.message_list.viewport().update()
+        if url in self.pending_opens:
+            self.pending_opens.discard(url)
+            QDesktopServices.openUrl(QUrl.fromLocalFile(path))
+
+    @Slot(str, str)
+    def on_download_failed(self, url, error_msg):
+        self.pending_opens.discard(url)
+        self.message_list.viewport().update()
+        self.add_system_message(f"Download Failed: {error_msg}")
+
+    @Slot(str)
+    def on_download_cancelled(self, url):
+        self.pending_opens.discard(url)
+        self.message_list.viewport().update()
 
     def scroll_to_bottom(self):
-        self.scroll_area.verticalScrollBar().setValue(self.scroll_area.verticalScrollBar().maximum())
+        self.message_list.scrollToBottom()
+
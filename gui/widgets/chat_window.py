@@ -61,7 +61,7 @@ class ChatWindow(QMainWindow):
         self.attach_button.clicked.connect(self.attach_file)
         
         # Connect controller signals to UI slots
-        self.controller.socket_manager.message_received.connect(self.display_message)
+        self.controller.message_store.messages_inserted.connect(self.on_messages_inserted)
 
     def on_contact_selected(self, item):
         # A simple way to get the recipient ID from the contact list text
@@ -93,18 +93,18 @@ class ChatWindow(QMainWindow):
         if file_path:
             self.controller.send_file(self.current_recipient_id, file_path)
 
+    def on_messages_inserted(self, conversation_id, first, last):
+        for message in self.controller.message_store.messages(conversation_id)[first:last + 1]:
+            self.display_message(message)
+
     def display_message(self, message):
         # This is a very basic display. A real app would use a more complex view.
-        sender = "You" if message['sender_id'] != self.current_recipient_id else f"User {message['sender_id']}"
+        sender = "You" if message.sender_id != self.current_recipient_id else f"User {message.sender_id}"
         
-        content = message['content']
-        if message['content_type'] != 'text':
-            import json
-            try:
-                file_info = json.loads(content)
-                content = f"File: {file_info.get('name', 'N/A')} ({file_info.get('url', '')})"
-            except json.JSONDecodeError:
-                content = "Received a file (could not parse details)."
+        content = message.content
+        file_info = message.file_info
+        if file_info:
+            content = f"File: {file_info.name or 'N/A'} ({file_info.url or ''})"
 
         self.message_view.append(f"<b>{sender}:</b> {content}")
 
@@ -1,84 +1,81 @@
 # gui/widgets/conversation_list_item.py
-from PySide6.QtWidgets import QWidget, QHBoxLayout, QVBoxLayout, QLabel
-from PySide6.QtGui import QPixmap, QPainter, QColor, QBrush
-from PySide6.QtCore import QSize, Qt
+from PySide6.QtWidgets import QStyledItemDelegate, QStyle
+from PySide6.QtGui import QFont, QFontMetrics
+from PySide6.QtCore import QSize, Qt, QRect
+from ..theme import SELECTED_COLOR, SECONDARY_TEXT_COLOR as PREVIEW_TEXT_COLOR, avatar_color, avatar_pixmap
+from .conversation_model import ConversationListModel
 
-class ConversationListItem(QWidget):
-    def __init__(self, conversation, parent=None):
+ITEM_HEIGHT = 54
+ITEM_MARGIN_H = 10
+AVATAR_SIZE = 40
+
+def preview_text(message):
+    if message is None:
+        return ""
+    if message.content_type == 'text':
+        return message.content
+    return f"Sent a {message.content_type}"
+
+class ConversationItemDelegate(QStyledItemDelegate):
+    """
+    Paints ConversationListModel rows: avatar, name, last message preview and
+    time. Every row has the same height, so the view never measures rows and
+    can use uniform item sizes.
+    """
+    def __init__(self, parent=None):
         super().__init__(parent)
-        self.conversation = conversation
+        self._fonts_cache = None
+
+    def _fonts(self, option):
+        if self._fonts_cache is None:
+            name = QFont(option.font)
+            name.setBold(True)
+            time = QFont(option.font)
+            time.setPixelSize(10)
+            self._fonts_cache = {'name': name, 'preview': QFont(option.font), 'time': time}
+        return self._fonts_cache
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), ITEM_HEIGHT)
+
+    def paint(self, painter, option, index):
+        conversation = index.data(ConversationListModel.ConversationRole)
+        if conversation is None:
+            return super().paint(painter, option, index)
+        fonts = self._fonts(option)
+        row = option.rect
+        painter.save()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(row, SELECTED_COLOR)
 
-        layout = QHBoxLayout(self)
-        layout.setContentsMargins(10, 5, 10, 5)
+        name = conversation.name
+        avatar_top = row.top() + (row.height() - AVATAR_SIZE) // 2
+        avatar = avatar_pixmap(name[:1].upper(), avatar_color(name), AVATAR_SIZE, painter.device().devicePixelRatioF())
+        painter.drawPixmap(row.left() + ITEM_MARGIN_H, avatar_top, avatar)
 
-        # Avatar (placeholder)
-        self.avatar = QLabel()
-        self.avatar.setFixedSize(40, 40)
-        self.avatar.setPixmap(self.create_avatar(conversation.name[0].upper()))
-        
-        # Info
-        info_layout = QVBoxLayout()
-        info_layout.setSpacing(0)
-        
-        self.name_label = QLabel(conversation.name)
-        self.name_label.setStyleSheet("font-weight: bold;")
-        
-        last_message_text = ""
-        if conversation.last_message:
-            if conversation.last_message.content_type == 'text':
-                last_message_text = conversation.last_message.content
-            else:
-                last_message_text = f"Sent a {conversation.last_message.content_type}"
-        
-        self.last_message_label = QLabel(last_message_text)
-        self.last_message_label.setStyleSheet("color: gray;")
-        
-        info_layout.addWidget(self.name_label)
-        info_layout.addWidget(self.last_message_label)
-        
-        # Timestamp and unread count
-        side_layout = QVBoxLayout()
-        side_layout.setAlignment(Qt.AlignTop)
-        
-        timestamp = conversation.last_message.display_time if conversation.last_message else ""
-        self.time_label = QLabel(timestamp)
-        self.time_label.setStyleSheet("color: gray; font-size: 10px;")
-        
-        # Unread count (placeholder)
-        self.unread_label = QLabel("3")
-        self.unread_label.setAlignment(Qt.AlignCenter)
-        self.unread_label.setStyleSheet("""
-            background-color: #34b7f1;
-            color: white;
-            font-weight: bold;
-            border-radius: 8px;
-            padding: 1px 5px;
-            font-size: 10px;
-        """)
-        self.unread_label.setMinimumWidth(16)
-        self.unread_label.hide() # Hidden by default
+        last_message = conversation.last_message
+        time_text = last_message.display_time if last_message else ""
+        time_metrics = QFontMetrics(fonts['time'])
+        time_width = time_metrics.horizontalAdvance(time_text)
+        text_left = row.left() + ITEM_MARGIN_H + AVATAR_SIZE + 10
+        text_width = max(0, row.right() - ITEM_MARGIN_H - time_width - 8 - text_left)
+        half = row.height() // 2
 
-        side_layout.addWidget(self.time_label)
-        side_layout.addWidget(self.unread_label, 0, Qt.AlignRight)
+        painter.setFont(fonts['time'])
+        painter.setPen(PREVIEW_TEXT_COLOR)
+        painter.drawText(QRect(row.right() - ITEM_MARGIN_H - time_width, row.top() + 6, time_width, half),
+                         Qt.AlignRight | Qt.AlignTop, time_text)
 
-        layout.addWidget(self.avatar)
-        layout.addLayout(info_layout)
-        layout.addStretch()
-        layout.addLayout(side_layout)
+        painter.setFont(fonts['name'])
+        painter.setPen(option.palette.text().color())
+        name_metrics = QFontMetrics(fonts['name'])
+        painter.drawText(QRect(text_left, row.top(), text_width, half - 1), Qt.AlignLeft | Qt.AlignBottom,
+                         name_metrics.elidedText(name, Qt.ElideRight, text_width))
 
-    def create_avatar(self, letter):
-        pixmap = QPixmap(40, 40)
-        pixmap.fill(Qt.transparent)
-        painter = QPainter(pixmap)
-        painter.setRenderHint(QPainter.Antialiasing)
-        painter.setBrush(QBrush(QColor("#34b7f1")))
-        painter.setPen(Qt.NoPen)
-        painter.drawEllipse(0, 0, 40, 40)
-        painter.setPen(QColor("white"))
-        font = painter.font()
-        font.setPixelSize(20)
-        font.setBold(True)
-        painter.setFont(font)
-        painter.drawText(pixmap.rect(), Qt.AlignCenter, letter)
-        painter.end()
-        return pixmap
+        painter.setFont(fonts['preview'])
+        painter.setPen(PREVIEW_TEXT_COLOR)
+        preview_metrics = QFontMetrics(fonts['preview'])
+        preview = preview_text(last_message).replace('\n', ' ')
+        painter.drawText(QRect(text_left, row.top() + half + 1, text_width, half - 1), Qt.AlignLeft | Qt.AlignTop,
+                         preview_metrics.elidedText(preview, Qt.ElideRight, text_width))
+        painter.restore()
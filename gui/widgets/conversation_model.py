@@ -0,0 +1,122 @@
+# gui/widgets/conversation_model.py
+from bisect import bisect_left
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt
+from app.models import Conversation
+
+def recency_key(conversation):
+    # Ascending order of this key is oldest first; the model shows it reversed.
+    # The id is compared as a string because client-side conversations use "temp_<id>".
+    last_message = conversation.last_message
+    return (last_message.created_at if last_message else 0, str(conversation.id))
+
+class ConversationListModel(QAbstractListModel):
+    """
+    Conversations ordered by the time of their last message, newest first.
+    Conversations are indexed by id and their sort keys kept in a sorted list,
+    so finding a row is a dict lookup plus a bisect, and a new message moves
+    one row with beginMoveRows instead of rebuilding the list.
+    """
+    ConversationRole = Qt.UserRole + 1
+    ConversationIdRole = Qt.UserRole + 2
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._by_id = {}  # conversation id -> Conversation
+        self._key_by_id = {}  # conversation id -> recency_key it is currently sorted under
+        # Both oldest first and kept in step; row r is entry len - 1 - r
+        self._conversations = []
+        self._keys = []
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._conversations)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._conversations):
+            return None
+        conversation = self._conversations[len(self._conversations) - 1 - index.row()]
+        if role == self.ConversationRole:
+            return conversation
+        if role == self.ConversationIdRole:
+            return conversation.id
+        if role == Qt.DisplayRole:
+            return conversation.name
+        return None
+
+    def __contains__(self, conversation_id):
+        return conversation_id in self._by_id
+
+    def conversation(self, conversation_id) -> Conversation:
+        return self._by_id.get(conversation_id)
+
+    def _position(self, conversation_id):
+        return bisect_left(self._keys, self._key_by_id[conversation_id])
+
+    def row_of(self, conversation_id):
+        """Row of a conversation, or -1 if it is not in the model."""
+        if conversation_id not in self._by_id:
+            return -1
+        return len(self._conversations) - 1 - self._position(conversation_id)
+
+    def add_conversations(self, conversations):
+        """Adds conversations that are not in the model yet."""
+        new = {}
+        for conversation in conversations:
+            if conversation.id not in self._by_id:
+                new[conversation.id] = conversation
+        if not new:
+            return
+        if len(new) == 1:
+            conversation = next(iter(new.values()))
+            key = recency_key(conversation)
+            position = bisect_left(self._keys, key)
+            row = len(self._conversations) - position
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._insert(conversation, key, position)
+            self.endInsertRows()
+            return
+        # Bulk load (e.g. from the cache): one sort and one reset is cheaper than n inserts
+        self.beginResetModel()
+        for conversation in new.values():
+            self._by_id[conversation.id] = conversation
+            self._key_by_id[conversation.id] = recency_key(conversation)
+        entries = sorted(zip(self._key_by_id.values(), self._by_id.values()), key=lambda entry: entry[0])
+        self._keys = [key for key, _ in entries]
+        self._conversations = [conversation for _, conversation in entries]
+        self.endResetModel()
+
+    def _insert(self, conversation, key, position):
+        self._by_id[conversation.id] = conversation
+        self._key_by_id[conversation.id] = key
+        self._conversations.insert(position, conversation)
+        self._keys.insert(position, key)
+
+    def set_last_message(self, conversation_id, message):
+        """Updates a conversation's preview and moves it to its new place by recency."""
+        conversation = self._by_id.get(conversation_id)
+        if conversation is None:
+            return
+        count = len(self._conversations)
+        old_position = self._position(conversation_id)
+        old_row = count - 1 - old_position
+        conversation.last_message = message
+        new_key = recency_key(conversation)
+        new_position = bisect_left(self._keys, new_key)
+        if new_position > old_position:
+            new_position -= 1  # Account for the entry leaving its old slot
+        new_row = count - 1 - new_position
+
+        if new_row != old_row:
+            # Qt wants the destination as the row the item goes before, in pre-move numbering
+            self.beginMoveRows(QModelIndex(), old_row, old_row, QModelIndex(),
+                               new_row if new_row < old_row else new_row + 1)
+        del self._conversations[old_position]
+        del self._keys[old_position]
+        self._conversations.insert(new_position, conversation)
+        self._keys.insert(new_position, new_key)
+        self._key_by_id[conversation_id] = new_key
+        if new_row != old_row:
+            self.endMoveRows()
+        index = self.index(new_row)
+        self.dataChanged.emit(index, index)
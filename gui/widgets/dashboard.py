@@ -1,20 +1,30 @@
 # gui/widgets/dashboard.py
-from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem, QSplitter, QPushButton
-from PySide6.QtCore import Slot, QSize, Qt
-from .conversation_list_item import ConversationListItem
+from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QListView, QAbstractItemView, QSplitter,
+                               QPushButton, QLineEdit, QListWidget, QListWidgetItem, QStackedWidget, QLabel)
+from PySide6.QtCore import Slot, QModelIndex, QTimer
+from .conversation_list_item import ConversationItemDelegate
+from .conversation_model import ConversationListModel
+from .search_result_item import SearchResultDelegate, ResultRole
 from .chat_view import ChatView
 from .new_chat_dialog import NewChatDialog
 from app.models import Conversation, User, Message # Dummy data for now
 
 class Dashboard(QWidget):
+    # Search messages once typing pauses for this long (ms)
+    SEARCH_DEBOUNCE_MS = 150
+
     def __init__(self, controller, parent=None):
         super().__init__(parent)
         self.controller = controller
-        self.conversations = {} # Store Conversation objects by ID
 
         self.setup_ui()
         self.connect_signals()
-        self.load_dummy_data() # Replace with real data loading
+        # The dashboard is usually built while the login window is still open;
+        # conversations belong to the user, so they are loaded once one is logged in
+        if self.controller.current_user:
+            self.load_conversations()
+        else:
+            self.controller.login_success.connect(self.on_login_success)
 
     def setup_ui(self):
         layout = QHBoxLayout(self)
@@ -29,14 +39,45 @@ class Dashboard(QWidget):
         left_layout.setSpacing(5)
 
         self.new_chat_button = QPushButton("+ New Chat")
-        self.new_chat_button.setStyleSheet("padding: 8px; font-weight: bold;")
+        self.new_chat_button.setObjectName("newChatButton")
+
+        # Only visible while the socket is not connected
+        self.connection_label = QLabel("Connecting...")
+        self.connection_label.setObjectName("connectionBanner")
+        self.connection_label.setVisible(False)
+
+        # Conversations by recency; rows are painted by the delegate, not built from widgets
+        self.convo_model = ConversationListModel(self)
+        self.convo_list_view = QListView()
+        self.convo_list_view.setModel(self.convo_model)
+        self.convo_list_view.setItemDelegate(ConversationItemDelegate(self.convo_list_view))
+        self.convo_list_view.setUniformItemSizes(True)
+        self.convo_list_view.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.convo_list_view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.convo_list_view.setObjectName("sidebarList")
+        
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search messages...")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DEBOUNCE_MS)
+
+        # Shown instead of the conversation list while there is search text
+        self.search_results_list = QListWidget()
+        self.search_results_list.setItemDelegate(SearchResultDelegate(self.search_results_list))
+        self.search_results_list.setUniformItemSizes(True)
+        self.search_results_list.setMouseTracking(True)
+        self.search_results_list.setObjectName("sidebarList")
 
-        self.convo_list_widget = QListWidget()
-        self.convo_list_widget.setSpacing(2)
-        self.convo_list_widget.setStyleSheet("QListWidget { border: none; background-color: #f5f5f5; }")
+        self.left_stack = QStackedWidget()
+        self.left_stack.addWidget(self.convo_list_view)
+        self.left_stack.addWidget(self.search_results_list)
         
         left_layout.addWidget(self.new_chat_button)
-        left_layout.addWidget(self.convo_list_widget)
+        left_layout.addWidget(self.connection_label)
+        left_layout.addWidget(self.search_input)
+        left_layout.addWidget(self.left_stack)
         
         # Right panel: Chat View
         self.chat_view = ChatView(self.controller)
@@ -49,9 +90,75 @@ class Dashboard(QWidget):
 
     def connect_signals(self):
         self.new_chat_button.clicked.connect(self.open_new_chat_dialog)
-        self.convo_list_widget.itemClicked.connect(self.on_conversation_selected)
-        self.controller.new_message_received.connect(self.update_conversation_preview)
+        self.convo_list_view.clicked.connect(self.on_conversation_selected)
+        self.controller.message_store.last_message_changed.connect(self.on_last_message_changed)
         self.controller.new_conversation_started.connect(self.on_new_conversation)
+        self.search_input.textChanged.connect(self.on_search_text_changed)
+        self.search_timer.timeout.connect(self.perform_message_search)
+        self.search_results_list.itemClicked.connect(self.on_search_result_selected)
+        self.controller.message_search_finished.connect(self.show_search_results)
+        self.controller.message_search_error.connect(self.show_search_error)
+        socket_manager = self.controller.socket_manager
+        socket_manager.connected.connect(lambda: self.connection_label.setVisible(False))
+        socket_manager.disconnected.connect(lambda: self.show_connection_status("Connection lost. Reconnecting..."))
+        socket_manager.reconnecting.connect(
+            lambda attempt, delay: self.show_connection_status(f"Offline. Reconnecting in {delay:.0f}s..."))
+        self.controller.session_expired.connect(lambda: self.show_connection_status("Signed out. Log in to reconnect."))
+
+    def show_connection_status(self, text):
+        self.connection_label.setText(text)
+        self.connection_label.setVisible(True)
+
+    @Slot(str)
+    def on_search_text_changed(self, text):
+        if text.strip():
+            self.search_timer.start()
+        else:
+            self.search_timer.stop()
+            self.search_results_list.clear()
+            self.left_stack.setCurrentWidget(self.convo_list_view)
+
+    def perform_message_search(self):
+        self.controller.search_messages(self.search_input.text())
+
+    @Slot(str, list)
+    def show_search_results(self, text, results):
+        if text != self.search_input.text():
+            return # Typed on since; a newer search is on its way
+        self.search_results_list.clear()
+        for message, snippet in results:
+            item = QListWidgetItem()
+            item.setData(ResultRole, (message, snippet))
+            self.search_results_list.addItem(item)
+        if not results:
+            self.search_results_list.addItem("No messages found.")
+        self.left_stack.setCurrentWidget(self.search_results_list)
+
+    @Slot(str)
+    def show_search_error(self, error_msg):
+        if not self.search_input.text().strip():
+            return # Cleared since
+        self.search_results_list.clear()
+        self.search_results_list.addItem(f"Search failed: {error_msg}")
+        self.left_stack.setCurrentWidget(self.search_results_list)
+
+    @Slot(QListWidgetItem)
+    def on_search_result_selected(self, item):
+        result = item.data(ResultRole)
+        if result is None:
+            return
+        conversation_id = result[0].conversation_id
+        if conversation_id not in self.convo_model:
+            # Cached, but not listed this session: list it from the cache
+            conversation = self.controller.cached_conversation(conversation_id)
+            if conversation is None:
+                return
+            self.add_conversation(conversation)
+        row = self.convo_model.row_of(conversation_id)
+        self.search_input.clear()
+        index = self.convo_model.index(row)
+        self.convo_list_view.setCurrentIndex(index)
+        self.on_conversation_selected(index)
 
     def open_new_chat_dialog(self):
         dialog = NewChatDialog(self.controller, self)
@@ -60,16 +167,22 @@ class Dashboard(QWidget):
     @Slot(Conversation)
     def on_new_conversation(self, conversation):
         # Check if conversation already exists in the list
-        if conversation.id not in self.conversations:
+        if conversation.id not in self.convo_model:
             self.add_conversation(conversation)
         
-        # Find and select the item
-        for i in range(self.convo_list_widget.count()):
-            item = self.convo_list_widget.item(i)
-            if item.data(Qt.UserRole) == conversation.id:
-                self.convo_list_widget.setCurrentItem(item)
-                self.on_conversation_selected(item)
-                break
+        index = self.convo_model.index(self.convo_model.row_of(conversation.id))
+        self.convo_list_view.setCurrentIndex(index)
+        self.on_conversation_selected(index)
+
+    @Slot(dict)
+    def on_login_success(self, user_info):
+        # Only the first log-in loads them; a log-in after session_expired keeps the list
+        self.controller.login_success.disconnect(self.on_login_success)
+        self.load_conversations()
+
+    def load_conversations(self):
+        self.load_dummy_data() # Replace with real data loading
+        self.load_cached_conversations()
 
     def load_dummy_data(self):
         # In a real app, you'd fetch this from an API endpoint
@@ -86,48 +199,29 @@ class Dashboard(QWidget):
         convo1 = Conversation(id=1, participants=[me, user1], last_message=Message(id=1, conversation_id=1, sender_id=1, content_type='text', content='Hey, how are you?', created_at='2023-10-27T10:00:00Z', sender_username='Alice'))
         convo2 = Conversation(id=2, participants=[me, user2], last_message=Message(id=2, conversation_id=2, sender_id=100, content_type='file', content='{"url":"/uploads/file.zip", "name":"file.zip"}', created_at='2023-10-27T09:30:00Z', sender_username='Me'))
 
-        self.add_conversation(convo1)
-        self.add_conversation(convo2)
+        self.convo_model.add_conversations([convo1, convo2])
+
+    def load_cached_conversations(self):
+        # Conversations seen in earlier sessions, readable even while offline
+        self.convo_model.add_conversations(self.controller.cached_conversations())
 
     def add_conversation(self, conversation):
-        # Prevent adding duplicates
-        if conversation.id in self.conversations:
-            return
-            
-        self.conversations[conversation.id] = conversation
-        
-        item_widget = ConversationListItem(conversation, self.convo_list_widget)
-        list_item = QListWidgetItem(self.convo_list_widget)
-        list_item.setSizeHint(item_widget.sizeHint())
-        # Store conversation ID in the item for later retrieval
-        list_item.setData(Qt.UserRole, conversation.id)
-        
-        self.convo_list_widget.addItem(list_item)
-        self.convo_list_widget.setItemWidget(list_item, item_widget)
+        # Duplicates are ignored by the model
+        self.convo_model.add_conversations([conversation])
 
-    @Slot(QListWidgetItem)
-    def on_conversation_selected(self, item):
-        conversation_id = item.data(Qt.UserRole)
-        if conversation_id in self.conversations:
-            selected_convo = self.conversations[conversation_id]
+    @Slot(QModelIndex)
+    def on_conversation_selected(self, index):
+        selected_convo = index.data(ConversationListModel.ConversationRole)
+        if selected_convo is not None:
             self.chat_view.set_conversation(selected_convo)
 
+    @Slot(object)
+    def on_last_message_changed(self, conversation_id):
+        message = self.controller.message_store.last_message(conversation_id)
+        if message:
+            self.update_conversation_preview(message)
+
     @Slot(Message)
     def update_conversation_preview(self, message):
-        convo_id = message.conversation_id
-        if convo_id in self.conversations:
-            self.conversations[convo_id].last_message = message
-            
-            # Find the QListWidgetItem and update its widget
-            for i in range(self.convo_list_widget.count()):
-                item = self.convo_list_widget.item(i)
-                if item.data(Qt.UserRole) == convo_id:
-                    item_widget = self.convo_list_widget.itemWidget(item)
-                    # This is a simple update, a better way is to have an update method
-                    # in ConversationListItem
-                    if message.content_type == 'text':
-                        item_widget.last_message_label.setText(message.content)
-                    else:
-                        item_widget.last_message_label.setText(f"Sent a {message.content_type}")
-                    item_widget.time_label.setText(message.display_time)
-                    break
+        # O(log n): the model finds the row by id and moves it to its new place
+        self.convo_model.set_last_message(message.conversation_id, message)
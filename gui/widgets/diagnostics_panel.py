@@ -0,0 +1,104 @@
+# gui/widgets/diagnostics_panel.py
+import json
+import time
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QTableWidgetItem, QHeaderView,
+                               QPushButton, QFileDialog, QMessageBox, QAbstractItemView)
+from PySide6.QtCore import Qt, Slot, QTimer
+from app.metrics import metrics
+
+class DiagnosticsPanel(QDialog):
+    """
+    Live view of app.metrics: one row per metric and label set, with its
+    count, rate since the last refresh and, for histograms, p50/p99/mean.
+    Refreshes once a second while open.
+    """
+    REFRESH_INTERVAL_MS = 1000
+    COLUMNS = ("Metric", "Labels", "Count", "Rate /s", "p50", "p99", "Mean")
+
+    def __init__(self, registry=metrics, parent=None):
+        super().__init__(parent)
+        self.registry = registry
+        self.setWindowTitle("Diagnostics")
+        self.resize(760, 420)
+        self._last_counts = {} # (metric name, label values) -> count at the last refresh
+        self._last_refresh = None
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
+
+        self.save_button = QPushButton("Save Snapshot...")
+        self.save_button.clicked.connect(self.save_snapshot)
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        buttons.addWidget(self.save_button)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.table)
+        layout.addLayout(buttons)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(self.REFRESH_INTERVAL_MS)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.refresh_timer.start()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.refresh_timer.stop()
+
+    def _rows(self):
+        for metric in self.registry.collect():
+            if metric.kind == 'counter':
+                for label_values, value in sorted(metric.samples().items()):
+                    yield metric, label_values, value, None
+            else:
+                for label_values, (counts, total, count) in sorted(metric.samples().items()):
+                    stats = (metric.quantile(counts, 0.5), metric.quantile(counts, 0.99), total / count if count else 0.0)
+                    yield metric, label_values, count, stats
+
+    @Slot()
+    def refresh(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refresh if self._last_refresh is not None else None
+        rows = list(self._rows())
+        self.table.setRowCount(len(rows))
+        counts = {}
+        for row, (metric, label_values, count, stats) in enumerate(rows):
+            key = (metric.name, label_values)
+            counts[key] = count
+            rate = ''
+            if elapsed:
+                rate = f"{(count - self._last_counts.get(key, count)) / elapsed:.1f}"
+            labels = ', '.join(f"{name}={value}" for name, value in zip(metric.labels, label_values))
+            values = [metric.name, labels, str(count), rate]
+            values += [f"{value:.2f}" for value in stats] if stats else ['', '', '']
+            for column, text in enumerate(values):
+                item = QTableWidgetItem(text)
+                if column >= 2:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+        self._last_counts = counts
+        self._last_refresh = now
+
+    @Slot()
+    def save_snapshot(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save Metrics", "deplao-metrics.json",
+                                              "JSON (*.json);;Prometheus text (*.prom)")
+        if not path:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                if path.endswith('.json'):
+                    json.dump(self.registry.to_json(), f, indent=1)
+                else:
+                    f.write(self.registry.to_prometheus())
+        except OSError as e:
+            QMessageBox.warning(self, "Save Failed", f"Could not save metrics: {e}")
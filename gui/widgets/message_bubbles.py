@@ -1,109 +1,270 @@
 # gui/widgets/message_bubbles.py
-from PySide6.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout, QFrame
-from PySide6.QtGui import QPixmap, QPainter, QColor, QBrush, QPen
-from PySide6.QtCore import Qt, QSize
+from PySide6.QtWidgets import QStyledItemDelegate
+from PySide6.QtGui import QPainter, QColor, QFont, QFontMetrics
+from PySide6.QtCore import Qt, QSize, QRect, QRectF, QPoint, QEvent, Signal
+from .message_model import MessageListModel
 
-class BaseBubble(QFrame):
-    """A base class for message bubbles with a rounded rectangle background."""
-    def __init__(self, is_own_message, parent=None):
+BUBBLE_MAX_WIDTH = 400
+BUBBLE_PADDING_H = 10
+BUBBLE_PADDING_V = 8
+BUBBLE_RADIUS = 10
+ROW_MARGIN_H = 10
+ROW_MARGIN_V = 4
+IMAGE_PLACEHOLDER_SIZE = QSize(200, 150)
+FILE_BUTTON_SIZE = QSize(72, 24)
+
+OWN_BUBBLE_COLOR = QColor("#dcf8c6")
+OTHER_BUBBLE_COLOR = QColor("white")
+SYSTEM_BUBBLE_COLOR = QColor("#e1f5fe")
+SYSTEM_TEXT_COLOR = QColor("#555")
+TIME_TEXT_COLOR = QColor("gray")
+FILE_BUTTON_COLOR = QColor("#f0f0f0")
+FILE_PROGRESS_COLOR = QColor("#8bc34a")
+
+def _time_text(message):
+    # Pending messages are replaced by the server's copy, with its time, once confirmed
+    return "Sending..." if message.is_pending else message.display_time
+
+def _derived_font(base, pixel_size=None, bold=False):
+    font = QFont(base)
+    if pixel_size is not None:
+        font.setPixelSize(pixel_size)
+    font.setBold(bold)
+    return font
+
+class MessageBubbleDelegate(QStyledItemDelegate):
+    """
+    Paints chat bubbles for MessageListModel rows directly with QPainter.
+    Nothing is allocated per message besides a cached layout, so only the rows
+    that are actually on screen cost anything.
+    """
+    file_button_clicked = Signal(object) # Message whose download/open button was clicked
+
+    def __init__(self, image_loader=None, download_manager=None, parent=None):
         super().__init__(parent)
-        self.is_own_message = is_own_message
-        self.setContentsMargins(10, 8, 10, 8)
-        
-        # Set style properties for custom painting
-        self.setProperty("is_own", is_own_message)
-        self.setStyleSheet("""
-            QFrame[is_own="true"] {
-                background-color: #dcf8c6;
-                border-radius: 10px;
-            }
-            QFrame[is_own="false"] {
-                background-color: white;
-                border-radius: 10px;
+        self.image_loader = image_loader
+        self.download_manager = download_manager
+        # message id -> (available width, layout dict); one entry per row, replaced when the width changes,
+        # dropped with the row (see forget) and all at once on a model reset
+        self._layout_cache = {}
+        self._fonts_cache = None
+
+    def clear_cache(self):
+        self._layout_cache.clear()
+        self._fonts_cache = None
+
+    def forget(self, message_id):
+        """Drops the layout of a message whose row is gone, e.g. a pending copy replaced by the server's."""
+        self._layout_cache.pop(message_id, None)
+
+    def _fonts(self, option):
+        # sizeHint runs for every row on each relayout, so fonts are derived once
+        # and only rebuilt after clear_cache()
+        fonts = self._fonts_cache
+        if fonts is None:
+            base = QFont(option.font)
+            fonts = self._fonts_cache = {
+                'text': base,
+                'time': _derived_font(base, 9),
+                'name': _derived_font(base, bold=True),
+                'icon': _derived_font(base, 24),
+                'system': _derived_font(base, 10),
             }
-        """)
-
-class TextMessageBubble(BaseBubble):
-    def __init__(self, message, is_own_message, parent=None):
-        super().__init__(is_own_message, parent)
-        
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(0, 0, 0, 0)
-        
-        self.text_label = QLabel(message.content)
-        self.text_label.setWordWrap(True)
-        
-        self.time_label = QLabel(message.display_time)
-        self.time_label.setStyleSheet("color: gray; font-size: 9px;")
-        
-        layout.addWidget(self.text_label)
-        layout.addWidget(self.time_label, 0, Qt.AlignRight)
-        
-        self.setMaximumWidth(400)
-
-class ImageMessageBubble(BaseBubble):
-    def __init__(self, message, is_own_message, parent=None):
-        super().__init__(is_own_message, parent)
-        # In a real app, you'd use http_client to download the image async
-        # For now, we assume it's local or we can construct the URL
-        
-        layout = QVBoxLayout(self)
-        layout.setContentsMargins(0, 0, 0, 0)
-        
-        self.image_label = QLabel("<em>Loading image...</em>")
-        self.image_label.setFixedSize(200, 150) # Placeholder size
-        
-        # TODO: Implement async image loading
-        # For now, we'll just show the name
-        if message.file_info:
-            self.image_label.setText(f"Image: {message.file_info.name}")
-
-        self.time_label = QLabel(message.display_time)
-        self.time_label.setStyleSheet("color: gray; font-size: 9px;")
-
-        layout.addWidget(self.image_label)
-        layout.addWidget(self.time_label, 0, Qt.AlignRight)
-
-class FileMessageBubble(BaseBubble):
-    def __init__(self, message, is_own_message, parent=None):
-        super().__init__(is_own_message, parent)
-        
-        layout = QHBoxLayout(self)
-        
-        # Simple file icon placeholder
-        icon_label = QLabel("📄")
-        icon_label.setStyleSheet("font-size: 24px;")
-        
-        info_layout = QVBoxLayout()
-        info_layout.setSpacing(2)
-        
-        file_name = message.file_info.name if message.file_info else "Unknown File"
-        self.name_label = QLabel(file_name)
-        self.name_label.setStyleSheet("font-weight: bold;")
-        
-        self.time_label = QLabel(message.display_time)
-        self.time_label.setStyleSheet("color: gray; font-size: 9px;")
-        
-        info_layout.addWidget(self.name_label)
-        info_layout.addWidget(self.time_label)
-        
-        layout.addWidget(icon_label)
-        layout.addLayout(info_layout)
-        
-        # TODO: Add a download button and connect it
-
-class SystemMessageBubble(QWidget):
-    def __init__(self, text, parent=None):
-        super().__init__(parent)
-        layout = QHBoxLayout(self)
-        layout.setAlignment(Qt.AlignCenter)
-        
-        self.label = QLabel(text)
-        self.label.setStyleSheet("""
-            background-color: #e1f5fe;
-            color: #555;
-            padding: 4px 8px;
-            border-radius: 10px;
-            font-size: 10px;
-        """)
-        layout.addWidget(self.label)
+        return fonts
+
+    def _layout(self, message, width, fonts):
+        cached = self._layout_cache.get(message.id)
+        if cached is not None and cached[0] == width:
+            return cached[1]
+
+        time_metrics = QFontMetrics(fonts['time'])
+        time_text = _time_text(message)
+        time_size = QSize(time_metrics.horizontalAdvance(time_text), time_metrics.height())
+        max_inner = max(40, min(BUBBLE_MAX_WIDTH, width - 2 * ROW_MARGIN_H) - 2 * BUBBLE_PADDING_H)
+
+        if message.content_type == 'system':
+            metrics = QFontMetrics(fonts['system'])
+            text_rect = metrics.boundingRect(QRect(0, 0, max(40, width - 4 * ROW_MARGIN_H), 100000),
+                                             Qt.TextWordWrap | Qt.AlignCenter, message.content)
+            bubble = QSize(text_rect.width() + 16, text_rect.height() + 8)
+            layout = {'bubble': bubble, 'content': text_rect.size()}
+        elif message.content_type == 'image':
+            file_info = message.file_info
+            if file_info and file_info.width and file_info.height:
+                # The size the thumbnail will have, so the row does not jump when it arrives
+                content = QSize(file_info.width, file_info.height).scaled(IMAGE_PLACEHOLDER_SIZE, Qt.KeepAspectRatio)
+            else:
+                content = QSize(IMAGE_PLACEHOLDER_SIZE)
+            bubble = QSize(max(content.width(), time_size.width()) + 2 * BUBBLE_PADDING_H,
+                           content.height() + time_size.height() + 2 * BUBBLE_PADDING_V)
+            layout = {'bubble': bubble, 'content': content, 'time': time_size}
+        elif message.content_type == 'file':
+            icon_metrics = QFontMetrics(fonts['icon'])
+            name_metrics = QFontMetrics(fonts['name'])
+            icon = QSize(icon_metrics.horizontalAdvance("📄"), icon_metrics.height())
+            name = message.file_info.name if message.file_info else "Unknown File"
+            name_width = min(name_metrics.horizontalAdvance(name) + 2,
+                             max_inner - icon.width() - FILE_BUTTON_SIZE.width() - 16)
+            content = QSize(icon.width() + 8 + max(name_width, time_size.width()) + 8 + FILE_BUTTON_SIZE.width(),
+                            max(icon.height(), FILE_BUTTON_SIZE.height(),
+                                name_metrics.height() + 2 + time_size.height()))
+            bubble = QSize(content.width() + 2 * BUBBLE_PADDING_H, content.height() + 2 * BUBBLE_PADDING_V)
+            layout = {'bubble': bubble, 'content': content, 'icon': icon, 'name': name,
+                      'name_width': name_width, 'time': time_size}
+        else:  # text
+            metrics = QFontMetrics(fonts['text'])
+            text_rect = metrics.boundingRect(QRect(0, 0, max_inner, 100000), Qt.TextWordWrap, message.content)
+            content = QSize(max(text_rect.width(), time_size.width()), text_rect.height())
+            bubble = QSize(content.width() + 2 * BUBBLE_PADDING_H,
+                           content.height() + time_size.height() + 2 * BUBBLE_PADDING_V)
+            layout = {'bubble': bubble, 'content': content, 'time': time_size}
+
+        layout['height'] = layout['bubble'].height() + 2 * ROW_MARGIN_V
+        self._layout_cache[message.id] = (width, layout)
+        return layout
+
+    def sizeHint(self, option, index):
+        message = index.data(MessageListModel.MessageRole)
+        if message is None:
+            return super().sizeHint(option, index)
+        width = option.rect.width()
+        cached = self._layout_cache.get(message.id)
+        layout = cached[1] if cached is not None and cached[0] == width else self._layout(message, width, self._fonts(option))
+        return QSize(width, layout['height'])
+
+    def _bubble_rect(self, row, message, is_own, layout):
+        bubble_size = layout['bubble']
+        if message.content_type == 'system':
+            x = row.left() + (row.width() - bubble_size.width()) // 2
+        elif is_own:
+            x = row.right() - ROW_MARGIN_H - bubble_size.width()
+        else:
+            x = row.left() + ROW_MARGIN_H
+        return QRect(x, row.top() + ROW_MARGIN_V, bubble_size.width(), bubble_size.height())
+
+    def _file_button_rect(self, bubble):
+        inner = bubble.adjusted(BUBBLE_PADDING_H, BUBBLE_PADDING_V, -BUBBLE_PADDING_H, -BUBBLE_PADDING_V)
+        rect = QRect(QPoint(0, 0), FILE_BUTTON_SIZE)
+        rect.moveTopRight(QPoint(inner.right(), inner.center().y() - FILE_BUTTON_SIZE.height() // 2))
+        return rect
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            message = index.data(MessageListModel.MessageRole)
+            if message is not None and message.content_type == 'file':
+                layout = self._layout(message, option.rect.width(), self._fonts(option))
+                bubble = self._bubble_rect(option.rect, message, bool(index.data(MessageListModel.IsOwnRole)), layout)
+                if self._file_button_rect(bubble).contains(event.position().toPoint()):
+                    self.file_button_clicked.emit(message)
+                    return True
+        return super().editorEvent(event, model, option, index)
+
+    def paint(self, painter, option, index):
+        message = index.data(MessageListModel.MessageRole)
+        if message is None:
+            return super().paint(painter, option, index)
+        is_own = bool(index.data(MessageListModel.IsOwnRole))
+        fonts = self._fonts(option)
+        layout = self._layout(message, option.rect.width(), fonts)
+        bubble = self._bubble_rect(option.rect, message, is_own, layout)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(Qt.NoPen)
+
+        if message.content_type == 'system':
+            painter.setBrush(SYSTEM_BUBBLE_COLOR)
+            painter.drawRoundedRect(QRectF(bubble), BUBBLE_RADIUS, BUBBLE_RADIUS)
+            painter.setFont(fonts['system'])
+            painter.setPen(SYSTEM_TEXT_COLOR)
+            painter.drawText(bubble, Qt.TextWordWrap | Qt.AlignCenter, message.content)
+            painter.restore()
+            return
+
+        painter.setBrush(OWN_BUBBLE_COLOR if is_own else OTHER_BUBBLE_COLOR)
+        painter.drawRoundedRect(QRectF(bubble), BUBBLE_RADIUS, BUBBLE_RADIUS)
+        inner = bubble.adjusted(BUBBLE_PADDING_H, BUBBLE_PADDING_V, -BUBBLE_PADDING_H, -BUBBLE_PADDING_V)
+        painter.setPen(option.palette.text().color())
+
+        if message.content_type == 'image':
+            self._paint_image(painter, message, inner, layout, fonts)
+        elif message.content_type == 'file':
+            self._paint_file(painter, message, bubble, layout, fonts)
+        else:
+            painter.setFont(fonts['text'])
+            text_rect = QRect(inner.topLeft(), layout['content'])
+            painter.drawText(text_rect, Qt.TextWordWrap, message.content)
+
+        painter.setFont(fonts['time'])
+        painter.setPen(TIME_TEXT_COLOR)
+        if message.content_type == 'file':
+            time_rect = QRect(inner.left() + layout['icon'].width() + 8, inner.bottom() - layout['time'].height() + 1,
+                              layout['time'].width(), layout['time'].height())
+            painter.drawText(time_rect, Qt.AlignLeft, _time_text(message))
+        else:
+            painter.drawText(inner, Qt.AlignRight | Qt.AlignBottom, _time_text(message))
+        painter.restore()
+
+    def _paint_image(self, painter, message, inner, layout, fonts):
+        content = QRect(inner.topLeft(), layout['content'])
+        url = message.file_info.url if message.file_info else None
+        # Never blocks: a missing thumbnail is requested and the row repainted when it arrives
+        pixmap = self.image_loader.thumbnail(url) if self.image_loader and url else None
+        if pixmap is not None:
+            target = QRect(QPoint(0, 0), pixmap.size() / pixmap.devicePixelRatio())
+            target.moveCenter(content.center())
+            painter.drawPixmap(target, pixmap)
+            return
+        thumbnail = message.file_info.thumbnail if message.file_info else None
+        loader = self.image_loader
+        preview = loader.inline_preview(url, thumbnail) if loader and thumbnail and not loader.has_failed(url) else None
+        if preview is not None:
+            # The tiny inline preview, stretched: a blurred stand-in until the real thumbnail loads
+            painter.save()
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            painter.drawPixmap(content, preview)
+            painter.restore()
+            return
+        painter.setFont(fonts['text'])
+        if not url or (self.image_loader and self.image_loader.has_failed(url)):
+            label = f"Image unavailable: {message.file_info.name if message.file_info else ''}"
+        else:
+            label = "Loading image..."
+        painter.drawText(content, Qt.AlignCenter | Qt.TextWordWrap, label)
+
+    def _paint_file(self, painter, message, bubble, layout, fonts):
+        inner = bubble.adjusted(BUBBLE_PADDING_H, BUBBLE_PADDING_V, -BUBBLE_PADDING_H, -BUBBLE_PADDING_V)
+        icon_rect = QRect(inner.topLeft(), layout['icon'])
+        painter.setFont(fonts['icon'])
+        painter.drawText(icon_rect, Qt.AlignCenter, "📄")
+
+        name_metrics = QFontMetrics(fonts['name'])
+        name_rect = QRect(icon_rect.right() + 8, inner.top(), layout['name_width'], name_metrics.height())
+        painter.setFont(fonts['name'])
+        painter.drawText(name_rect, Qt.AlignLeft,
+                         name_metrics.elidedText(layout['name'], Qt.ElideMiddle, layout['name_width']))
+        self._paint_file_button(painter, message, self._file_button_rect(bubble), fonts)
+
+    def _paint_file_button(self, painter, message, rect, fonts):
+        url = message.file_info.url if message.file_info else None
+        manager = self.download_manager
+        progress = manager.progress(url) if manager and url else None
+        painter.save()
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(FILE_BUTTON_COLOR)
+        painter.drawRoundedRect(QRectF(rect), 4, 4)
+        if progress is not None:
+            received, total = progress
+            if total:
+                painter.setBrush(FILE_PROGRESS_COLOR)
+                filled = QRect(rect.left(), rect.top(), rect.width() * received // total, rect.height())
+                painter.drawRoundedRect(QRectF(filled), 4, 4)
+            label = f"{received * 100 // total}%" if total else "..."
+        elif manager and url and manager.local_path(url, message.file_info.name or ''):
+            label = "Open"
+        else:
+            label = "Download"
+        painter.setPen(TIME_TEXT_COLOR.darker(150))
+        painter.setFont(fonts['time'])
+        painter.drawText(rect, Qt.AlignCenter, label)
+        painter.restore()
@@ -0,0 +1,130 @@
+# gui/widgets/message_model.py
+from PySide6.QtCore import QAbstractListModel, QModelIndex, Qt
+from app.metrics import timed_slot
+from app.models import Message
+
+class MessageListModel(QAbstractListModel):
+    """
+    A list model over one conversation of app.message_store.MessageStore.
+    The rows are a window onto the end of the store's own ordered list, so the
+    model holds no copy and forwards the store's insert and remove
+    notifications to the view, shifted by the window's start.
+
+    QListView lays out every row again on each insert, so the window starts at
+    the newest WINDOW_ROWS messages and only grows, by show_older_rows(), as
+    the user scrolls up. History beyond it stays in the store, unlaid-out.
+    """
+    MessageRole = Qt.UserRole + 1
+    IsOwnRole = Qt.UserRole + 2
+
+    # Rows shown on opening a conversation; several screens' worth
+    WINDOW_ROWS = 100
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.conversation_id = None
+        self.current_user_id = None
+        self._messages = []
+        self._start = 0 # Index in _messages of the first row
+        # Between the store's about-to and done notifications: (new start, 'rows', 'reset' or None)
+        self._change = None
+
+        self.store.messages_about_to_be_inserted.connect(self._on_messages_about_to_be_inserted)
+        self.store.messages_inserted.connect(self._on_messages_inserted)
+        self.store.message_about_to_be_removed.connect(self._on_message_about_to_be_removed)
+        self.store.message_removed.connect(self._on_message_removed)
+
+    def set_conversation(self, conversation_id):
+        self.beginResetModel()
+        self.conversation_id = conversation_id
+        self._messages = self.store.messages(conversation_id)
+        self._start = max(0, len(self._messages) - self.WINDOW_ROWS)
+        self.endResetModel()
+
+    def show_older_rows(self, count=WINDOW_ROWS):
+        """Adds up to count of the store's messages preceding the first row; returns how many."""
+        count = min(count, self._start)
+        if count:
+            self.beginInsertRows(QModelIndex(), 0, count - 1)
+            self._start -= count
+            self.endInsertRows()
+        return count
+
+    def _on_messages_about_to_be_inserted(self, conversation_id, first, last):
+        if conversation_id != self.conversation_id:
+            return
+        count = last - first + 1
+        if first > self._start and count > self.WINDOW_ROWS:
+            # A block bigger than the window (a first page, a long catch-up): show its end only
+            self._change = (len(self._messages) + count - self.WINDOW_ROWS, 'reset')
+            self.beginResetModel()
+        elif first > self._start:
+            # Inside the window, or below it
+            self._change = (self._start, 'rows')
+            self.beginInsertRows(QModelIndex(), first - self._start, last - self._start)
+        elif first == self._start:
+            # Right above the first row: older history. Only top the window up to WINDOW_ROWS;
+            # the rest is shown as the user scrolls up
+            shown = max(0, min(count, self.WINDOW_ROWS - self.rowCount()))
+            self._change = (self._start + count - shown, 'rows' if shown else None)
+            if shown:
+                self.beginInsertRows(QModelIndex(), 0, shown - 1)
+        else:
+            self._change = (self._start + count, None)
+
+    # endInsertRows() is where the view lays out the new rows: the GUI cost of a new message
+    @timed_slot('MessageListModel.messages_inserted')
+    def _on_messages_inserted(self, conversation_id, first, last):
+        if conversation_id != self.conversation_id or self._change is None:
+            return
+        self._start, change = self._change
+        self._change = None
+        if change == 'rows':
+            self.endInsertRows()
+        elif change == 'reset':
+            self.endResetModel()
+
+    def _on_message_about_to_be_removed(self, conversation_id, row):
+        if conversation_id != self.conversation_id:
+            return
+        if row < self._start:
+            self._change = (self._start - 1, None)
+        else:
+            self._change = (self._start, 'rows')
+            self.beginRemoveRows(QModelIndex(), row - self._start, row - self._start)
+
+    def _on_message_removed(self, conversation_id, row):
+        if conversation_id != self.conversation_id or self._change is None:
+            return
+        self._start, change = self._change
+        self._change = None
+        if change == 'rows':
+            self.endRemoveRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._messages) - self._start
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < self.rowCount():
+            return None
+        message = self._messages[self._start + index.row()]
+        if role == self.MessageRole:
+            return message
+        if role == self.IsOwnRole:
+            return message.sender_id == self.current_user_id
+        if role == Qt.DisplayRole:
+            return message.content
+        return None
+
+    def message_at(self, row) -> Message:
+        return self._messages[self._start + row]
+
+    def oldest_server_id(self):
+        """
+        Id of the oldest message that came from the server, shown or not, used
+        as the paging cursor.
+        """
+        return next((m.id for m in self._messages if m.id > 0), None)
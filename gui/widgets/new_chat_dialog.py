@@ -1,10 +1,13 @@
 # gui/widgets/new_chat_dialog.py
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLineEdit, 
                                QPushButton, QListWidget, QListWidgetItem, QLabel)
-from PySide6.QtCore import Slot, Qt
+from PySide6.QtCore import Slot, Qt, QTimer
 from app.models import User
 
 class NewChatDialog(QDialog):
+    # Search once typing pauses for this long (ms)
+    SEARCH_DEBOUNCE_MS = 250
+
     def __init__(self, controller, parent=None):
         super().__init__(parent)
         self.controller = controller
@@ -25,6 +28,10 @@ class NewChatDialog(QDialog):
         
         # Results list
         self.results_list = QListWidget()
+
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DEBOUNCE_MS)
         
         layout.addLayout(search_layout)
         layout.addWidget(QLabel("Search Results:"))
@@ -33,22 +40,26 @@ class NewChatDialog(QDialog):
         # Connect signals
         self.search_button.clicked.connect(self.perform_search)
         self.search_input.returnPressed.connect(self.perform_search)
+        self.search_input.textEdited.connect(self.search_timer.start)
+        self.search_timer.timeout.connect(self.perform_search)
         self.results_list.itemDoubleClicked.connect(self.start_chat)
         
         self.controller.user_search_success.connect(self.populate_results)
         self.controller.user_search_error.connect(self.show_search_error)
 
     def perform_search(self):
-        query = self.search_input.text()
+        self.search_timer.stop()
+        query = self.search_input.text().strip()
+        self.results_list.clear()
         if query:
-            self.search_button.setEnabled(False)
-            self.results_list.clear()
             self.results_list.addItem("Searching...")
+            # May answer synchronously from the cache, replacing the placeholder
             self.controller.search_users(query)
 
-    @Slot(list)
-    def populate_results(self, users):
-        self.search_button.setEnabled(True)
+    @Slot(str, list)
+    def populate_results(self, query, users):
+        if query != self.search_input.text().strip():
+            return # The user has typed on since this search was made
         self.results_list.clear()
         self.users = users
         
@@ -63,7 +74,6 @@ class NewChatDialog(QDialog):
 
     @Slot(str)
     def show_search_error(self, error_msg):
-        self.search_button.setEnabled(True)
         self.results_list.clear()
         self.results_list.addItem(f"Error: {error_msg}")
 
@@ -0,0 +1,59 @@
+# gui/widgets/search_result_item.py
+from PySide6.QtWidgets import QStyledItemDelegate, QStyle
+from PySide6.QtGui import QFont, QFontMetrics
+from PySide6.QtCore import QSize, Qt, QRect
+from app.message_cache import SNIPPET_START, SNIPPET_END
+from ..theme import SELECTED_COLOR, SECONDARY_TEXT_COLOR as HEADER_TEXT_COLOR
+
+ITEM_HEIGHT = 48
+ITEM_MARGIN_H = 10
+
+ResultRole = Qt.UserRole + 1 # (Message, snippet)
+
+class SearchResultDelegate(QStyledItemDelegate):
+    """
+    Paints one message search result: sender and time, then the snippet with
+    the matched terms in bold.
+    """
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), ITEM_HEIGHT)
+
+    def paint(self, painter, option, index):
+        result = index.data(ResultRole)
+        if result is None:
+            return super().paint(painter, option, index)
+        message, snippet = result
+        row = option.rect
+        painter.save()
+        if option.state & (QStyle.State_Selected | QStyle.State_MouseOver):
+            painter.fillRect(row, SELECTED_COLOR)
+
+        left = row.left() + ITEM_MARGIN_H
+        width = row.width() - 2 * ITEM_MARGIN_H
+        half = row.height() // 2
+        small = QFont(option.font)
+        small.setPixelSize(10)
+        painter.setFont(small)
+        painter.setPen(HEADER_TEXT_COLOR)
+        painter.drawText(QRect(left, row.top() + 4, width, half - 4), Qt.AlignLeft | Qt.AlignVCenter,
+                         f"{message.sender_username} · {message.display_time}")
+
+        # Draw the snippet run by run, switching to bold inside the match markers
+        normal = QFont(option.font)
+        bold = QFont(option.font)
+        bold.setBold(True)
+        painter.setPen(option.palette.text().color())
+        x, right = left, left + width
+        baseline = row.top() + half + QFontMetrics(normal).ascent()
+        highlighted = False
+        for part in snippet.replace('\n', ' ').replace(SNIPPET_END, SNIPPET_START).split(SNIPPET_START):
+            font = bold if highlighted else normal
+            metrics = QFontMetrics(font)
+            text = metrics.elidedText(part, Qt.ElideRight, right - x)
+            painter.setFont(font)
+            painter.drawText(x, baseline, text)
+            x += metrics.horizontalAdvance(text)
+            if x >= right or text != part:
+                break
+            highlighted = not highlighted
+        painter.restore()
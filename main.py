@@ -1,6 +1,10 @@
 # main.py
-from gui.main_window import run_app
+import sys
+# Imported first so the startup timeline measures everything after it
+from app.startup import timeline
 
 if __name__ == "__main__":
+    timeline.enable_if_requested(sys.argv)
+    with timeline.phase('import gui.main_window'):
+        from gui.main_window import run_app
     run_app()
-
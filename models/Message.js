@@ -9,6 +9,25 @@ const Message = {
     return result.rows[0];
   },
 
+  // Stores a message sent with a client id at most once. Returns { message, created };
+  // a resend gets the row stored the first time with created false.
+  async createOnce(conversationId, senderId, contentType, content, clientId) {
+    const result = await db.query(
+      `INSERT INTO messages (conversation_id, sender_id, content_type, content, client_id)
+       VALUES ($1, $2, $3, $4, $5)
+       ON CONFLICT (sender_id, client_id) DO NOTHING RETURNING *`,
+      [conversationId, senderId, contentType, content, clientId]
+    );
+    if (result.rows.length) {
+      return { message: result.rows[0], created: true };
+    }
+    const existing = await db.query(
+      'SELECT * FROM messages WHERE sender_id = $1 AND client_id = $2',
+      [senderId, clientId]
+    );
+    return { message: existing.rows[0], created: false };
+  },
+
   async findByConversation(conversationId, limit = 50, offset = 0) {
     const result = await db.query(
       `SELECT m.*, u.username as sender_username FROM messages m
@@ -20,6 +39,30 @@ const Message = {
     );
     return result.rows.reverse();
   },
+
+  async findBefore(conversationId, beforeId, limit = 50) {
+    const result = await db.query(
+      `SELECT m.*, u.username as sender_username FROM messages m
+       JOIN users u ON m.sender_id = u.id
+       WHERE m.conversation_id = $1 AND m.id < $2
+       ORDER BY m.id DESC
+       LIMIT $3`,
+      [conversationId, beforeId, limit]
+    );
+    return result.rows.reverse();
+  },
+
+  async findAfter(conversationId, afterId, limit = 50) {
+    const result = await db.query(
+      `SELECT m.*, u.username as sender_username FROM messages m
+       JOIN users u ON m.sender_id = u.id
+       WHERE m.conversation_id = $1 AND m.id > $2
+       ORDER BY m.id ASC
+       LIMIT $3`,
+      [conversationId, afterId, limit]
+    );
+    return result.rows;
+  },
 };
 
 module.exports = Message;
@@ -0,0 +1,21 @@
+const db = require('../backend_chat/db');
+
+const UploadedFile = {
+  async findByDigest(sha256) {
+    const result = await db.query('SELECT * FROM uploaded_files WHERE sha256 = $1', [sha256]);
+    return result.rows[0];
+  },
+
+  // Registers a stored file under its digest. Returns the row for the digest,
+  // which is the earlier one if another upload of the same content got there first.
+  async create(sha256, filename, size) {
+    const result = await db.query(
+      `INSERT INTO uploaded_files (sha256, filename, size) VALUES ($1, $2, $3)
+       ON CONFLICT (sha256) DO NOTHING RETURNING *`,
+      [sha256, filename, size]
+    );
+    return result.rows[0] || UploadedFile.findByDigest(sha256);
+  },
+};
+
+module.exports = UploadedFile;
@@ -22,9 +22,11 @@ const User = {
   },
 
   async searchByUsername(query, currentUserId) {
+    // A literal substring match, as the client's cached narrowing assumes: % and _ in the query are not wildcards
+    const pattern = query.replace(/[\\%_]/g, '\\$&');
     const result = await db.query(
-      'SELECT id, username FROM users WHERE username ILIKE $1 AND id != $2 LIMIT 10',
-      [`%${query}%`, currentUserId]
+      "SELECT id, username FROM users WHERE username ILIKE $1 ESCAPE '\\' AND id != $2 LIMIT 10",
+      [`%${pattern}%`, currentUserId]
     );
     return result.rows;
   },
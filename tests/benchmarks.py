@@ -0,0 +1,294 @@
+# tests/benchmarks.py
+"""
+Headless benchmarks for the chat hot paths: the message history path
+through ChatView, the conversation list in Dashboard, and Message decoding.
+
+    python tests/benchmarks.py                      # run, compare with the stored baseline
+    python tests/benchmarks.py --output out.json    # also write the results
+    python tests/benchmarks.py --save-baseline      # store the results as the new baseline
+
+Results are JSON ({"meta": ..., "results": {name: {"unit", "value", "runs"}}}).
+Every value is lower-is-better; a value more than --tolerance above the
+baseline is reported as a regression and makes the run exit with status 1.
+Timings depend on the machine, so the baseline should be regenerated
+when the reference machine changes.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+# Keep the benchmarks away from the real per-user data and cache directories
+os.environ.setdefault('DEPLAO_DATA_DIR', tempfile.mkdtemp(prefix='deplao-bench-data-'))
+os.environ.setdefault('DEPLAO_CACHE_DIR', tempfile.mkdtemp(prefix='deplao-bench-cache-'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PySide6
+from PySide6.QtWidgets import QApplication
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+DEFAULT_TOLERANCE = 0.25 # A value 25% above its baseline is a regression
+
+HISTORY_SIZES = (1000, 10000, 50000)
+CONVERSATION_COUNT = 5000
+DECODE_COUNT = 50000
+# --quick: small sizes so the suite itself can be exercised in a few seconds
+QUICK_HISTORY_SIZES = (100,)
+QUICK_CONVERSATION_COUNT = 100
+QUICK_DECODE_COUNT = 1000
+
+def _application():
+    app = QApplication.instance()
+    if app is None:
+        from gui.theme import apply_theme
+        app = QApplication([])
+        apply_theme(app) # As run_app does, so styling costs are measured too
+    return app
+
+def _label(count):
+    return f"{count // 1000}k" if count >= 1000 and count % 1000 == 0 else str(count)
+
+def _result(unit, runs):
+    # The fastest run is the least disturbed by the rest of the machine
+    return {'unit': unit, 'value': round(min(runs), 4), 'median': round(statistics.median(runs), 4),
+            'runs': [round(run, 4) for run in runs]}
+
+def message_rows(count, conversation_id=1, first_id=1, seed=0):
+    """Message dicts as the backend sends them: mostly text, some images and files."""
+    rng = random.Random(seed)
+    words = ['hello', 'how', 'are', 'you', 'meeting', 'tomorrow', 'sounds', 'good', 'ok', 'see', 'the', 'file']
+    base = 1_700_000_000
+    rows = []
+    for offset in range(count):
+        message_id = first_id + offset
+        kind = offset % 20
+        if kind == 0:
+            content_type = 'image'
+            content = json.dumps({'url': f'/uploads/{message_id}.jpg', 'name': f'{message_id}.jpg', 'type': 'image/jpeg'})
+        elif kind == 1:
+            content_type = 'file'
+            content = json.dumps({'url': f'/uploads/{message_id}.pdf', 'name': f'report-{message_id}.pdf',
+                                  'type': 'application/pdf'})
+        else:
+            content_type = 'text'
+            content = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 40)))
+        created = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(base + message_id * 7))
+        rows.append({
+            'id': message_id,
+            'conversation_id': conversation_id,
+            'sender_id': 1 + offset % 2,
+            'content_type': content_type,
+            'content': content,
+            'created_at': f'{created}.000Z',
+            'sender_username': 'me' if offset % 2 == 0 else 'alice',
+        })
+    return rows
+
+def _controller():
+    from app.chat_controller import ChatController
+    from app.models import User
+    controller = ChatController()
+    # Logged in without a server: no cache, and history requests go nowhere
+    controller.current_user = User(id=1, username='me')
+    controller.http_client.get_message_history = lambda *args, **kwargs: None
+    return controller
+
+def bench_display_history(sizes, repeats=3):
+    """
+    A history page arriving in the open conversation until it is painted:
+    ChatController.on_history_loaded (store insert, model rows, view layout),
+    ChatView.display_history and a synchronous repaint of the message list.
+    """
+    from app.models import Conversation, User, decode_messages
+    from gui.widgets.chat_view import ChatView
+    app = _application()
+    controller = _controller()
+    view = ChatView(controller)
+    view.resize(600, 800)
+    view.show()
+    app.processEvents()
+    results = {}
+    next_id = 1
+    for conversation_id, size in enumerate(sizes, start=1000):
+        runs = []
+        for repeat in range(repeats):
+            # A fresh conversation and fresh ids each run: the store ignores messages it already has
+            run_conversation = conversation_id * 100 + repeat
+            messages = decode_messages(message_rows(size, run_conversation, next_id))
+            next_id += size
+            view.set_conversation(Conversation(run_conversation, [controller.current_user, User(2, 'alice')]))
+            app.processEvents()
+            gc.collect()
+            start = time.perf_counter()
+            controller.on_history_loaded(run_conversation, {}, messages)
+            view.message_list.viewport().repaint()
+            runs.append((time.perf_counter() - start) * 1000)
+        results[f'chat_view.display_history.{_label(size)}'] = _result('ms', runs)
+    view.close()
+    return results
+
+def bench_conversation_list(count, repeats=3):
+    """Dashboard.add_conversation for count conversations, then as many update_conversation_preview calls."""
+    from app.models import Conversation, Message, User
+    from gui.widgets.dashboard import Dashboard
+    app = _application()
+    controller = _controller()
+    me = controller.current_user
+    add_runs, update_runs = [], []
+    for repeat in range(repeats):
+        rng = random.Random(repeat)
+        dashboard = Dashboard(controller)
+        dashboard.resize(800, 600)
+        dashboard.show()
+        app.processEvents()
+        conversations = []
+        for index in range(count):
+            conversation_id = 10_000 + index
+            last = Message(index + 1, conversation_id, 2, 'text', f'message {index}',
+                           1_700_000_000_000 + rng.randrange(10**9), 'alice')
+            conversations.append(Conversation(conversation_id, [me, User(100 + index, f'user{index}')], last))
+        updates = [Message(count + index + 1, rng.choice(conversations).id, 2, 'text', f'reply {index}',
+                           1_800_000_000_000 + index, 'alice') for index in range(count)]
+        gc.collect()
+
+        start = time.perf_counter()
+        for conversation in conversations:
+            dashboard.add_conversation(conversation)
+        dashboard.convo_list_view.viewport().repaint()
+        add_runs.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        for message in updates:
+            dashboard.update_conversation_preview(message)
+        dashboard.convo_list_view.viewport().repaint()
+        update_runs.append((time.perf_counter() - start) * 1000)
+        dashboard.close()
+        dashboard.deleteLater()
+        app.processEvents()
+    label = _label(count)
+    return {
+        f'dashboard.add_conversation.{label}': _result('ms', add_runs),
+        f'dashboard.update_conversation_preview.{label}': _result('ms', update_runs),
+    }
+
+def bench_message_decoding(count, repeats=5):
+    """decode_messages() over a history page of count rows: time per message and memory held per message."""
+    from app.models import decode_messages
+    rows = message_rows(count)
+    runs = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        decode_messages(rows)
+        runs.append((time.perf_counter() - start) * 1e6 / count)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    messages = decode_messages(rows)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del messages
+    return {
+        'models.decode_messages.us_per_message': _result('us', runs),
+        'models.message_memory.bytes_per_message': _result('bytes', [held / count]),
+    }
+
+def run_suite(quick=False):
+    _application()
+    results = {}
+    results.update(bench_display_history(QUICK_HISTORY_SIZES if quick else HISTORY_SIZES,
+                                         repeats=1 if quick else 3))
+    results.update(bench_conversation_list(QUICK_CONVERSATION_COUNT if quick else CONVERSATION_COUNT,
+                                           repeats=1 if quick else 3))
+    results.update(bench_message_decoding(QUICK_DECODE_COUNT if quick else DECODE_COUNT,
+                                          repeats=1 if quick else 5))
+    return {
+        'meta': {
+            'timestamp': time.time(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'pyside': PySide6.__version__,
+            'quick': quick,
+        },
+        'results': results,
+    }
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Rows of (name, baseline value, current value, ratio, status), where status
+    is 'ok', 'regression', 'improved', 'new' or 'missing'.
+    """
+    rows = []
+    current_results = current['results']
+    baseline_results = baseline.get('results', {})
+    # Suite order, then anything only the baseline has
+    names = list(current_results) + [name for name in baseline_results if name not in current_results]
+    for name in names:
+        if name not in baseline_results:
+            rows.append((name, None, current_results[name]['value'], None, 'new'))
+            continue
+        if name not in current_results:
+            rows.append((name, baseline_results[name]['value'], None, None, 'missing'))
+            continue
+        old, new = baseline_results[name]['value'], current_results[name]['value']
+        ratio = new / old if old else float('inf')
+        if ratio > 1 + tolerance:
+            status = 'regression'
+        elif ratio < 1 / (1 + tolerance):
+            status = 'improved'
+        else:
+            status = 'ok'
+        rows.append((name, old, new, ratio, status))
+    return rows
+
+def _format_value(value):
+    return '-' if value is None else f'{value:.3f}'
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--quick', action='store_true', help='small sizes, one run each')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='allowed slowdown before a result counts as a regression (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    current = run_suite(quick=args.quick)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=1)
+            f.write('\n')
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('quick') != args.quick:
+            baseline = None # Different sizes; nothing to compare
+
+    if baseline is None:
+        for name, result in current['results'].items():
+            print(f"{name:55} {result['value']:12.3f} {result['unit']}")
+        return 0
+    rows = compare(current, baseline, args.tolerance)
+    print(f"{'benchmark':55} {'baseline':>12} {'current':>12} {'ratio':>7}  status")
+    for name, old, new, ratio, status in rows:
+        ratio_text = '-' if ratio is None else f'{ratio:.2f}'
+        print(f"{name:55} {_format_value(old):>12} {_format_value(new):>12} {ratio_text:>7}  {status}")
+    return 1 if any(row[4] == 'regression' for row in rows) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,336 @@
+# tests/load_harness.py
+"""
+Load harness: runs many headless ChatController instances against a backend
+and reports the latencies and throughput the clients observe.
+
+    python tests/load_harness.py --clients 40 --processes 14 --duration 60
+    python tests/load_harness.py --server http://chat-staging:3000 --rate 2
+
+Clients are spread over --processes worker processes, each with its own Qt
+event loop. The clients of one process share its network loop, scheduler
+lanes and connection pool, as the windows of one app would; so that the
+latencies are the server's and not queueing in those lanes, a process runs
+at most as many clients as the smallest lane has slots
+(CLIENTS_PER_PROCESS), and more processes are started when --processes
+is too low for --clients. Every client registers and logs in as a fresh user, opens its
+socket and then, paired with another client in its process, sends --rate
+messages a second. Every --history-every sends it fetches the latest
+history page and every --upload-every sends it uploads a --upload-size file
+and sends it as a file message. Without --server an in-memory stand-in
+(tests/load_server.py) is started in this process.
+
+Reported per operation: count, errors, p50/p99/max latency in ms and
+throughput over the measured window (after --warmup):
+- login: login request until login_success (includes the socket connect)
+- send_echo: send_message until the server confirms it (ack or echo)
+- delivery: message:send until the partner receives it (wall clock, so
+  valid across processes on one machine)
+- history: history page request until it is decoded
+- upload: resumable upload of one file until it is confirmed
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OPERATIONS = ('login', 'send_echo', 'delivery', 'history', 'upload')
+# How long a worker waits after the run for echoes and uploads still in flight (seconds)
+DRAIN_TIME = 3.0
+LOGIN_TIMEOUT = 30.0
+
+def clients_per_process():
+    """The most clients one worker runs: each can have a request in every lane at once."""
+    sys.path.insert(0, REPO_ROOT)
+    from app.scheduler import NetworkScheduler
+    return min(NetworkScheduler.API_LIMIT, NetworkScheduler.MEDIA_LIMIT, NetworkScheduler.BULK_LIMIT)
+
+def percentile(sorted_samples, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(len(sorted_samples) - 1, max(0, round(q * len(sorted_samples) + 0.5) - 1))]
+
+def run_worker(worker_index, client_count, options, result_queue):
+    """Entry point of a worker process: runs client_count clients and puts their samples on result_queue."""
+    # Configure the app before it is imported: server, headless Qt, throwaway data directories
+    os.environ['DEPLAO_SERVER_URL'] = options['server']
+    os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+    os.environ['DEPLAO_DATA_DIR'] = tempfile.mkdtemp(prefix=f'deplao-load-{worker_index}-')
+    os.environ['DEPLAO_CACHE_DIR'] = os.path.join(os.environ['DEPLAO_DATA_DIR'], 'cache')
+    sys.path.insert(0, REPO_ROOT)
+    from PySide6.QtCore import QCoreApplication, QObject, QTimer, Slot
+
+    from app.chat_controller import ChatController
+
+    class LoadClient(QObject):
+        """One simulated user driving a ChatController."""
+        def __init__(self, name, stats, rng):
+            super().__init__()
+            self.name = name
+            self.stats = stats
+            self.rng = rng
+            self.controller = ChatController()
+            self.user_id = None
+            self.partner = None
+            self.conversation_id = None
+            self.sent = 0
+            self._login_started = None
+            self._sends = {} # content -> perf_counter at send
+            self._history_started = {} # conversation id -> perf_counter at request
+            self._uploads = {} # upload key -> perf_counter at start
+            self.send_timer = QTimer(self)
+            self.send_timer.timeout.connect(self.send_next)
+
+            controller = self.controller
+            controller.register_success.connect(self.login)
+            controller.register_error.connect(self.login) # Already registered by an earlier run
+            controller.login_success.connect(self.on_login_success)
+            controller.login_error.connect(lambda error: self.stats.error('login'))
+            controller.new_messages_received.connect(self.on_messages)
+            controller.message_confirmed.connect(self.on_message_confirmed)
+            controller.http_client.history_success.connect(self.on_history)
+            controller.history_load_error.connect(lambda error: self.stats.error('history'))
+            controller.upload_complete.connect(self.on_upload_complete)
+            controller.upload_failed.connect(self.on_upload_failed)
+
+        def start(self):
+            self.controller.register(self.name, 'load-test')
+
+        @Slot()
+        def login(self, *args):
+            self._login_started = time.perf_counter()
+            self.controller.login(self.name, 'load-test')
+
+        @Slot(dict)
+        def on_login_success(self, user_info):
+            self.stats.sample('login', self._login_started)
+            self.user_id = user_info['id']
+
+        def begin_sending(self, rate):
+            interval = max(1, int(1000 / rate))
+            # Spread the clients over the interval instead of sending in lockstep
+            QTimer.singleShot(self.rng.randrange(interval), lambda: self.send_timer.start(interval))
+
+        def stop(self):
+            self.send_timer.stop()
+
+        @Slot()
+        def send_next(self):
+            self.sent += 1
+            content = f"load {self.name} {self.sent} {time.time():.6f}"
+            self._sends[content] = time.perf_counter()
+            self.controller.send_message(self.partner.user_id, content)
+            if self.conversation_id is not None and self.sent % options['history_every'] == 0:
+                self._history_started[self.conversation_id] = time.perf_counter()
+                self.controller.http_client.get_message_history(self.conversation_id)
+            if options['upload_every'] and self.sent % options['upload_every'] == 0:
+                # Content of its own, or the client would skip the transfer as already uploaded
+                upload_path = os.path.join(options['upload_dir'], f"{self.name}-{self.sent}.bin")
+                with open(options['upload_path'], 'rb') as source, open(upload_path, 'wb') as f:
+                    f.write(f"{options['run_id']} {self.name} {self.sent}\n".encode())
+                    f.write(source.read())
+                self._uploads[self.controller.send_file(self.partner.user_id, upload_path)] = time.perf_counter()
+
+        @Slot(object, object)
+        def on_message_confirmed(self, pending, message):
+            self.conversation_id = message.conversation_id
+            started = self._sends.pop(message.content, None)
+            if started is not None:
+                self.stats.sample('send_echo', started)
+
+        @Slot(list)
+        def on_messages(self, messages):
+            now_wall = time.time()
+            for message in messages:
+                if message.sender_id != self.user_id and message.content.startswith('load '):
+                    sent_at = float(message.content.rsplit(' ', 1)[1])
+                    self.stats.record('delivery', sent_at, (now_wall - sent_at) * 1000, wall=True)
+
+        @Slot(object, dict, list)
+        def on_history(self, conversation_id, cursor, messages):
+            started = self._history_started.pop(conversation_id, None)
+            if started is not None:
+                self.stats.sample('history', started)
+
+        @Slot(str, dict)
+        def on_upload_complete(self, upload_key, upload_result):
+            started = self._uploads.pop(upload_key, None)
+            if started is not None:
+                self.stats.sample('upload', started)
+                self.controller.send_file_message(self.partner.user_id, upload_result)
+
+        @Slot(str, str)
+        def on_upload_failed(self, upload_key, error_msg):
+            if self._uploads.pop(upload_key, None) is not None:
+                self.stats.error('upload')
+
+    class Stats:
+        """Latency samples (ms) per operation, keeping only those started inside the measured window."""
+        def __init__(self, measure_from):
+            self.measure_from = measure_from # perf_counter
+            self.measure_from_wall = time.time() + (measure_from - time.perf_counter())
+            self.samples = {operation: [] for operation in OPERATIONS}
+            self.errors = {operation: 0 for operation in OPERATIONS}
+
+        def sample(self, operation, started):
+            self.record(operation, started, (time.perf_counter() - started) * 1000)
+
+        def record(self, operation, started, latency_ms, wall=False):
+            # Logins happen before the window opens and are always kept
+            if operation == 'login' or started >= (self.measure_from_wall if wall else self.measure_from):
+                self.samples[operation].append(latency_ms)
+
+        def error(self, operation):
+            self.errors[operation] += 1
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    rng = random.Random(options['seed'] + worker_index)
+    run_start = time.perf_counter()
+    stats = Stats(run_start + LOGIN_TIMEOUT + options['warmup']) # Moved once everyone is logged in
+    clients = [LoadClient(f"load{options['run_id']}_{worker_index}_{index}", stats, rng) for index in range(client_count)]
+    for index, client in enumerate(clients):
+        # Pairs talk to each other; an odd client out talks to the first one
+        client.partner = clients[index ^ 1] if index ^ 1 < len(clients) else clients[0]
+
+    def finish():
+        for client in clients:
+            client.stop()
+        QTimer.singleShot(int(DRAIN_TIME * 1000), app.quit)
+
+    def wait_for_logins():
+        if all(client.user_id is not None for client in clients):
+            stats.measure_from = time.perf_counter() + options['warmup']
+            stats.measure_from_wall = time.time() + options['warmup']
+            for client in clients:
+                client.begin_sending(options['rate'])
+            QTimer.singleShot(int((options['warmup'] + options['duration']) * 1000), finish)
+        elif time.perf_counter() - run_start > LOGIN_TIMEOUT:
+            result_queue.put({'worker': worker_index, 'failed': 'not every client could log in'})
+            app.quit()
+        else:
+            QTimer.singleShot(50, wait_for_logins)
+
+    for client in clients:
+        client.start()
+    QTimer.singleShot(50, wait_for_logins)
+    app.exec()
+    for client in clients:
+        client.controller.shutdown()
+    result_queue.put({'worker': worker_index, 'samples': stats.samples, 'errors': stats.errors,
+                      'sent': sum(client.sent for client in clients)})
+
+def summarize(worker_results, duration):
+    summary = {}
+    for operation in OPERATIONS:
+        samples = sorted(sample for result in worker_results for sample in result['samples'][operation])
+        errors = sum(result['errors'][operation] for result in worker_results)
+        summary[operation] = {
+            'count': len(samples),
+            'errors': errors,
+            'p50_ms': round(percentile(samples, 0.50), 2),
+            'p99_ms': round(percentile(samples, 0.99), 2),
+            'max_ms': round(samples[-1], 2) if samples else 0.0,
+            # Logins all happen up front, so a rate over the run would mean nothing
+            'per_second': None if operation == 'login' else round(len(samples) / duration, 2),
+        }
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Drive headless chat clients against a backend.')
+    parser.add_argument('--server', help='backend URL; an in-memory stand-in is started when omitted')
+    parser.add_argument('--clients', type=int, default=10, help='clients in total')
+    parser.add_argument('--processes', type=int, default=4,
+                        help='worker processes to spread the clients over; raised if they would exceed '
+                             'the clients one process runs')
+    parser.add_argument('--rate', type=float, default=1.0, help='messages per second per client')
+    parser.add_argument('--duration', type=float, default=20.0, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds of load before measuring')
+    parser.add_argument('--history-every', type=int, default=10, help='fetch a history page every N sends')
+    parser.add_argument('--upload-every', type=int, default=25, help='upload a file every N sends (0: never)')
+    parser.add_argument('--upload-size', type=int, default=256 * 1024, help='bytes per uploaded file')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the summary as JSON to this file')
+    args = parser.parse_args(argv)
+
+    httpd = None
+    server = args.server
+    if not server:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from load_server import start_server
+        httpd, server = start_server()
+
+    upload_dir = tempfile.mkdtemp(prefix='deplao-load-upload-')
+    upload_path = os.path.join(upload_dir, 'payload.bin')
+    with open(upload_path, 'wb') as f:
+        f.write(os.urandom(args.upload_size))
+
+    options = {
+        'server': server.rstrip('/'),
+        'rate': args.rate,
+        'duration': args.duration,
+        'warmup': args.warmup,
+        'history_every': max(1, args.history_every),
+        'upload_every': args.upload_every,
+        'upload_dir': upload_dir,
+        'upload_path': upload_path,
+        'seed': args.seed,
+        'run_id': f"{int(time.time()) % 100000}{random.randrange(100)}",
+    }
+    processes = max(1, min(args.processes, args.clients), -(-args.clients // clients_per_process()))
+    if processes > args.processes:
+        print(f"Using {processes} processes: one runs at most {clients_per_process()} clients", file=sys.stderr)
+    per_process = [args.clients // processes + (1 if index < args.clients % processes else 0)
+                   for index in range(processes)]
+
+    # spawn: Qt and the socket threads do not survive fork()
+    context = multiprocessing.get_context('spawn')
+    result_queue = context.Queue()
+    workers = [context.Process(target=run_worker, args=(index, count, options, result_queue))
+               for index, count in enumerate(per_process)]
+    print(f"{args.clients} clients in {processes} processes against {server}, "
+          f"{args.rate:g} msg/s each for {args.duration:g}s (+{args.warmup:g}s warmup)", file=sys.stderr)
+    for worker in workers:
+        worker.start()
+    timeout = LOGIN_TIMEOUT + args.warmup + args.duration + DRAIN_TIME + 30
+    results = []
+    try:
+        for _ in workers:
+            results.append(result_queue.get(timeout=timeout))
+    finally:
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        if httpd is not None:
+            httpd.shutdown()
+
+    failed = [result for result in results if 'failed' in result]
+    for result in failed:
+        print(f"worker {result['worker']}: {result['failed']}", file=sys.stderr)
+    completed = [result for result in results if 'failed' not in result]
+    summary = {
+        'clients': args.clients,
+        'processes': processes,
+        'rate': args.rate,
+        'duration': args.duration,
+        'server': server,
+        'sent': sum(result['sent'] for result in completed),
+        'operations': summarize(completed, args.duration),
+    }
+    print(f"{'operation':10} {'count':>8} {'errors':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'per s':>8}")
+    for operation, row in summary['operations'].items():
+        per_second = '-' if row['per_second'] is None else f"{row['per_second']:.1f}"
+        print(f"{operation:10} {row['count']:8} {row['errors']:7} {row['p50_ms']:9.1f} {row['p99_ms']:9.1f} "
+              f"{row['max_ms']:9.1f} {per_second:>8}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=1)
+    return 1 if failed or not completed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,334 @@
+# tests/load_server.py
+"""
+In-memory stand-in for the Node backend, for running tests/load_harness.py on a
+machine without PostgreSQL. It speaks the same REST and Socket.IO protocol
+(auth, history paging, user search, resumable uploads, message:send,
+file:send and message:send-batch with acks and client-id dedupe, typing) but
+keeps everything in memory and discards upload data.
+
+Without a websocket-capable WSGI server installed, Socket.IO runs over long
+polling here, so use it to exercise the harness and the client side; size the
+backend against the real Node server.
+
+    python tests/load_server.py --port 3001
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import re
+import secrets
+import threading
+from datetime import datetime, timezone
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+import socketio
+
+HISTORY_LIMIT = 50
+SEARCH_LIMIT = 10
+MAX_THUMBNAIL_LENGTH = 8192 # As the Node backend
+
+def image_preview(data):
+    """The optional size and inline preview of a prepared image, validated as the Node backend does."""
+    preview = {}
+    width, height, thumbnail = data.get('width'), data.get('height'), data.get('thumbnail')
+    if isinstance(width, int) and width > 0 and isinstance(height, int) and height > 0:
+        preview.update(width=width, height=height)
+    if isinstance(thumbnail, str) and len(thumbnail) <= MAX_THUMBNAIL_LENGTH:
+        preview['thumbnail'] = thumbnail
+    return preview
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+class LoadServer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = {} # username -> {'id', 'username', 'password'}
+        self.tokens = {} # token -> user
+        self.conversations = {} # frozenset of the two user ids -> conversation id
+        self.messages = {} # conversation id -> [message rows], ascending id
+        self.client_messages = {} # (sender id, client id) -> message row, so resends are stored once
+        self.uploads = {} # upload id -> {'user_id', 'fileName', 'fileType', 'size', 'offset', 'sha256'}
+        self.files = {} # SHA-256 of a completed upload -> its file URL
+        self._user_ids = itertools.count(1)
+        self._conversation_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self.socket_users = {} # sid -> user
+        self.user_sids = {} # user id -> sid
+
+        self.sio = socketio.Server(async_mode='threading', transports=['polling'], cors_allowed_origins='*')
+        self.sio.on('connect', self.on_connect)
+        self.sio.on('disconnect', self.on_disconnect)
+        self.sio.on('message:send', self.on_message_send)
+        self.sio.on('file:send', self.on_file_send)
+        self.sio.on('message:send-batch', self.on_message_send_batch)
+        self.sio.on('typing', self.on_typing)
+        self.app = socketio.WSGIApp(self.sio, self.rest_app)
+        self.routes = [
+            ('POST', re.compile(r'^/api/auth/register$'), self.register),
+            ('POST', re.compile(r'^/api/auth/login$'), self.login),
+            ('GET', re.compile(r'^/api/chat/(\d+)/messages$'), self.history),
+            ('GET', re.compile(r'^/api/users/search$'), self.search_users),
+            ('POST', re.compile(r'^/api/upload/by-digest$'), self.find_upload),
+            ('POST', re.compile(r'^/api/upload/sessions$'), self.create_upload),
+            ('GET', re.compile(r'^/api/upload/sessions/(\w+)$'), self.upload_status),
+            ('PUT', re.compile(r'^/api/upload/sessions/(\w+)$'), self.upload_chunk),
+            ('POST', re.compile(r'^/api/upload/sessions/(\w+)/complete$'), self.complete_upload),
+            ('DELETE', re.compile(r'^/api/upload/sessions/(\w+)$'), self.cancel_upload),
+        ]
+
+    # --- WSGI plumbing ---
+
+    def rest_app(self, environ, start_response):
+        method, path = environ['REQUEST_METHOD'], environ.get('PATH_INFO', '')
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(path)
+            if match and route_method == method:
+                status, body = handler(environ, *match.groups())
+                break
+        else:
+            status, body = 404, {'message': 'Not found.'}
+        payload = b'' if body is None else json.dumps(body).encode()
+        start_response(f'{status} {"OK" if status < 400 else "Error"}',
+                       [('Content-Type', 'application/json'), ('Content-Length', str(len(payload)))])
+        return [payload]
+
+    @staticmethod
+    def _body(environ):
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        return environ['wsgi.input'].read(length) if length else b''
+
+    def _json(self, environ):
+        try:
+            return json.loads(self._body(environ) or b'{}')
+        except ValueError:
+            return {}
+
+    def _user(self, environ):
+        token = environ.get('HTTP_AUTHORIZATION', '').removeprefix('Bearer ')
+        return self.tokens.get(token)
+
+    # --- REST ---
+
+    def register(self, environ):
+        data = self._json(environ)
+        username, password = data.get('username'), data.get('password')
+        if not username or not password:
+            return 400, {'message': 'Username and password are required.'}
+        with self.lock:
+            if username in self.users:
+                return 409, {'message': 'Username already exists.'}
+            user = self.users[username] = {'id': next(self._user_ids), 'username': username, 'password': password}
+        return 201, {'message': 'User created successfully.', 'user': {'id': user['id'], 'username': username}}
+
+    def login(self, environ):
+        data = self._json(environ)
+        user = self.users.get(data.get('username'))
+        if user is None or user['password'] != data.get('password'):
+            return 401, {'message': 'Invalid credentials.'}
+        token = secrets.token_hex(16)
+        self.tokens[token] = user
+        return 200, {'token': token, 'user': {'id': user['id'], 'username': user['username']}}
+
+    def history(self, environ, conversation_id):
+        if self._user(environ) is None:
+            return 401, {'message': 'Unauthorized.'}
+        query = {key: values[0] for key, values in parse_qs(environ.get('QUERY_STRING', '')).items()}
+        limit = int(query.get('limit', HISTORY_LIMIT))
+        with self.lock:
+            rows = self.messages.get(int(conversation_id), [])
+            if 'after' in query:
+                after = int(query['after'])
+                page = [row for row in rows if row['id'] > after][:limit]
+            else:
+                before = int(query['before']) if 'before' in query else None
+                page = [row for row in rows if before is None or row['id'] < before][-limit:]
+        return 200, page
+
+    def search_users(self, environ):
+        user = self._user(environ)
+        if user is None:
+            return 401, {'message': 'Unauthorized.'}
+        q = parse_qs(environ.get('QUERY_STRING', '')).get('q', [''])[0].lower()
+        if not q:
+            return 400, {'message': 'Search query (q) is required.'}
+        matches = [{'id': other['id'], 'username': other['username']} for other in list(self.users.values())
+                   if q in other['username'].lower() and other['id'] != user['id']]
+        return 200, matches[:SEARCH_LIMIT]
+
+    def create_upload(self, environ):
+        user = self._user(environ)
+        if user is None:
+            return 401, {'message': 'Unauthorized.'}
+        data = self._json(environ)
+        if not data.get('fileName') or not isinstance(data.get('size'), int) or data['size'] < 0:
+            return 400, {'message': 'fileName and size are required.'}
+        upload_id = secrets.token_hex(16)
+        self.uploads[upload_id] = {'user_id': user['id'], 'fileName': data['fileName'],
+                                   'fileType': data.get('fileType') or 'application/octet-stream',
+                                   'size': data['size'], 'offset': 0, 'sha256': hashlib.sha256()}
+        return 201, {'uploadId': upload_id, 'offset': 0}
+
+    def _upload(self, environ, upload_id):
+        user = self._user(environ)
+        upload = self.uploads.get(upload_id)
+        if user is None or upload is None or upload['user_id'] != user['id']:
+            return None
+        return upload
+
+    def upload_status(self, environ, upload_id):
+        upload = self._upload(environ, upload_id)
+        if upload is None:
+            return 404, {'message': 'Upload session not found.'}
+        return 200, {'uploadId': upload_id, 'offset': upload['offset'], 'size': upload['size']}
+
+    def upload_chunk(self, environ, upload_id):
+        upload = self._upload(environ, upload_id)
+        if upload is None:
+            return 404, {'message': 'Upload session not found.'}
+        if int(environ.get('HTTP_UPLOAD_OFFSET', -1)) != upload['offset']:
+            return 409, {'message': 'Offset mismatch.', 'offset': upload['offset']}
+        chunk = self._body(environ)
+        if upload['offset'] + len(chunk) > upload['size']:
+            return 400, {'message': 'Invalid chunk.', 'offset': upload['offset']}
+        upload['offset'] += len(chunk) # The data itself is not kept, only hashed
+        upload['sha256'].update(chunk)
+        return 200, {'offset': upload['offset']}
+
+    def complete_upload(self, environ, upload_id):
+        upload = self._upload(environ, upload_id)
+        if upload is None:
+            return 404, {'message': 'Upload session not found.'}
+        if upload['offset'] != upload['size']:
+            return 409, {'message': 'Upload is incomplete.', 'offset': upload['offset']}
+        del self.uploads[upload_id]
+        file_url = self.files.setdefault(upload['sha256'].hexdigest(), f'/uploads/{upload_id}-{upload["fileName"]}')
+        return 201, {'message': 'File uploaded successfully.', 'fileUrl': file_url,
+                     'fileName': upload['fileName'], 'fileType': upload['fileType']}
+
+    def find_upload(self, environ):
+        if self._user(environ) is None:
+            return 401, {'message': 'Unauthorized.'}
+        data = self._json(environ)
+        file_url = self.files.get(data.get('sha256'))
+        if file_url is None or not data.get('fileName'):
+            return 404, {'message': 'File not found.'}
+        return 200, {'message': 'File uploaded successfully.', 'fileUrl': file_url,
+                     'fileName': data['fileName'], 'fileType': data.get('fileType') or 'application/octet-stream'}
+
+    def cancel_upload(self, environ, upload_id):
+        if self._upload(environ, upload_id) is None:
+            return 404, {'message': 'Upload session not found.'}
+        del self.uploads[upload_id]
+        return 204, None
+
+    # --- Socket.IO ---
+
+    def on_connect(self, sid, environ, auth):
+        user = self.tokens.get((auth or {}).get('token'))
+        if user is None:
+            raise socketio.exceptions.ConnectionRefusedError('Authentication error: Invalid token.')
+        self.socket_users[sid] = user
+        self.user_sids[user['id']] = sid
+        self.sio.emit('status:user-online', {'userId': user['id']}, skip_sid=sid)
+
+    def on_disconnect(self, sid, *args):
+        user = self.socket_users.pop(sid, None)
+        if user is not None:
+            self.user_sids.pop(user['id'], None)
+            self.sio.emit('status:user-offline', {'userId': user['id']}, skip_sid=sid)
+
+    def _create_message(self, sender, recipient_id, content_type, content, client_id=None):
+        """Stores a message; returns (row, created). A client id seen before returns its stored row."""
+        with self.lock:
+            if client_id is not None and (sender['id'], client_id) in self.client_messages:
+                return self.client_messages[sender['id'], client_id], False
+            key = frozenset((sender['id'], recipient_id))
+            conversation_id = self.conversations.get(key)
+            if conversation_id is None:
+                conversation_id = self.conversations[key] = next(self._conversation_ids)
+            message = {
+                'id': next(self._message_ids),
+                'conversation_id': conversation_id,
+                'sender_id': sender['id'],
+                'content_type': content_type,
+                'content': content,
+                'created_at': datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+                'sender_username': sender['username'],
+                'client_id': client_id,
+            }
+            self.messages.setdefault(conversation_id, []).append(message)
+            if client_id is not None:
+                self.client_messages[sender['id'], client_id] = message
+        return message, True
+
+    def _deliver(self, sid, recipient_id, message):
+        recipient_sid = self.user_sids.get(recipient_id)
+        if recipient_sid is not None:
+            self.sio.emit('message:receive', message, to=recipient_sid)
+        self.sio.emit('message:receive', message, to=sid) # Echo back to sender
+
+    def _send(self, sid, event, data):
+        """Stores and delivers one message:send or file:send; returns its acknowledgement."""
+        client_id = data.get('clientId')
+        sender = self.socket_users.get(sid)
+        if sender is None:
+            return {'clientId': client_id, 'error': 'Unauthorized.'}
+        if event == 'message:send':
+            content_type, content = 'text', data['content']
+        elif event == 'file:send':
+            content_type = 'image' if data['fileType'].startswith('image/') else 'file'
+            content = json.dumps({'url': data['fileUrl'], 'name': data['fileName'], 'type': data['fileType'],
+                                  **image_preview(data)})
+        else:
+            return {'clientId': client_id, 'error': f'Unknown event {event}.'}
+        recipient_id = int(data['recipientId'])
+        message, created = self._create_message(sender, recipient_id, content_type, content, client_id)
+        if created:
+            self._deliver(sid, recipient_id, message)
+        return {'clientId': client_id, 'message': message}
+
+    def on_message_send(self, sid, data):
+        return self._send(sid, 'message:send', data)
+
+    def on_file_send(self, sid, data):
+        return self._send(sid, 'file:send', data)
+
+    def on_message_send_batch(self, sid, items):
+        return [self._send(sid, item.get('event'), item.get('data') or {}) for item in items or []]
+
+    def on_typing(self, sid, data):
+        sender = self.socket_users.get(sid)
+        recipient_sid = self.user_sids.get(int(data.get('recipientId', 0)))
+        if sender is not None and recipient_sid is not None:
+            self.sio.emit('typing', {'senderId': sender['id']}, to=recipient_sid)
+
+def make_load_server(host, port):
+    return make_server(host, port, LoadServer().app, server_class=_ThreadingWSGIServer, handler_class=_QuietHandler)
+
+def start_server(host='127.0.0.1', port=0):
+    """Starts a LoadServer on a background thread; returns (server, url)."""
+    httpd = make_load_server(host, port)
+    threading.Thread(target=httpd.serve_forever, name='load-server', daemon=True).start()
+    return httpd, f'http://{host}:{httpd.server_address[1]}'
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='In-memory stand-in for the Deplao backend.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3001)
+    args = parser.parse_args(argv)
+    httpd = make_load_server(args.host, args.port)
+    print(f'Stand-in backend listening on http://{args.host}:{args.port}')
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,524 @@
+# tests/test_app.py
+# Unit tests for the non-GUI core in app/.
+import asyncio
+import hashlib
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+import pytest
+from PySide6.QtCore import QObject, Signal
+from app.chat_controller import ChatController
+from app.message_cache import MessageCache
+from app.message_store import MessageStore
+from app.models import Message, User, decode_messages, parse_timestamp
+from app.outbox import Outbox
+from app.presence import PresenceService
+from app.scheduler import Lane, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+from app.session import clear_session, load_session, save_session
+from app.socket_manager import RECONNECT_BASE_DELAY, RECONNECT_MAX_DELAY, reconnect_delay
+from app import upload_index
+from app.upload_index import DIGEST_CHUNK_SIZE, UploadIndex, file_digest
+from app.user_search import UserSearchCache
+
+def message(message_id, created_at, conversation_id=1, content_type='text'):
+    return Message(message_id, conversation_id, 7, content_type, f"message {message_id}", created_at, 'alice')
+
+def test_store_orders_by_time_with_local_messages_last_in_send_order():
+    store = MessageStore()
+    store.add_messages([message(-2, 1000), message(5, 2000), message(-1, 1000), message(3, 1000)])
+    store.add_messages([message(4, 500), message(-3, 1000)])
+    assert [m.id for m in store.messages(1)] == [4, 3, -1, -2, -3, 5]
+
+def test_store_ignores_known_ids_and_reports_only_new_messages():
+    store = MessageStore()
+    inserted = []
+    store.messages_inserted.connect(lambda conversation_id, first, last: inserted.append((conversation_id, first, last)))
+    assert [m.id for m in store.add_messages([message(1, 100), message(2, 200)])] == [1, 2]
+    assert [m.id for m in store.add_messages([message(2, 200), message(1, 100), message(3, 300)])] == [3]
+    assert store.add_messages([message(3, 300)]) == []
+    assert [m.id for m in store.messages(1)] == [1, 2, 3]
+    assert inserted == [(1, 0, 1), (1, 2, 2)]
+
+def test_store_keeps_conversations_apart():
+    store = MessageStore()
+    store.add_messages([message(1, 100, conversation_id=1), message(2, 50, conversation_id=2)])
+    assert [m.id for m in store.messages(1)] == [1]
+    assert [m.id for m in store.messages(2)] == [2]
+    assert store.get(2).conversation_id == 2
+
+def test_store_removes_the_exact_message_among_equal_timestamps():
+    store = MessageStore()
+    store.add_messages([message(1, 100), message(-1, 100), message(-2, 100), message(2, 200)])
+    removed = []
+    store.message_removed.connect(lambda conversation_id, row: removed.append(row))
+    assert store.remove_message(-2).id == -2
+    assert store.remove_message(-2) is None
+    assert [m.id for m in store.messages(1)] == [1, -1, 2]
+    assert removed == [2]
+    assert -2 not in store
+    # A removed id can come back (e.g. the same pending message restored)
+    assert [m.id for m in store.add_messages([message(-2, 100)])] == [-2]
+
+def test_store_tracks_the_last_non_system_message():
+    store = MessageStore()
+    changed = []
+    store.last_message_changed.connect(changed.append)
+    store.add_messages([message(1, 100), message(2, 200, content_type='system')])
+    assert store.last_message(1).id == 1
+    assert changed == [1]
+    assert store.latest_server_message_id(1) == 2
+    store.add_messages([message(-1, 300)])
+    assert store.last_message(1).id == -1
+    assert store.latest_server_message_id(1) == 2
+    store.remove_message(-1)
+    assert store.last_message(1).id == 1
+    assert changed == [1, 1, 1]
+
+async def _run_queued(lane, queued, before_release=None):
+    """
+    Holds every slot of lane, queues (name, priority, tag) work behind it,
+    calls before_release(tasks) and returns the names in the order they ran.
+    """
+    started = []
+    release = asyncio.Event()
+
+    async def hold():
+        async with lane.slot():
+            await release.wait()
+
+    async def work(name, priority, tag):
+        async with lane.slot(priority, tag):
+            started.append(name)
+            await asyncio.sleep(0)
+
+    holders = [asyncio.create_task(hold()) for _ in range(lane.limit)]
+    await asyncio.sleep(0)
+    tasks = {}
+    for name, priority, tag in queued:
+        tasks[name] = asyncio.create_task(work(name, priority, tag))
+        await asyncio.sleep(0)
+    assert lane.queued() == len(queued)
+    if before_release:
+        before_release(tasks)
+    release.set()
+    # A lane that loses a slot would leave work queued forever
+    await asyncio.wait_for(asyncio.gather(*holders, *tasks.values(), return_exceptions=True), 1)
+    assert lane.active == 0
+    assert lane.queued() == 0
+    return started, tasks
+
+def test_lane_starts_queued_work_by_priority_then_queue_order():
+    lane = Lane('test', 1)
+    started, _ = asyncio.run(_run_queued(lane, [
+        ('low', PRIORITY_LOW, None), ('normal', PRIORITY_NORMAL, None),
+        ('high', PRIORITY_HIGH, None), ('normal 2', PRIORITY_NORMAL, None), ('high 2', PRIORITY_HIGH, None)]))
+    assert started == ['high', 'high 2', 'normal', 'normal 2', 'low']
+
+def test_lane_runs_up_to_its_limit_at_once():
+    lane = Lane('test', 2)
+    running = []
+    peak = 0
+
+    async def work():
+        nonlocal peak
+        async with lane.slot():
+            running.append(1)
+            peak = max(peak, len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+    async def main():
+        await asyncio.wait_for(asyncio.gather(*(work() for _ in range(5))), 1)
+
+    asyncio.run(main())
+    assert peak == 2
+    assert lane.active == 0
+
+def test_lane_reprioritizes_queued_work_by_tag():
+    lane = Lane('test', 1)
+    focus = {'b': PRIORITY_HIGH, 'a': PRIORITY_LOW}
+    started, _ = asyncio.run(_run_queued(lane, [
+        ('a', PRIORITY_HIGH, 'a'), ('untagged', PRIORITY_NORMAL, None), ('b', PRIORITY_LOW, 'b'),
+        ('c', PRIORITY_NORMAL, 'c')], lambda tasks: lane.reprioritize(focus.get)))
+    assert started == ['b', 'untagged', 'c', 'a']
+
+def test_lane_cancels_only_matching_queued_work():
+    lane = Lane('test', 1)
+    started, tasks = asyncio.run(_run_queued(lane, [
+        ('keep', PRIORITY_NORMAL, 'keep.png'), ('drop', PRIORITY_HIGH, 'drop.png'),
+        ('drop 2', PRIORITY_LOW, 'drop.png'), ('keep 2', PRIORITY_LOW, None)],
+        lambda tasks: lane.cancel_queued(lambda tag: tag == 'drop.png')))
+    assert started == ['keep', 'keep 2']
+    assert tasks['drop'].cancelled() and tasks['drop 2'].cancelled()
+
+def test_lane_passes_on_a_slot_granted_to_cancelled_work():
+    lane = Lane('test', 1)
+    started = []
+
+    async def work(name):
+        async with lane.slot():
+            started.append(name)
+            await asyncio.sleep(0)
+
+    async def main():
+        await lane._acquire(PRIORITY_NORMAL, None)
+        first = asyncio.create_task(work('first'))
+        second = asyncio.create_task(work('second'))
+        await asyncio.sleep(0)
+        # The slot is handed to first, which is cancelled before it gets to run
+        lane._release()
+        first.cancel()
+        await asyncio.wait_for(asyncio.gather(first, second, return_exceptions=True), 1)
+        return first
+
+    first = asyncio.run(main())
+    assert first.cancelled()
+    assert started == ['second']
+    assert lane.active == 0
+
+class FakeSocketManager(QObject):
+    connected = Signal()
+    disconnected = Signal()
+    typing_received = Signal(dict)
+    user_online = Signal(dict)
+    user_offline = Signal(dict)
+
+    def __init__(self):
+        super().__init__()
+        self.calls = [] # [(event, data, on_result, on_error)]
+        self.typing_sent = []
+
+    def send_typing_notification(self, recipient_id):
+        self.typing_sent.append(recipient_id)
+
+    def call(self, event, data, on_result, on_error, timeout):
+        self.calls.append((event, data, on_result, on_error))
+
+def _outbox(tmp_path):
+    socket_manager = FakeSocketManager()
+    outbox = Outbox(socket_manager)
+    cache = MessageCache(str(tmp_path / 'cache.sqlite3'))
+    outbox.load(cache, SimpleNamespace(id=7, username='alice'))
+    acked, rejected = [], []
+    outbox.entry_acked.connect(lambda client_id, row: acked.append((client_id, row['id'])))
+    outbox.entry_rejected.connect(lambda client_id, error: rejected.append((client_id, error)))
+    return outbox, socket_manager, cache, acked, rejected
+
+def _send(outbox, client_id, text, created_at=1000):
+    data = {'conversationId': 1, 'content': text, 'clientId': client_id}
+    outbox.enqueue('message:send', data, Message(-1, 1, 7, 'text', text, created_at, 'alice', client_id))
+
+def test_outbox_sends_pending_entries_once_connected(tmp_path):
+    outbox, socket_manager, cache, acked, _ = _outbox(tmp_path)
+    _send(outbox, 'a', "first")
+    _send(outbox, 'b', "second")
+    assert socket_manager.calls == []
+    socket_manager.connected.emit()
+    assert len(socket_manager.calls) == 1
+    event, batch, _, _ = socket_manager.calls[0]
+    assert event == 'message:send-batch'
+    assert [entry['data']['clientId'] for entry in batch] == ['a', 'b']
+    # One batch in flight at a time
+    _send(outbox, 'c', "third")
+    assert len(socket_manager.calls) == 1
+
+def test_outbox_settles_acked_and_rejected_entries_and_sends_the_rest(tmp_path):
+    outbox, socket_manager, cache, acked, rejected = _outbox(tmp_path)
+    socket_manager.connected.emit()
+    _send(outbox, 'a', "first")
+    _send(outbox, 'b', "second")
+    _send(outbox, 'c', "third")
+    on_result = socket_manager.calls[0][2]
+    on_result([{'clientId': 'a', 'message': {'id': 11}}, {'clientId': 'b', 'error': "Not a member."}])
+    assert acked == [('a', 11)]
+    assert rejected == [('b', "Not a member.")]
+    assert [row[0] for row in cache.load_outbox()] == ['c']
+    assert [entry['data']['clientId'] for entry in socket_manager.calls[1][1]] == ['c']
+
+def test_outbox_keeps_entries_an_ack_does_not_cover(tmp_path):
+    outbox, socket_manager, cache, acked, rejected = _outbox(tmp_path)
+    socket_manager.connected.emit()
+    _send(outbox, 'a', "first")
+    socket_manager.calls[0][2]([{'clientId': 'unknown', 'message': {'id': 11}}, 'garbage'])
+    socket_manager.calls[0][2](None)
+    assert acked == [] and rejected == []
+    assert [row[0] for row in cache.load_outbox()] == ['a']
+    # Left for the retry timer rather than resent straight away
+    assert len(socket_manager.calls) == 1
+
+def test_outbox_ignores_the_answer_to_a_batch_from_an_old_connection(tmp_path):
+    outbox, socket_manager, cache, acked, _ = _outbox(tmp_path)
+    socket_manager.connected.emit()
+    _send(outbox, 'a', "first")
+    socket_manager.disconnected.emit()
+    socket_manager.calls[0][2]([{'clientId': 'a', 'message': {'id': 11}}])
+    assert acked == []
+    socket_manager.connected.emit()
+    assert len(socket_manager.calls) == 2
+    socket_manager.calls[1][2]([{'clientId': 'a', 'message': {'id': 11}}])
+    assert acked == [('a', 11)]
+    assert cache.load_outbox() == []
+
+def test_outbox_restores_unacknowledged_entries_from_the_cache(tmp_path):
+    outbox, socket_manager, cache, _, _ = _outbox(tmp_path)
+    _send(outbox, 'a', "first", created_at=1000)
+    _send(outbox, 'b', "second", created_at=2000)
+    restored_socket_manager = FakeSocketManager()
+    restored = Outbox(restored_socket_manager)
+    pending = restored.load(cache, SimpleNamespace(id=7, username='alice'))
+    assert [(m.client_id, m.content, m.created_at) for m in pending] == [('a', "first", 1000), ('b', "second", 2000)]
+    assert all(m.id < 0 for m in pending)
+    # Loading again does not duplicate entries
+    assert restored.load(cache, SimpleNamespace(id=7, username='alice')) == []
+    restored_socket_manager.connected.emit()
+    assert [entry['data']['clientId'] for entry in restored_socket_manager.calls[0][1]] == ['a', 'b']
+
+def test_cache_keeps_a_synced_range_that_a_later_one_does_not_overlap(tmp_path):
+    cache = MessageCache(str(tmp_path / 'cache.sqlite3'))
+    cache.save_messages([message(message_id, message_id * 10) for message_id in (1, 2, 3, 4, 8, 9)])
+    cache.extend_synced_range(1, 0, 4)
+    # A catch-up after a reconnect starts from a message the socket delivered
+    cache.extend_synced_range(1, 8, 9)
+    assert cache.synced_message_id(1) == 9
+    assert [m.id for m in cache.load_latest(1, 50)[0]] == [8, 9]
+    assert cache.load_before(1, 8, 50) is None # The gap between the ranges is not cached
+    assert cache.load_before(1, 4, 50) == ([message(1, 10), message(2, 20), message(3, 30)], False)
+    cache.save_messages([message(5, 50), message(6, 60), message(7, 70)])
+    cache.extend_synced_range(1, 4, 8)
+    assert cache.load_before(1, 8, 50) == ([message(m, m * 10) for m in range(1, 8)], False)
+
+def test_session_is_remembered_until_cleared(tmp_path, monkeypatch):
+    monkeypatch.setenv('DEPLAO_DATA_DIR', str(tmp_path))
+    assert load_session() is None
+    save_session(User(id=7, username='alice'), 'token')
+    assert load_session() == (User(id=7, username='alice'), 'token')
+    clear_session()
+    assert load_session() is None
+    (tmp_path / 'session.json').write_text('{"user": {}}')
+    assert load_session() is None
+
+def test_cache_loads_a_single_conversation(tmp_path):
+    cache = MessageCache(str(tmp_path / 'cache.sqlite3'))
+    me = User(id=7, username='alice')
+    bob = Message(3, 2, 8, 'text', "hi", 300, 'bob')
+    cache.save_messages([message(1, 100), message(2, 200, conversation_id=2), bob])
+    conversation = cache.load_conversation(2, me)
+    assert conversation.id == 2
+    assert conversation.last_message == bob
+    assert [user.id for user in conversation.participants] == [7, 8]
+    assert cache.load_conversation(5, me) is None
+    assert [c.id for c in cache.load_conversations(me)] == [2, 1]
+
+def test_parse_timestamp_reads_backend_timestamps_as_utc_milliseconds():
+    assert parse_timestamp("2024-01-01T10:00:00.000Z") == 1704103200000
+    assert parse_timestamp("2024-01-01T10:00:00z") == 1704103200000
+    assert parse_timestamp("2024-01-01T10:00:00") == 1704103200000
+    assert parse_timestamp("2024-01-01T12:00:00+02:00") == 1704103200000
+    assert parse_timestamp(1704103200000) == 1704103200000
+    assert parse_timestamp(None) == 0
+    assert parse_timestamp("yesterday") == 0
+
+def test_decode_messages_interns_repeated_strings():
+    rows = [{'id': message_id, 'conversation_id': 1, 'sender_id': 8, 'content': f"message {message_id}",
+             'content_type': ''.join(['te', 'xt']), 'sender_username': ''.join(['b', 'ob']),
+             'created_at': "2024-01-01T10:00:00.000Z"} for message_id in (1, 2)]
+    first, second = decode_messages(rows)
+    assert first.content_type == 'text' and first.content_type is second.content_type
+    assert first.sender_username == 'bob' and first.sender_username is second.sender_username
+    assert first.created_at == 1704103200000
+    # Socket events carry no username or content type
+    event, = decode_messages([{'id': 3, 'conversation_id': 1, 'sender_id': 8, 'content': "hi", 'client_id': 'c'}])
+    assert (event.content_type, event.sender_username, event.client_id) == ('text', '', 'c')
+
+def test_message_file_info_is_parsed_lazily_and_not_a_constructor_argument():
+    with pytest.raises(TypeError):
+        Message(1, 1, 8, 'file', '{}', 0, 'bob', _file_info=None)
+    attachment = Message(1, 1, 8, 'file', '{"url": "/uploads/a.zip", "name": "a.zip", "type": "application/zip"}', 0, 'bob')
+    assert attachment.file_info.url == '/uploads/a.zip'
+    assert Message(2, 1, 8, 'file', 'not json', 0, 'bob').file_info is None
+    assert Message(3, 1, 8, 'text', '{"url": "/x"}', 0, 'bob').file_info is None
+
+def test_reconnect_delay_is_jittered_below_the_exponential_ceiling():
+    class Extremes:
+        def __init__(self, pick):
+            self.pick = pick
+
+        def uniform(self, low, high):
+            return low if self.pick == 'low' else high
+
+    for attempt in range(1, 12):
+        ceiling = min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt)
+        lowest = reconnect_delay(attempt, Extremes('low'))
+        highest = reconnect_delay(attempt, Extremes('high'))
+        assert 0 <= lowest < highest <= ceiling
+        assert highest == min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** (attempt - 1))
+    assert reconnect_delay(50, Extremes('high')) == RECONNECT_MAX_DELAY
+
+def test_fill_message_gaps_asks_for_messages_after_the_newest_server_id():
+    store = MessageStore()
+    store.add_messages([message(5, 100), message(9, 200), message(-1, 300), message(-2, 400), # Pending sends
+                        message(-3, 100, conversation_id=2)]) # Nothing from the server yet
+    requests = []
+    controller = SimpleNamespace(message_store=store, http_client=SimpleNamespace(
+        get_message_history=lambda conversation_id, after_id: requests.append((conversation_id, after_id))))
+    ChatController.fill_message_gaps(controller)
+    assert requests == [(1, 9)]
+
+def test_file_digest_matches_hashlib(tmp_path):
+    for size in (0, 1, DIGEST_CHUNK_SIZE, DIGEST_CHUNK_SIZE * 2 + 123):
+        path = tmp_path / f'{size}.bin'
+        data = os.urandom(size)
+        path.write_bytes(data)
+        assert file_digest(str(path)) == hashlib.sha256(data).hexdigest()
+
+def test_upload_index_rehashes_only_changed_files(tmp_path, monkeypatch):
+    hashed = []
+    monkeypatch.setattr(upload_index, 'file_digest', lambda path: hashed.append(path) or file_digest(path))
+    index = UploadIndex(str(tmp_path / 'index.sqlite3'))
+    path = tmp_path / 'photo.jpg'
+    path.write_bytes(b'first')
+    first = index.digest(str(path))
+    assert index.digest(str(path)) == first == hashlib.sha256(b'first').hexdigest()
+    assert len(hashed) == 1
+    path.write_bytes(b'second version') # New size
+    assert index.digest(str(path)) == hashlib.sha256(b'second version').hexdigest()
+    assert len(hashed) == 2
+    stat = path.stat()
+    path.write_bytes(b'third version!') # Same size, only the modification time tells
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert index.digest(str(path)) == hashlib.sha256(b'third version!').hexdigest()
+    assert len(hashed) == 3
+
+def test_upload_index_finds_urls_by_server_and_digest(tmp_path):
+    index = UploadIndex(str(tmp_path / 'index.sqlite3'))
+    assert index.lookup('http://a', 'ab' * 32) is None
+    index.store('http://a', 'ab' * 32, '/uploads/1.jpg')
+    assert index.lookup('http://a', 'ab' * 32) == '/uploads/1.jpg'
+    assert index.lookup('http://b', 'ab' * 32) is None
+    assert index.lookup('http://a', 'cd' * 32) is None
+
+def _presence():
+    socket_manager = FakeSocketManager()
+    presence = PresenceService(socket_manager)
+    typing, changes = [], []
+    presence.typing_changed.connect(lambda user_id, is_typing: typing.append((user_id, is_typing)))
+    presence.presence_changed.connect(changes.append)
+    return presence, socket_manager, typing, changes
+
+def test_presence_expires_typing_after_the_ttl_in_wheel_ticks():
+    presence, socket_manager, typing, _ = _presence()
+    ticks = -(-PresenceService.TYPING_TTL_MS // PresenceService.WHEEL_TICK_MS)
+    socket_manager.typing_received.emit({'senderId': 5})
+    presence._advance_wheel()
+    socket_manager.typing_received.emit({'senderId': 6})
+    for _ in range(ticks - 2):
+        presence._advance_wheel()
+    assert typing == [(5, True), (6, True)]
+    presence._advance_wheel() # The TTL of 5 is up
+    assert typing[2:] == [(5, False)]
+    assert not presence.is_typing(5) and presence.is_typing(6)
+    # Typing again restarts the countdown of 6, one tick before it would have expired
+    socket_manager.typing_received.emit({'senderId': 6})
+    for _ in range(ticks - 1):
+        presence._advance_wheel()
+    assert typing[3:] == [] and presence.is_typing(6)
+    presence._advance_wheel()
+    assert typing[3:] == [(6, False)]
+
+def test_presence_clears_typing_early_only_once():
+    presence, socket_manager, typing, _ = _presence()
+    socket_manager.typing_received.emit({'senderId': 5})
+    presence.clear_typing(5)
+    presence.clear_typing(5)
+    for _ in range(20):
+        presence._advance_wheel()
+    assert typing == [(5, True), (5, False)]
+
+def test_presence_coalesces_flaps_within_one_flush():
+    presence, socket_manager, typing, changes = _presence()
+    socket_manager.user_online.emit({'userId': 5})
+    socket_manager.user_offline.emit({'userId': 5})
+    socket_manager.user_online.emit({'userId': 6})
+    presence._flush_presence()
+    assert changes == [{6: True}]
+    socket_manager.user_offline.emit({'userId': 6})
+    socket_manager.user_online.emit({'userId': 6})
+    presence._flush_presence()
+    assert changes == [{6: True}] # Back online before anyone saw it go
+    socket_manager.typing_received.emit({'senderId': 6})
+    socket_manager.user_offline.emit({'userId': 6})
+    presence._flush_presence()
+    assert changes[1:] == [{6: False}]
+    assert typing == [(6, True), (6, False)] # Going offline ends typing
+    assert not presence.is_online(6)
+
+def test_presence_throttles_outgoing_typing_per_recipient():
+    presence, socket_manager, _, _ = _presence()
+    assert presence.send_typing(5) and presence.send_typing(6)
+    assert not presence.send_typing(5)
+    presence.reset_typing(5)
+    assert presence.send_typing(5)
+    assert socket_manager.typing_sent == [5, 6, 5]
+
+def _users(*names):
+    return [User(id=index, username=name) for index, name in enumerate(names, 1)]
+
+def test_user_search_narrows_a_complete_prefix_result():
+    cache = UserSearchCache()
+    cache.store('Al', _users('alice', 'Alan', 'walter', 'sal'))
+    users, complete = cache.lookup('ali')
+    assert [user.username for user in users] == ['alice'] and complete
+    assert cache.lookup('ALAN') == ([User(id=2, username='Alan')], True)
+    assert cache.lookup('bob') is None
+    # The longest cached prefix wins
+    cache.store('alt', [])
+    assert cache.lookup('alte') == ([], True)
+
+def test_user_search_marks_answers_from_a_truncated_result_incomplete():
+    cache = UserSearchCache()
+    cache.store('a', _users(*(f'a{index}' for index in range(UserSearchCache.RESULT_LIMIT))))
+    users, complete = cache.lookup('a1')
+    assert [user.username for user in users] == ['a1'] and not complete
+    # An exact hit is the server's own answer for that query
+    assert cache.lookup('A')[1]
+
+def test_user_search_treats_wildcard_characters_literally():
+    cache = UserSearchCache()
+    cache.store('a', _users('a_b', 'axb', 'a%c'))
+    assert [user.username for user in cache.lookup('a_')[0]] == ['a_b']
+    assert [user.username for user in cache.lookup('a%')[0]] == ['a%c']
+
+def test_user_search_skips_the_server_only_for_complete_answers():
+    requests, answers = [], []
+    controller = SimpleNamespace(
+        _search_request_id=0, user_search_cache=UserSearchCache(),
+        user_search_success=SimpleNamespace(emit=lambda query, users: answers.append((query, users))),
+        http_client=SimpleNamespace(search_users=lambda query, request_id: requests.append(query)))
+    controller.user_search_cache.store('al', _users('alice'))
+    ChatController.search_users(controller, ' ali ')
+    assert requests == [] and answers == [('ali', _users('alice'))]
+    controller.user_search_cache.store('b', _users(*(f'b{index}' for index in range(UserSearchCache.RESULT_LIMIT))))
+    ChatController.search_users(controller, 'b1')
+    assert requests == ['b1'] and answers[1][0] == 'b1'
+    ChatController.search_users(controller, 'carol')
+    assert requests == ['b1', 'carol'] and len(answers) == 2
+
+def test_connection_pool_sizes_come_from_the_environment():
+    # A fresh interpreter, since settings are read once at import
+    script = (
+        "from app.network import network_loop\n"
+        "async def limits():\n"
+        "    connector = network_loop().session().connector\n"
+        "    return connector.limit, connector.limit_per_host\n"
+        "print(*network_loop().submit(limits()).result())\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    def limits(**env):
+        result = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True, timeout=30,
+                                env={**os.environ, 'QT_QPA_PLATFORM': 'offscreen', **env})
+        return result.stdout.split()
+
+    assert limits() == ['32', '16']
+    assert limits(DEPLAO_POOL_PER_HOST='4', DEPLAO_POOL_TOTAL='8') == ['8', '4']
+    assert limits(DEPLAO_POOL_PER_HOST='40') == ['40', '40'] # The total never caps a single host below its own limit
@@ -0,0 +1,28 @@
+# tests/test_benchmarks.py
+# Runs the benchmark suite at its --quick sizes so it keeps working as the
+# code changes; the timings themselves are compared by tests/benchmarks.py.
+import benchmarks
+
+def test_quick_suite_reports_every_benchmark():
+    report = benchmarks.run_suite(quick=True)
+    results = report['results']
+    assert set(results) == {
+        'chat_view.display_history.100',
+        'dashboard.add_conversation.100',
+        'dashboard.update_conversation_preview.100',
+        'models.decode_messages.us_per_message',
+        'models.message_memory.bytes_per_message',
+    }
+    for result in results.values():
+        assert result['value'] > 0
+        assert result['unit'] in ('ms', 'us', 'bytes')
+
+def test_compare_flags_regressions_beyond_tolerance():
+    def report(**values):
+        return {'results': {name: {'unit': 'ms', 'value': value} for name, value in values.items()}}
+
+    baseline = report(steady=10.0, slower=10.0, faster=10.0, dropped=10.0)
+    current = report(steady=11.0, slower=13.0, faster=7.0, added=1.0)
+    statuses = {row[0]: row[4] for row in benchmarks.compare(current, baseline, tolerance=0.25)}
+    assert statuses == {'steady': 'ok', 'slower': 'regression', 'faster': 'improved',
+                        'added': 'new', 'dropped': 'missing'}
@@ -0,0 +1,99 @@
+# tests/test_gui.py
+# Tests for the item models behind the widgets, run headless.
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PySide6.QtCore import QtMsgType, qInstallMessageHandler
+from PySide6.QtTest import QAbstractItemModelTester
+from PySide6.QtWidgets import QApplication, QStyleOptionViewItem
+from types import SimpleNamespace
+import pytest
+from app.message_store import MessageStore
+from app.models import Conversation, Message, User
+from gui.widgets.chat_view import ChatView
+from gui.widgets.conversation_model import ConversationListModel
+from gui.widgets.message_bubbles import MessageBubbleDelegate
+from gui.widgets.message_model import MessageListModel
+
+@pytest.fixture
+def qt_warnings():
+    """Qt warnings logged during the test, e.g. by QAbstractItemModelTester."""
+    QApplication.instance() or QApplication([])
+    warnings = []
+
+    def handler(message_type, context, text):
+        if message_type != QtMsgType.QtDebugMsg:
+            warnings.append(text)
+
+    previous = qInstallMessageHandler(handler)
+    yield warnings
+    qInstallMessageHandler(previous)
+
+def conversation(conversation_id, created_at):
+    last_message = Message(conversation_id * 10, conversation_id, 8, 'text', "hi", created_at, 'bob')
+    return Conversation(id=conversation_id, participants=[User(7, 'alice'), User(8, 'bob')], last_message=last_message)
+
+def moved_to(model, conversation_id, created_at):
+    model.set_last_message(conversation_id, Message(created_at, conversation_id, 8, 'text', "new", created_at, 'bob'))
+
+def order(model):
+    return [model.index(row).data(ConversationListModel.ConversationIdRole) for row in range(model.rowCount())]
+
+def test_conversation_model_moves_updated_rows_by_recency(qt_warnings):
+    model = ConversationListModel()
+    tester = QAbstractItemModelTester(model, QAbstractItemModelTester.FailureReportingMode.Warning)
+    model.add_conversations([conversation(1, 100), conversation(2, 200), conversation(3, 300)])
+    moves, changes = [], []
+    model.rowsAboutToBeMoved.connect(lambda parent, first, last, destination, row: moves.append((first, row)))
+    model.dataChanged.connect(lambda top_left, bottom_right: changes.append(top_left.row()))
+    assert order(model) == [3, 2, 1]
+
+    moved_to(model, 1, 400) # Last row to the top
+    assert order(model) == [1, 3, 2]
+    moved_to(model, 1, 500) # Already at the top: updated in place
+    assert order(model) == [1, 3, 2]
+    moved_to(model, 2, 450) # Last row to the middle
+    assert order(model) == [1, 2, 3]
+    moved_to(model, 1, 50) # Top row to the bottom; Qt counts the destination before the move
+    assert order(model) == [2, 3, 1]
+    moved_to(model, 3, 350) # Middle row, same place
+    assert order(model) == [2, 3, 1]
+
+    assert moves == [(2, 0), (2, 1), (0, 3)]
+    assert changes == [0, 0, 1, 2, 1]
+    assert model.row_of(1) == 2 and model.row_of(4) == -1
+    assert model.index(2).data(ConversationListModel.ConversationRole).last_message.created_at == 50
+    assert qt_warnings == []
+    del tester
+
+def test_conversation_model_ignores_unknown_and_duplicate_conversations(qt_warnings):
+    model = ConversationListModel()
+    tester = QAbstractItemModelTester(model, QAbstractItemModelTester.FailureReportingMode.Warning)
+    model.add_conversations([conversation(1, 100)])
+    model.add_conversations([conversation(1, 999), conversation(2, 50)])
+    assert order(model) == [1, 2]
+    moved_to(model, 9, 1000)
+    assert order(model) == [1, 2]
+    assert qt_warnings == []
+    del tester
+
+def test_bubble_layouts_are_dropped_with_their_rows(qt_warnings):
+    store = MessageStore()
+    model = MessageListModel(store)
+    model.set_conversation(1)
+    delegate = MessageBubbleDelegate()
+    view = SimpleNamespace(message_model=model, message_delegate=delegate)
+    model.rowsAboutToBeRemoved.connect(lambda parent, first, last: ChatView._forget_layouts(view, parent, first, last))
+    store.add_messages([Message(5, 1, 7, 'text', "sent", 100, 'alice'), Message(-1, 1, 7, 'text', "pending", 200, 'alice')])
+    option = QStyleOptionViewItem()
+    option.rect.setWidth(400)
+    for row in range(model.rowCount()):
+        delegate.sizeHint(option, model.index(row))
+    assert set(delegate._layout_cache) == {5, -1}
+
+    # The pending copy is swapped for the server's
+    store.remove_message(-1)
+    store.add_messages([Message(6, 1, 7, 'text', "pending", 200, 'alice')])
+    delegate.sizeHint(option, model.index(1))
+    assert set(delegate._layout_cache) == {5, 6}
+    assert qt_warnings == []